@@ -0,0 +1,181 @@
+###################################################
+# Approximate nearest-neighbour search (IVF) over the project vectors
+#
+# Inverted-file index in plain numpy: the project vectors are clustered with
+# spherical k-means, each query scores the `nlist` centroids and only scans the
+# rows of the `nprobe` closest clusters. `nprobe` is the recall/latency knob:
+# nprobe == nlist is an exact scan. Build it once, offline, next to the model:
+#
+#   $ python ann_index.py ./data/doc2vec.U.PtAlAPI_U.ep1 --nlist 1024
+#
+# and check the recall/latency trade-off with `python -m benchmarks.ann_recall`.
+###################################################
+import argparse, json, os
+import numpy
+from skill_space import argsort_desc, unitvec
+import tracing
+
+DEFAULT_NPROBE = 16
+
+
+def _normalize_rows(vectors, norms):
+    norms = numpy.where(norms > 0, norms, 1.0)
+    return (numpy.asarray(vectors, dtype=numpy.float32) / norms[:, None]).astype(numpy.float32)
+
+
+def _assign(vectors, norms, centroids, chunk=65536):
+    # closest centroid (cosine) of every row, in chunks to bound memory
+    labels = numpy.empty(len(vectors), dtype=numpy.int32)
+    for start in range(0, len(vectors), chunk):
+        block = _normalize_rows(vectors[start:start+chunk], norms[start:start+chunk])
+        labels[start:start+chunk] = numpy.argmax(numpy.dot(block, centroids.T), axis=1)
+    return labels
+
+
+def train_centroids(vectors, norms, nlist, iters=10, sample=200000, seed=0):
+    rng = numpy.random.default_rng(seed)
+    rows = numpy.sort(rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False))
+    data = _normalize_rows(vectors[rows], norms[rows])
+    centroids = data[rng.choice(len(data), size=nlist, replace=False)]
+    for _ in range(iters):
+        labels = numpy.argmax(numpy.dot(data, centroids.T), axis=1)
+        sums = numpy.zeros_like(centroids)
+        numpy.add.at(sums, labels, data)
+        counts = numpy.bincount(labels, minlength=nlist)
+        # re-seed empty clusters with random points
+        empty = counts == 0
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums, numpy.linalg.norm(sums, axis=1))
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids, order, offsets, nprobe=DEFAULT_NPROBE):
+        self.centroids = centroids # (nlist, dim), unit length
+        self.order = order # partition rows grouped by cluster
+        self.offsets = offsets # cluster c owns order[offsets[c]:offsets[c+1]]
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, norms, nlist=1024, iters=10, sample=200000, seed=0):
+        nlist = min(nlist, len(vectors))
+        centroids = train_centroids(vectors, norms, nlist, iters, sample, seed)
+        labels = _assign(vectors, norms, centroids)
+        order = numpy.argsort(labels, kind='stable').astype(numpy.int64)
+        offsets = numpy.zeros(nlist + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(labels, minlength=nlist), out=offsets[1:])
+        return cls(centroids, order, offsets)
+
+    def probe_order(self, vector):
+        # clusters from closest to farthest
+        query = unitvec(numpy.asarray(vector, dtype=numpy.float64)).astype(numpy.float32)
+        return numpy.argsort(-numpy.dot(self.centroids, query))
+
+    def candidates(self, clusters):
+        if not len(clusters):
+            return numpy.empty(0, dtype=numpy.int64)
+        return numpy.concatenate([self.order[self.offsets[c]:self.offsets[c+1]] for c in clusters])
+
+    def search(self, vectors, norms, vector, k, nprobe=None, mask=None):
+        # approximate top-k rows of `vectors` (where `mask` is True) and their cosine similarity to `vector`
+        clusters = self.probe_order(vector)[:nprobe or self.nprobe]
+        rows = self.candidates(clusters)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        tracing.count('candidates', len(rows))
+        query = unitvec(numpy.asarray(vector, dtype=numpy.float64)).astype(numpy.float32)
+        scores = numpy.dot(vectors[rows], query) / norms[rows]
+        best = argsort_desc(scores, min(k, len(scores)))
+        return rows[best], scores[best]
+
+    def save(self, dirname, prefix='ivf'):
+        numpy.save(os.path.join(dirname, f'{prefix}.centroids.npy'), self.centroids)
+        numpy.save(os.path.join(dirname, f'{prefix}.order.npy'), self.order)
+        numpy.save(os.path.join(dirname, f'{prefix}.offsets.npy'), self.offsets)
+        with open(os.path.join(dirname, f'{prefix}.json'), 'w') as f:
+            json.dump({'nlist': self.nlist, 'size': int(self.offsets[-1]), 'nprobe': self.nprobe}, f)
+
+    @classmethod
+    def load(cls, dirname, prefix='ivf', mmap_mode='r'):
+        with open(os.path.join(dirname, f'{prefix}.json')) as f:
+            meta = json.load(f)
+        return cls(numpy.load(os.path.join(dirname, f'{prefix}.centroids.npy')),
+                   numpy.load(os.path.join(dirname, f'{prefix}.order.npy'), mmap_mode=mmap_mode),
+                   numpy.load(os.path.join(dirname, f'{prefix}.offsets.npy')),
+                   meta['nprobe'])
+
+    @staticmethod
+    def exists(dirname, prefix='ivf'):
+        return os.path.isfile(os.path.join(dirname, f'{prefix}.json'))
+
+
+class ANNRankedResult:
+    # Same interface as project_index.RankedResult, but only scans the closest
+    # `nprobe` clusters first; further clusters are probed, in centroid order,
+    # only if the consumer keeps iterating (e.g. because of strict filters).
+
+    def __init__(self, partition, ivf, vector, nprobe=None, mask=None):
+        self.partition = partition
+        self.ivf = ivf
+        self.vector = vector
+        self.nprobe = nprobe or ivf.nprobe
+        self.mask = mask
+
+    def __len__(self):
+        return len(self.partition)
+
+    @property
+    def nbytes(self):
+        # memory held while iterating: mask, cluster order, rows (int64) and scores (float32) of the first probe
+        first_probe = int(self.ivf.offsets[-1]) * min(self.nprobe, self.ivf.nlist) // max(self.ivf.nlist, 1)
+        return (self.mask.nbytes if self.mask is not None else 0) + self.ivf.nlist * 8 + first_probe * 12
+
+    def __iter__(self):
+        part, ivf = self.partition, self.ivf
+        query = unitvec(numpy.asarray(self.vector, dtype=numpy.float64)).astype(numpy.float32)
+        clusters = ivf.probe_order(self.vector)
+        start, step = 0, self.nprobe
+        while start < len(clusters):
+            rows = ivf.candidates(clusters[start:start+step])
+            if self.mask is not None:
+                rows = rows[self.mask[rows]]
+            tracing.count('candidates', len(rows)) # rows actually scored, probe by probe
+            scores = numpy.dot(part.vectors[rows], query) / part.norms[rows]
+            for i in argsort_desc(scores, len(scores)):
+                yield part.keys[rows[i]], float(scores[i])
+            start += step
+            step *= 2
+
+    def top(self, k):
+        rows, scores = self.ivf.search(self.partition.vectors, self.partition.norms, self.vector, k, self.nprobe, self.mask)
+        return [(self.partition.keys[r], float(s)) for r, s in zip(rows, scores)]
+
+    def restrict(self, mask):
+        if self.mask is not None:
+            mask = mask & self.mask
+        return ANNRankedResult(self.partition, self.ivf, self.vector, self.nprobe, mask)
+
+
+def build_for_model(dirname, nlist=1024, iters=10, sample=200000, nprobe=DEFAULT_NPROBE):
+    import skill_space, project_index
+    mod = skill_space.load_model(dirname)
+    part = project_index.DocIndex(mod.dv)[project_index.PROJECTS]
+    ivf = IVFIndex.build(part.vectors, part.norms, nlist, iters, sample)
+    ivf.nprobe = nprobe
+    ivf.save(dirname)
+    return ivf
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the IVF index over the project vectors of a converted Skill Space model')
+    parser.add_argument('model_dir')
+    parser.add_argument('--nlist', type=int, default=1024, help='number of clusters')
+    parser.add_argument('--iters', type=int, default=10, help='k-means iterations')
+    parser.add_argument('--sample', type=int, default=200000, help='rows used to train the centroids')
+    parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE, help='default clusters scanned per query')
+    args = parser.parse_args()
+    build_for_model(args.model_dir, args.nlist, args.iters, args.sample, args.nprobe)
@@ -0,0 +1,73 @@
+###################################################
+# Per-language partitions of the API vocabulary (`mod.wv`)
+#
+# API keys carry no language, so every API is assigned to the language whose
+# tag vector (`mod.dv['PY']`, `mod.dv['Rust']`, ...) it is most similar to,
+# which is how the Skill Space model places an API next to its ecosystem. The
+# model converter (skill_space.py) stores `mod.wv` grouped by language and
+# records each language's row range in the manifest, so every partition is a
+# zero-copy view of the mmap; for models converted before that, and for the
+# pickled model, the APIs are classified when the index is built.
+#
+# API suggestions of the skill-transfer page then scan only the destination
+# language's partition:
+#   ApiIndex.build(mod).most_similar(vector, 'Rust', topn=10)
+###################################################
+import numpy
+from skill_space import KeyedMatrix, unitvec
+from project_index import LANGUAGE_TAGS
+
+
+def classify_apis(wv, dv, tags=LANGUAGE_TAGS, chunk=65536):
+    # (tags present in dv, index into them of the most similar language tag for every row of wv)
+    tags = [t for t in tags if t in dv]
+    centroids = numpy.vstack([unitvec(numpy.asarray(dv[t], dtype=numpy.float64)) for t in tags]).astype(numpy.float32)
+    langs = numpy.empty(len(wv.vectors), dtype=numpy.int16)
+    for start in range(0, len(langs), chunk):
+        # the argmax over tags does not depend on the API vector's own norm
+        block = numpy.asarray(wv.vectors[start:start+chunk], dtype=numpy.float32)
+        langs[start:start+chunk] = numpy.argmax(numpy.dot(block, centroids.T), axis=1)
+    return tags, langs
+
+
+def language_order(wv, dv, tags=LANGUAGE_TAGS):
+    # row order that makes every language's APIs a contiguous block, and {tag: [start, end]} of the blocks
+    tags, langs = classify_apis(wv, dv, tags)
+    order = numpy.argsort(langs, kind='stable')
+    bounds = numpy.searchsorted(langs[order], numpy.arange(len(tags) + 1))
+    return order, {tag: [int(bounds[i]), int(bounds[i+1])] for i, tag in enumerate(tags)}
+
+
+def _subset(kv, rows):
+    # rows (slice or index array) of a KeyedMatrix / gensim KeyedVectors as a KeyedMatrix
+    keys = kv.index_to_key[rows] if isinstance(rows, slice) else [kv.index_to_key[i] for i in rows]
+    norms = getattr(kv, 'norms', None)
+    quantized = getattr(kv, 'quantized', None)
+    return KeyedMatrix(kv.vectors[rows], keys, norms[rows] if norms is not None else None,
+                       quantized[rows] if quantized is not None else None)
+
+
+class ApiIndex:
+    def __init__(self, partitions):
+        self.partitions = partitions # language tag -> KeyedMatrix of its APIs
+
+    @classmethod
+    def build(cls, mod):
+        ranges = getattr(mod, 'api_languages', None)
+        if ranges:
+            return cls({tag: _subset(mod.wv, slice(start, end)) for tag, (start, end) in ranges.items()})
+        tags, langs = classify_apis(mod.wv, mod.dv)
+        return cls({tag: _subset(mod.wv, numpy.flatnonzero(langs == i)) for i, tag in enumerate(tags)})
+
+    def __len__(self):
+        return sum(len(p) for p in self.partitions.values())
+
+    def language(self, tag):
+        return self.partitions.get(tag)
+
+    def most_similar(self, vector, tag, topn=10):
+        # [(api, similarity)] of the language's APIs most similar to `vector`
+        part = self.partitions.get(tag)
+        if part is None or len(part) == 0 or topn < 1:
+            return []
+        return part.most_similar(positive=[vector], topn=topn)
@@ -1,46 +1,196 @@
-from collections import defaultdict
 import streamlit as st
 import hydralit_components as hc
-import pickle, gzip, json, requests, numpy, math, os
+import pickle, gzip, os, uuid, functools, threading
+from contextlib import contextmanager
 from datetime import timedelta
-import pandas as pd
-from bokeh.models import DataTable, TableColumn, HTMLTemplateFormatter, ColumnDataSource
-from requests.adapters import HTTPAdapter, Retry
-from stqdm import stqdm
-from gensim.models.doc2vec import Doc2Vec
+# pandas, bokeh and stqdm are imported where they are used, and gensim only by
+# unpickling the original model, so a cold start only pays for the page it shows
+# (`python -m benchmarks.startup` reports the import / loading times)
+import skill_space, project_index, ann_index, project_filters, project_store, url_check, liveness, recommender, query_cache, leaderboards, tz_index, model_download, tracing, recommend_client, vector_store, api_index, snapshots
+
+MODEL_PICKLE = './data/doc2vec.U.PtAlAPI_U.ep1.trained.pickle.gz'
+MODEL_URL = 'https://www.dropbox.com/s/9pfnhr71nlbpi3s/doc2vec.U.PtAlAPI_U.ep1.trained.pickle.gz?dl=1'
+MODEL_SHA256 = os.environ.get('SKILL_SPACE_SHA256') # expected checksum of the download, if known
+MODEL_DIR = './data/doc2vec.U.PtAlAPI_U.ep1' # output of `python skill_space.py MODEL_PICKLE MODEL_DIR`
+PROJ_INFO_PICKLE = './data/Proj_info.pickle.gz'
+PROJ_INFO_DIR = './data/Proj_info' # output of `python project_store.py PROJ_INFO_PICKLE PROJ_INFO_DIR`
+URL_CACHE_DB = './data/url_cache.sqlite' # persistent project-URL existence cache
+LIVENESS_DIR = './data/liveness' # output of `python liveness_crawler.py PROJ_INFO_DIR LIVENESS_DIR`
+TZ_JSON = './data/tz_project_gender.json.gz'
+TZ_INDEX_DIR = './data/tz_index' # output of `python tz_index.py TZ_JSON PROJ_INFO_DIR TZ_INDEX_DIR` (optional)
+USE_ANN = os.environ.get('SKILL_SPACE_ANN', '1') != '0' # use MODEL_DIR/ivf.* (see ann_index.py) if it was built
+USE_QUANTIZED = os.environ.get('SKILL_SPACE_QUANTIZED', '1') != '0' # scan the quantized.py copies first, if they were written
+RECOMMENDATION_SERVER = os.environ.get('SKILL_SPACE_SERVER') # recommend_server.py address; if set, the expertise / transfer pages use it
+SNAPSHOT_ROOT = os.environ.get('SKILL_SPACE_SNAPSHOTS', './data/snapshots') # output of `python snapshots.py create`; used once one is active
+SNAPSHOT_POLL = 30 # seconds between checks for a newly activated snapshot
 
 
-def download_file():
+###################################################
+# Data snapshots (see snapshots.py): without an active one, the paths above are used
+###################################################
+@st.experimental_singleton(show_spinner=False)
+def get_snapshot_manager():
+    # loads the active snapshot, and swaps in newly activated ones in the background
+    return snapshots.SnapshotManager(SNAPSHOT_ROOT, SNAPSHOT_POLL, seed=unsnapshotted_data, quantized=USE_QUANTIZED, ann=USE_ANN,
+                                     exclude=recommender.EXCLUDE)
+
+_unsnapshotted = {} # part name -> what the loaders below returned from the paths above (no snapshot active)
+
+def unsnapshotted_data():
+    # the first activated snapshot is warmed in the background like the data this process already serves
+    parts = dict(_unsnapshotted)
+    if 'store' not in parts:
+        return None
+    source = snapshots.Snapshot.of_sources(MODEL_DIR, parts['store'], TZ_JSON)
+    return snapshots.SnapshotData.seed(source, parts)
+
+_pinned = threading.local()
+
+@contextmanager
+def pinned_snapshot():
+    # every run of the page uses the snapshot that was active when it started
+    _pinned.data = get_snapshot_manager().active
+    try:
+        yield
+    finally:
+        _pinned.data = None
+
+def snapshot_data():
+    data = getattr(_pinned, 'data', None)
+    return data if data is not None else get_snapshot_manager().active
+
+def from_snapshot(part):
+    # while a snapshot is active, the loader returns that part of it instead
+    def wrap(load):
+        @functools.wraps(load)
+        def loader(*args):
+            data = snapshot_data()
+            if data is not None:
+                return getattr(data, part)
+            _unsnapshotted[part] = result = load(*args)
+            return result
+        return loader
+    return wrap
+
+
+def download_file(filename):
+    from stqdm import stqdm
     with st.spinner('Skill Space Model not found! Downloading (This is only run once) ...'):
-        with requests.get('https://www.dropbox.com/s/9pfnhr71nlbpi3s/doc2vec.U.PtAlAPI_U.ep1.trained.pickle.gz?dl=1', stream=True) as r:
-            total = int(r.headers.get('content-length', 0))
-            with open('tempfile', 'wb') as f, stqdm(total=total,unit='iB',unit_scale=True,unit_divisor=1024) as bar:
-                r.raise_for_status()
-                for chunk in r.iter_content(chunk_size=8192):
-                    size = f.write(chunk)
-                    bar.update(size)
+        with stqdm(total=0,unit='iB',unit_scale=True,unit_divisor=1024) as bar:
+            # parallel, resumable, checksum-verified; concurrent workers wait for a single download
+            model_download.fetch(MODEL_URL, filename, MODEL_SHA256, progress=bar.update,
+                on_start=lambda size: setattr(bar, 'total', size or 0))
 
-        return 'tempfile'
+        return filename
 
 @st.cache(persist=True, show_spinner=False, allow_output_mutation=True, suppress_st_warning=True)
 def load_skill_space_model(filename):
-    try:
-        # if file exists
-        with gzip.open(filename, 'rb') as f:
-            mod = pickle.load(f)
-    except:
-        name = download_file()
-        with gzip.open(name, 'rb') as f:
-            mod = pickle.load(f)  
-        os.remove(name)
+    if not os.path.exists(filename):
+        download_file(filename)
+    with gzip.open(filename, 'rb') as f:
+        mod = pickle.load(f)
     return mod
 
-# Define the Cosine Similarity Function
-def cos_sim (av, bv):
-    return (sum(av*bv)/math.sqrt(sum(av*av)*sum(bv*bv)))
-
+@st.experimental_singleton(show_spinner=False)
+def load_skill_space_vectors(dirname):
+    # memory-mapped, so every worker process shares the same pages
+    return skill_space.load_model(dirname, quantized=USE_QUANTIZED)
+
+@from_snapshot('mod')
+def get_skill_space_model():
+    # prefer the converted (pickle-free) model, fall back to the original pickle
+    if skill_space.is_converted(MODEL_DIR):
+        return load_skill_space_vectors(MODEL_DIR)
+    return load_skill_space_model(MODEL_PICKLE)
+
+@from_snapshot('lookup')
+@st.experimental_singleton(show_spinner=False)
+def load_vector_lookup():
+    # on-disk key -> vector lookups (vector_store.py), for pages that only need a few vectors
+    if vector_store.exists(MODEL_DIR):
+        return vector_store.load(MODEL_DIR)
+    return None
+
+@from_snapshot('api_names')
+@st.experimental_singleton(show_spinner=False)
+def load_api_names(_mod=None):
+    # sorted / trigram index of the API names, to check what users type before any scan
+    lookup = load_vector_lookup()
+    if lookup is not None:
+        return lookup.wv.keys
+    return vector_store.KeyIndex.from_keys((_mod or get_skill_space_model()).wv.index_to_key)
+
+def validated_apis(apis, mod=None):
+    # confident misspellings are corrected (and reported); otherwise unknown APIs are listed with
+    # completions / close spellings and None is returned, so no scan runs (and no server request is sent) for them
+    with tracing.span('api_check'):
+        checked, corrected, errors = recommender.validate_apis(apis, load_api_names(mod))
+    for typed, api in corrected.items():
+        st.info(f"API '{typed}' Not Found in our data, using '{api}' instead")
+    for error in errors:
+        st.error(error)
+    return ';'.join(checked) if checked is not None else None
+
+@from_snapshot('store')
+@st.experimental_singleton(show_spinner=False)
+def load_project_store():
+    # columnar project metadata, loaded once per process (memory-mapped if converted)
+    if project_store.is_converted(PROJ_INFO_DIR):
+        return project_store.load_store(PROJ_INFO_DIR)
+    return project_store.load_pickle(PROJ_INFO_PICKLE)
+
+@from_snapshot('leaderboards')
+@st.experimental_singleton(show_spinner=False)
+def load_leaderboards(_store):
+    # per-language popularity leaderboards, built once per process
+    return leaderboards.Leaderboards(_store)
+
+@from_snapshot('tz')
+@st.experimental_singleton(show_spinner=False)
+def load_tz_index(_store):
+    # timezone -> project rows / active developer counts, compiled once per process
+    if tz_index.TimezoneIndex.exists(TZ_INDEX_DIR):
+        return tz_index.TimezoneIndex.load(TZ_INDEX_DIR, _store)
+    return tz_index.TimezoneIndex.from_json(TZ_JSON, _store)
+
+@from_snapshot('liveness')
+@st.experimental_singleton(show_spinner=False)
+def load_liveness():
+    # precomputed alive/dead bitmaps, if the crawler has been run
+    if liveness.Liveness.exists(LIVENESS_DIR):
+        return liveness.Liveness.load(LIVENESS_DIR, load_project_store())
+    return None
+
+def dead_projects():
+    live = load_liveness()
+    return live.dead_mask() if live is not None else None
+
+@from_snapshot('index')
+@st.experimental_singleton(show_spinner=False)
+def load_doc_index(_mod):
+    # split `mod.dv` into project / language / developer partitions, once per process
+    index = project_index.DocIndex(_mod.dv)
+    if USE_ANN and getattr(_mod, 'path', None) and ann_index.IVFIndex.exists(_mod.path):
+        index.attach_ann(ann_index.IVFIndex.load(_mod.path))
+    return index
+
+@from_snapshot('apis')
+@st.experimental_singleton(show_spinner=False)
+def load_api_index(_mod):
+    # the API vocabulary split by language, once per process
+    return api_index.ApiIndex.build(_mod)
+
+@from_snapshot('filters')
+@st.experimental_singleton(show_spinner=False)
+def load_project_filters(_index, _proj_info, _exclude):
+    # language / female_pct / exclude arrays aligned with the project partition
+    return project_filters.ProjectFilters(_index[project_index.PROJECTS].keys, _proj_info, _exclude, dead_projects())
+
+@tracing.traced('render')
 def show_table(obj, colnames):
-    
+    import pandas as pd
+    from bokeh.models import DataTable, TableColumn, HTMLTemplateFormatter, ColumnDataSource
+
     df = pd.DataFrame(obj, columns=colnames)
     df['Rank'] =  range(1,len(obj)+1)
     # print(df)
@@ -57,151 +207,272 @@ def show_table(obj, colnames):
     return(p)
 
 def show_tz():
-    with gzip.open('./data/tz_project_gender.json.gz', 'rt') as f:
-        data = json.load(f)
-        tz_list = [f"UTC-{str(timedelta(hours=-float(x)))[:-3]}" if float(x)<0 else f"UTC+{str(timedelta(hours=float(x)))[:-3]}" \
-            for x in sorted(list(map(float, data.keys()))) ]
-        tz_select = st.selectbox("Please Select Your Nearest TimeZone from this list", ['SELECT A TIMEZONE']+tz_list)
-        
-        if tz_select != 'SELECT A TIMEZONE':
-            temptz = (tz_select.replace('UTC',''))[1:].split(':')
-            tzoffset = str((float(temptz[0])+float(temptz[1])/60)*float(f"{(tz_select.replace('UTC',''))[0]}1") )
-            if tzoffset == '0.0' :
-                tzoffset = '0'
-            st.success(f"Your Selected TimeZone is: {tz_select}")
-        else:
-            tzoffset = tz_select
+    data = load_tz_index(load_project_store())
+    if data is None:
+        st.warning('Location-based recommendations are unavailable for the current data snapshot (no timezone data)')
+        return (None, None)
+    tz_list = [f"UTC-{str(timedelta(hours=-float(x)))[:-3]}" if float(x)<0 else f"UTC+{str(timedelta(hours=float(x)))[:-3]}" \
+        for x in sorted(list(map(float, data.tz_keys))) ]
+    tz_select = st.selectbox("Please Select Your Nearest TimeZone from this list", ['SELECT A TIMEZONE']+tz_list)
+
+    if tz_select != 'SELECT A TIMEZONE':
+        temptz = (tz_select.replace('UTC',''))[1:].split(':')
+        tzoffset = str((float(temptz[0])+float(temptz[1])/60)*float(f"{(tz_select.replace('UTC',''))[0]}1") )
+        if tzoffset == '0.0' :
+            tzoffset = '0'
+        st.success(f"Your Selected TimeZone is: {tz_select}")
+    else:
+        tzoffset = tz_select
 
     return (data,tzoffset)
 
+@st.experimental_singleton(show_spinner=False)
+def load_url_verifier():
+    # pooled session, thread pool & sqlite cache shared by every session of this process
+    return url_check.UrlVerifier(URL_CACHE_DB)
+
+def get_url_verifier():
+    # with the crawl results of the data this run uses (runs pinned to different snapshots do not share them)
+    return load_url_verifier().with_liveness(load_liveness())
+
 def check_project_url(project):
-    project = project.replace('__','_')
-    if 'gitlab.com' not in project and 'bitbucket.org' not in project and 'gitbox.com' not in project:
-        url = 'https://github.com/' + project.replace('_', '/', 1)
-    else:
-        url = 'https://' + project.replace('_', '/', 2)
-    # check if url exists
-    s = requests.Session()
+    return get_url_verifier().check(project)
+
+@st.experimental_singleton(show_spinner=False)
+def get_query_cache():
+    return query_cache.QueryCache()
+
+def load_query_cache(mod, proj_info):
+    # process-wide query cache, emptied whenever the model or project metadata changes
+    cache = get_query_cache()
+    cache.validate(query_cache.data_version(mod, proj_info))
+    return cache
+
+def cached_query_vector(cache, key, compose):
+    # level-1 cache: normalised inputs -> composed query vector
+    poslist = cache.vectors.get(key) if cache is not None else None
+    tracing.count('vector_cache_hits' if poslist is not None else 'vector_cache_misses')
+    if poslist is None:
+        with tracing.span('query_vector'):
+            poslist = compose()
+        if cache is not None:
+            poslist.setflags(write=False)
+            cache.vectors.put(key, poslist)
+    return poslist
+
+def recommend_project(apis, languages, langdict, mod, index=None, cache=None):
     try:
-        retries = Retry(total=3, backoff_factor=1, status_forcelist=[ 429, 502, 504 ])
-        s.mount('https://', HTTPAdapter(max_retries=retries))
-        response = s.get(url)
-    except:
-        return None
-    if response.status_code == 200:
-        return url
-    else:
-        return None
-
-def recommend_project(apis, languages, langdict, mod):
-    poslist = numpy.zeros((200,))
-    # get WoC language names
-    if type(languages) == str:
-        poslist += mod.dv[langdict[languages]]
-    elif type(languages) == list:
-        for x in languages:
-             poslist += mod.dv[langdict[x]]
-
-    for api in apis.split(';'):
-        api = api.strip()
-        try:
-            poslist += mod.wv.get_vector(api)
-        except:
-            return (ValueError('API '+api+' Not Found in our data'))
+        poslist = cached_query_vector(cache, query_cache.query_key('exp', languages, apis),
+            lambda: recommender.expertise_vector(mod, apis, languages, langdict))
+    except ValueError as e:
+        return e
     # get similar tags 
-    similar_tags = mod.dv.most_similar(positive=[poslist], topn = 1275597)
+    if index is not None:
+        similar_tags = index.most_similar(poslist)
+    else:
+        with tracing.span('scan'):
+            similar_tags = mod.dv.most_similar(positive=[poslist], topn = 1275597)
     return poslist, similar_tags
 
-def transfer_project(source_lang, dest_lang, apis, mod, langdict, no_api=0):
-    poslist = mod.dv[langdict[dest_lang]] - mod.dv[langdict[source_lang]]
-
-    for api in apis.split(';'):
-        api = api.strip()
-        try:
-            poslist += mod.wv.get_vector(api)
-        except:
-            return (ValueError('API '+api+' Not Found in our data'))
+def transfer_project(source_lang, dest_lang, apis, mod, langdict, no_api=0, index=None, cache=None):
+    try:
+        poslist = cached_query_vector(cache, query_cache.query_key('trans', source_lang, dest_lang, apis),
+            lambda: recommender.transfer_vector(mod, source_lang, dest_lang, apis, langdict))
+    except ValueError as e:
+        return e
     
     # get similar tags 
-    similar_tags = mod.dv.most_similar(positive=[poslist], topn = 1275597)
+    if index is not None:
+        similar_tags = index.most_similar(poslist)
+    else:
+        with tracing.span('scan'):
+            similar_tags = mod.dv.most_similar(positive=[poslist], topn = 1275597)
 
     if no_api > 0:
-        similar_apis = mod.wv.most_similar(positive=[poslist], topn = no_api)
+        # only the destination language's APIs are scanned
+        with tracing.span('api_scan'):
+            similar_apis = load_api_index(mod).most_similar(poslist, langdict[dest_lang], no_api)
         return poslist, similar_tags, similar_apis
     else:
         return poslist, similar_tags
 
-def show_mentors(dev_vect, cores, mod):
+@st.experimental_singleton(show_spinner=False)
+def get_recommendation_client():
+    return recommend_client.RecommendationClient(RECOMMENDATION_SERVER)
+
+def remote_recommendation(profile):
+    # expertise / transfer results from the shared server: (project rows, API suggestions, mentor rows)
+    try:
+        with tracing.span('server'):
+            result = get_recommendation_client().recommend(profile)
+    except ValueError as e:
+        return e
+    rows = [[p['url'], "{:.2f}".format(p['similarity']), p['stars'], p['forks'], p['contributors'], f"{p['female_pct']:.2f}%"]
+        for p in result['projects']]
+    mentors = [[m['mentor'], ','.join(m['projects']), m['similarity']] for m in result.get('mentors', [])]
+    return rows, result.get('apis', []), mentors
+
+def show_remote_recommendation(profile, no_project, is_mentor, lang):
+    # False if the server is not on the snapshot of this run (e.g. while it swaps), which is then answered locally
+    profile = dict(profile, k=no_project, mentors=is_mentor)
+    data = snapshot_data()
+    if data is not None:
+        profile['snapshot'] = data.version
+    try:
+        result = remote_recommendation(profile)
+    except recommend_client.ServerBusy:
+        st.error('The recommendation server is busy, please try again in a moment.')
+        return True
+    except recommend_client.SnapshotMismatch:
+        return False
+    if type(result) == ValueError:
+        st.write(result)
+        return True
+    rows, similar_apis, top_ment = result
+    if profile.get('no_api'):
+        show_api_table(similar_apis)
+    show_project_recommendation_table(None, no_project, None, False, None, lang, rows=rows)
+    if is_mentor:
+        show_mentor_table(top_ment)
+    return True
+
+def show_api_table(similar_apis):
+    with st.spinner('Model Loaded! Getting API Recommendations ...'):
+        col_api = ['API', 'Similarity Score']
+        row_api = []
+        for api, similarity in similar_apis:
+            row_api.append([api, "{:.2f}".format(similarity)])
+        p_api = show_table(row_api, col_api)
+        st.header(f'API Recommendation Table - Sorted by similarity (scrollable)')
+        st.bokeh_chart(p_api)
+
+@tracing.traced('mentors')
+def show_mentors(dev_vect, cores, mod, index=None):
     # calculate similarity of dev & cores
-    dev_core_proj_sim = []
-    for core in cores.keys():
-        if 'noreply' in core or '.' not in core:
-            continue
-        try:
-            cvec = mod.dv[core]
-            projs = ','.join(cores[core])
-            sim = cos_sim(dev_vect,cvec)
-            dev_core_proj_sim.append([core, projs, sim])
-        except:
-            continue
-    # sort
-    dev_core_proj_sim.sort(key=lambda x: x[2], reverse=True)
-    # top 10
-    top_ment = dev_core_proj_sim[:10]
+    if index is not None:
+        top_ment = [[core, ','.join(cores[core]), sim] for core, sim in index.rank_developers(dev_vect, cores.keys(), 10)]
+    else:
+        dev_core_proj_sim = []
+        for core in cores.keys():
+            if 'noreply' in core or '.' not in core:
+                continue
+            try:
+                cvec = mod.dv[core]
+                projs = ','.join(cores[core])
+                sim = recommender.cos_sim(dev_vect,cvec)
+                dev_core_proj_sim.append([core, projs, sim])
+            except:
+                continue
+        # sort
+        dev_core_proj_sim.sort(key=lambda x: x[2], reverse=True)
+        # top 10
+        top_ment = dev_core_proj_sim[:10]
+    show_mentor_table(top_ment)
+
+def show_mentor_table(top_ment):
     colnames = ['Potential Mentor', 'Core Developer in Project', 'Similarity']
     
     st.header(f'Mentor Recommendation Table - Sorted by similarity (scrollable)')
+    import pandas as pd
     df = pd.DataFrame(top_ment, columns=colnames)
     st.table(df)
 
 
-def show_project_recommendation_table(similar_tags, no_project, proj_info, is_diversity, exclude, lang, gender_pct=0):
+def keep_project(element, proj_info, is_diversity, exclude, lang, gender_pct=0):
+    # per-candidate version of ProjectFilters.mask, for rankings that cannot be pre-filtered
+    if '_' not in element or '<' in element or element in exclude:
+        return False
+    try:
+        female_pct = proj_info[element]['female_pct']
+        if type(lang) == str:
+            if lang != 'C#' and lang not in proj_info[element]['FileInfo'].keys():
+                return False
+        elif type(lang) == list:
+            if 'C#' not in lang:
+                if not any(lx in proj_info[element]['FileInfo'].keys() for lx in lang):
+                    return False
+    except:
+        return False
+    return not is_diversity or female_pct >= gender_pct
+
+def project_recommendation_cursor(similar_tags, no_project, proj_info, is_diversity, exclude, lang, gender_pct=0, filters=None):
+    # resumable stream of table rows: ranked, filtered and URL-checked as far as rows are taken (see query_cache.py)
+    # push language / diversity / exclude filters down into the ranking, so only qualifying projects come out
+    prefiltered = filters is not None and hasattr(similar_tags, 'restrict')
+    if prefiltered:
+        with tracing.span('filter'):
+            mask = filters.mask(lang, gender_pct if is_diversity else None)
+        with tracing.span('scan'): # the (lazy) similarity scan runs on first use
+            similar_tags = similar_tags.restrict(mask)
+        if not isinstance(similar_tags, ann_index.ANNRankedResult): # the ANN ranking counts the rows it scores as it is read
+            tracing.count('candidates', len(similar_tags))
+        nbytes = similar_tags.nbytes
+    else:
+        nbytes = len(similar_tags) * 128 # the eager gensim ranking: a list of (key, similarity) tuples
+        similar_tags = ((element, similarity) for element, similarity in similar_tags
+            if keep_project(element, proj_info, is_diversity, exclude, lang, gender_pct))
+    # check if exist, verifying the next few candidates concurrently
+    verified = get_url_verifier().iter_verified(similar_tags, key=lambda c: c[0], batch=no_project)
+
+    def make_row(item):
+        (element, similarity), url = item
+        female_pct = proj_info[element]['female_pct']
+        return ([url, "{:.2f}".format(similarity),  proj_info[element]['NumStars'], proj_info[element]['NumForks'],
+            proj_info[element]['NumAuthors'],f'{female_pct:.2f}%' ], list(proj_info[element]['Core'].keys()))
+    return query_cache.ResultCursor(verified, make_row, nbytes)
+
+def session_id():
+    # identifies the browser session that owns a result cursor
+    if 'cursor_session' not in st.session_state:
+        st.session_state['cursor_session'] = uuid.uuid4().hex
+    return st.session_state['cursor_session']
+
+def project_recommendation_rows(similar_tags, no_project, proj_info, is_diversity, exclude, lang, gender_pct=0, filters=None,
+    cache=None, query=None):
+    # the session's cursor for this query and filters continues where its last page stopped;
+    # a new one is started (and kept) otherwise
+    key = query_cache.cursor_key(session_id(), query, lang, gender_pct, is_diversity) if cache is not None and query is not None else None
+    cursor = cache.cursors.get(key) if key is not None else None
+    if key is not None:
+        tracing.count('cursor_hits' if cursor is not None else 'cursor_misses')
+    if cursor is None:
+        cursor = project_recommendation_cursor(similar_tags, no_project, proj_info, is_diversity, exclude, lang, gender_pct, filters)
+        if key is not None:
+            cache.cursors.put(key, cursor)
+    # (iter_verified traces extending the ranking as 'rank' and the URL checks as 'url_check')
+    try:
+        result = cursor.take(no_project)
+    except Exception:
+        if key is not None:
+            cache.cursors.discard(key)
+        raise
+    if key is not None:
+        cache.cursors.trim()
+    return result
+
+def show_project_recommendation_table(similar_tags, no_project, proj_info, is_diversity, exclude, lang, gender_pct=0, filters=None,
+    cache=None, query=None, rows=None):
+    # rows: finished table rows (from the recommendation server), shown as they are
     if type(similar_tags) == ValueError:
         st.write(similar_tags)
     else:
     # filter for projects & check if exists
         with st.spinner('Model Loaded. Getting your Project Recommendations ...'):
-            i = 0
             colnames = ['Project URL', 'Similarity', 'No. Stars', 'No. Forks', 'Total No. Contributors','Female Developer Percentage' ]
-            rows = []
-            cores = defaultdict(list)
-            # filtered_proj = {k:v for k,v in proj_info.items() if langselect in v['FileInfo'].keys()}
-            for element,similarity in similar_tags:
-                if i >= no_project: 
-                    break
-                if '_' in element and '<' not in element: 
-                    if element in exclude:
-                        continue
-                    try:
-                        female_pct = proj_info[element]['female_pct']
-                        if type(lang) == str:
-                            if lang != 'C#' and lang not in proj_info[element]['FileInfo'].keys():
-                                continue
-                        elif type(lang) == list:
-                            if 'C#' not in lang:
-                                if not any(lx in proj_info[element]['FileInfo'].keys() for lx in lang):
-                                    continue
-                    except:
-                        continue
-                    if is_diversity:
-                        if female_pct >= gender_pct:
-                            # check if exist
-                            url = check_project_url(element)
-                            if url:
-                                rows.append([url, "{:.2f}".format(similarity),  proj_info[element]['NumStars'], proj_info[element]['NumForks'],
-                                proj_info[element]['NumAuthors'],f'{female_pct:.2f}%' ])
-                                for k in proj_info[element]['Core'].keys():
-                                    cores[k].append(url)
-                                i += 1
-                    else:
-                        # check if exist
-                        url = check_project_url(element)
-                        if url:
-                            rows.append([url, "{:.2f}".format(similarity),  proj_info[element]['NumStars'], proj_info[element]['NumForks'],
-                            proj_info[element]['NumAuthors'],f'{female_pct:.2f}%' ])
-                            for k in proj_info[element]['Core'].keys():
-                                cores[k].append(url)
-                            i += 1
+            if rows is not None:
+                cores = None
+            else:
+                # level-2 cache: query vector + filters -> final rows
+                key = query_cache.result_key(query, lang, gender_pct, no_project, is_diversity) if cache is not None and query is not None else None
+                result = cache.results.get(key) if key is not None else None
+                if key is not None:
+                    tracing.count('result_cache_hits' if result is not None else 'result_cache_misses')
+                if result is None:
+                    result = project_recommendation_rows(similar_tags, no_project, proj_info, is_diversity, exclude, lang, gender_pct, filters,
+                        cache, query)
+                    if key is not None:
+                        cache.results.put(key, result)
+                rows, cores = result
             p = show_table(rows, colnames)
             st.header(f'Project Recommendation Table - Sorted by similarity (scrollable)')
             with st.expander("INFORMATION & DISCLAIMER"):
@@ -273,18 +544,10 @@ def show_page():
     ###################################################
     # Define supporting variables
     ###################################################
-    langdict = {'C/C++':'C', 'C#':'Cs', 'Go':'Go', 'Perl':'pl', 'Ruby':'rb', 'JavaScript':'JS',\
-        'Python':'PY', 'R':'R', 'Rust':'Rust', 'Scala':'Scala', 'TypeScript':'TypeScript',  'Java':'java'}
-    
-    with gzip.open('./data/Proj_info.pickle.gz', 'rb') as fproj:
-        proj_info = pickle.load(fproj)
-
-    proj_langs = proj_info.pop('langs')
-    proj_langs.add('ALL')
+    langdict = recommender.LANGDICT
     gender_pct = 0
 
-    exclude = ['frioux_dotfiles', 'auto-program_vendor', 'Reese-D_my_emacs', 'bloomberg_chromium.bb', '996icu_996.ICU', \
-        'Jackeagle_kernel_msm-3.18', 'AdrianDC_aosp_development_sony8960_q', 'docker-library_commit-warehouse'] # Exclude potential bugs in WoC
+    exclude = recommender.EXCLUDE # Exclude potential bugs in WoC
 
     ###################################################
     # Inputs
@@ -353,6 +616,10 @@ def show_page():
     # popularity based
     elif nav_id == 'pop':
         st.header('Recommending Projects based on their popularity')
+        # project metadata is loaded by the pages that need it, the first time they do
+        proj_info = load_project_store()
+        proj_langs = set(proj_info.langs)
+        proj_langs.add('ALL')
         # Arrange Input Widgets
         col1, col2, col3  = st.columns(3)
         with col1:
@@ -417,154 +684,167 @@ def show_page():
 ###################################################
         go = st.button('Get Project Recommendation')
     if go:
-        ###################################################
-        # Output for skill-space based recommendation
-        ###################################################
+        # normalised inputs of this request, recorded with its trace (see tracing.py)
         if nav_id == 'exp':
-            with st.spinner('Loading the Skill Space Model, this might take a few minutes ...'):
-                mod = load_skill_space_model('./data/doc2vec.U.PtAlAPI_U.ep1.trained.pickle.gz') 
-
-            dev_vect, similar_tags = recommend_project(apiselect, langselect, langdict, mod)
-            coredevs = show_project_recommendation_table(similar_tags, no_project, proj_info, is_diversity, exclude, langselect, gender_pct)
-            if is_mentor:
-                show_mentors(dev_vect, coredevs, mod)
-        ###################################################
-        # Output for skill transfer based recommendation
-        ###################################################
+            inputs = {'query': query_cache.query_key('exp', langselect, apiselect), 'k': no_project, 'mentors': is_mentor}
         elif nav_id == 'trans':
-            with st.spinner('Loading the Skill Space Model, this might take a few minutes ...'):
-                mod = load_skill_space_model('./data/doc2vec.U.PtAlAPI_U.ep1.trained.pickle.gz')
-            # API & Project recommendations
-            if is_api:
-                dev_vect, similar_tags, similar_apis = transfer_project(source_lang, dest_lang, api1_trans, mod, langdict, no_api)
-                with st.spinner('Model Loaded! Getting API Recommendations ...'):
-                    col_api = ['API', 'Similarity Score']
-                    row_api = []
-                    for api, similarity in similar_apis:
-                        row_api.append([api, "{:.2f}".format(similarity)])
-                    p_api = show_table(row_api, col_api)
-                    st.header(f'API Recommendation Table - Sorted by similarity (scrollable)')
-                    st.bokeh_chart(p_api)
-            else:
-                dev_vect, similar_tags = transfer_project(source_lang, dest_lang, api1_trans, mod, langdict)
-
-            coredevs = show_project_recommendation_table(similar_tags, no_project, proj_info, is_diversity, exclude, dest_lang, gender_pct)
-            if is_mentor:
-                show_mentors(dev_vect, coredevs, mod)
-        ###################################################
-        # Output for popularity-based recommendation
-        ###################################################
+            inputs = {'query': query_cache.query_key('trans', source_lang, dest_lang, api1_trans), 'k': no_project, 'mentors': is_mentor}
         elif nav_id == 'pop':
-            with st.spinner('Getting your Recommendations ...'):
-                if langselect != 'ALL':
-                    filtered_proj = {k:v for k,v in proj_info.items() if langselect in v['FileInfo'].keys()}
+            inputs = {'metric': pop_metric, 'lang': langselect, 'k': no_project}
+        else:
+            inputs = {'project': purl, 'query': query_cache.query_key('exp', langselect, apiselect)}
+        if nav_id != 'sim':
+            inputs['gender_pct'] = gender_pct if is_diversity else None
+        with tracing.trace(nav_id, inputs):
+            ###################################################
+            # Output for skill-space based recommendation
+            ###################################################
+            if nav_id == 'exp':
+                # with the shared server, the APIs are checked here before a request is sent
+                apis = validated_apis(apiselect) if RECOMMENDATION_SERVER else None
+                if RECOMMENDATION_SERVER and (apis is None or show_remote_recommendation({'languages': langselect, 'apis': apis,
+                        'gender_pct': gender_pct if is_diversity else None}, no_project, is_mentor, langselect)):
+                    pass # reported, or answered by the shared server
                 else:
-                    filtered_proj = dict(proj_info)
-
-                if pop_metric == 'Location (TimeZone)':
-                    if tzoffset not in data.keys():
-                        st.error('You Need to Select a Valid TimeZone!')
+                    with st.spinner('Loading the Skill Space Model, this might take a few minutes ...'), tracing.span('model_load'):
+                        mod = get_skill_space_model()
+                        index = load_doc_index(mod)
+                        proj_info = load_project_store()
+                        filters = load_project_filters(index, proj_info, exclude)
+                        cache = load_query_cache(mod, proj_info)
+
+                    if apis is None:
+                        apis = validated_apis(apiselect, mod)
+                    if apis is not None:
+                        dev_vect, similar_tags = recommend_project(apis, langselect, langdict, mod, index, cache)
+                        coredevs = show_project_recommendation_table(similar_tags, no_project, proj_info, is_diversity, exclude, langselect, gender_pct, filters,
+                            cache, dev_vect)
+                        if is_mentor:
+                            show_mentors(dev_vect, coredevs, mod, index)
+            ###################################################
+            # Output for skill transfer based recommendation
+            ###################################################
+            elif nav_id == 'trans':
+                apis = validated_apis(api1_trans) if RECOMMENDATION_SERVER else None
+                if RECOMMENDATION_SERVER and (apis is None or show_remote_recommendation({'source_lang': source_lang, 'dest_lang': dest_lang,
+                        'apis': apis, 'gender_pct': gender_pct if is_diversity else None, 'no_api': no_api if is_api else 0},
+                        no_project, is_mentor, dest_lang)):
+                    pass # reported, or answered by the shared server
+                else:
+                    with st.spinner('Loading the Skill Space Model, this might take a few minutes ...'), tracing.span('model_load'):
+                        mod = get_skill_space_model()
+                        index = load_doc_index(mod)
+                        proj_info = load_project_store()
+                        filters = load_project_filters(index, proj_info, exclude)
+                        cache = load_query_cache(mod, proj_info)
+                    # API & Project recommendations
+                    if apis is None:
+                        apis = validated_apis(api1_trans, mod)
+                    if apis is not None:
+                        if is_api:
+                            dev_vect, similar_tags, similar_apis = transfer_project(source_lang, dest_lang, apis, mod, langdict, no_api, index, cache)
+                            show_api_table(similar_apis)
+                        else:
+                            dev_vect, similar_tags = transfer_project(source_lang, dest_lang, apis, mod, langdict, index=index, cache=cache)
+
+                        coredevs = show_project_recommendation_table(similar_tags, no_project, proj_info, is_diversity, exclude, dest_lang, gender_pct, filters,
+                            cache, dev_vect)
+                        if is_mentor:
+                            show_mentors(dev_vect, coredevs, mod, index)
+            ###################################################
+            # Output for popularity-based recommendation
+            ###################################################
+            elif nav_id == 'pop':
+                with st.spinner('Getting your Recommendations ...'):
+                    if pop_metric == 'Location (TimeZone)':
+                        if data is None:
+                            st.error('Location-based recommendations are unavailable for the current data snapshot')
+                        elif tzoffset not in data:
+                            st.error('You Need to Select a Valid TimeZone!')
+                        else:
+                            colnames = ['Project URL', 'Active Dev. Count at selected TZ', 'No. Stars', 'No. Forks', 'Total No. Contributors','Female Developer Percentage' ]
+                            rec_table = []
+                            active = data.counts['all']
+                            with tracing.span('location'):
+                                entries = data.entries(tzoffset, langselect, gender_pct if is_diversity else None)
+                            for entry in entries:
+                                row = data.rows[entry]
+                                if proj_info.project_ids[row] in exclude:
+                                    continue
+                                rec_table.append([data.urls[entry], int(active[entry]), int(proj_info.columns['NumStars'][row]),
+                                    int(proj_info.columns['NumForks'][row]), int(proj_info.columns['NumAuthors'][row]),
+                                    f"{data.female_pct[entry]:.2f}%" ])
+                                if len(rec_table) >= no_project:
+                                    break
+                            p = show_table(rec_table, colnames)
+                            st.header('Project Recommendation Table - Sorted by No. of Active Developers in Selected Time Zone (scrollable)')
+                            with st.expander("INFORMATION & DISCLAIMER"):
+                                st.info("""The results shown here are based on World of Code (WoC) dataset version U, collected on Nov. 2021.
+                            WoC uses a community-resolution based approach to calculate various statistics, so the values may differ from what you see 
+                            on GitHub. Since we did not use any fork-resolution, the projects might be a fork of another project, in which case, 
+                            the user is recommeded to look into the source project. Any obvious inconsistencies should be reported to WoC maintainers.""")
+                                st.info('The Tables are Interactive and can be SORTED by any of the columns - just click on the column header!')
+                                st.warning(
+                                """We fully support people who do not identify with either of the two binary genders, 
+                                the reason for showing only two genders here is because WoC only identifies people as male or female 
+                                (or 'Unknown' for developers who do not provide a common name)."""
+                            )
+                            st.bokeh_chart(p)
                     else:
-                        colnames = ['Project URL', 'Active Dev. Count at selected TZ', 'No. Stars', 'No. Forks', 'Total No. Contributors','Female Developer Percentage' ]
+                        # sort by metric
+                        metric = recommender.METRICS[pop_metric]
+                        sorted_rows = load_leaderboards(proj_info).ranked(langselect, metric, gender_pct if is_diversity else None)
+                        colnames = ['Project URL', 'No. Stars', 'No. Forks', 'Total No. Contributors','Female Developer Percentage' ]
                         rec_table = []
-                        for item in data[tzoffset]:
-                            project = item[0]
-                            if 'github.com' in project:
-                                prj = '_'.join(project.split('/')[-2:])
-                            else:
-                                prj = '_'.join(project.split('/')[-3:])
-                            if prj not in filtered_proj.keys() or prj in exclude:
-                                continue
-                            female_pct = filtered_proj[prj]['female_pct']
-                            if is_diversity:
-                                if female_pct >= gender_pct:
-                                    rec_table.append([project, item[1]['all'], filtered_proj[prj]['NumStars'], filtered_proj[prj]['NumForks'],
-                                    filtered_proj[prj]['NumAuthors'],f'{female_pct:.2f}%' ])
-                            else:
-                                rec_table.append([project, item[1]['all'], filtered_proj[prj]['NumStars'], filtered_proj[prj]['NumForks'],
-                                    filtered_proj[prj]['NumAuthors'],f'{female_pct:.2f}%' ])
-                        if len(rec_table) > no_project:
-                            rec_table = rec_table[:no_project]
+                        dead = dead_projects()
+                        candidates = (row for row in sorted_rows if proj_info.project_ids[row] not in exclude and
+                            (dead is None or not dead[row]))
+                        with st.spinner('Checking if Project URL exists ...'):
+                            for row, project in get_url_verifier().iter_verified(candidates, key=lambda r: proj_info.project_ids[r], batch=no_project):
+                                info = proj_info.info(row)
+                                female_pct = info['female_pct']
+                                rec_table.append([project, info['NumStars'], info['NumForks'],
+                                    info['NumAuthors'],f'{female_pct:.2f}%' ])
+                                if len(rec_table) >= no_project:
+                                    break
                         p = show_table(rec_table, colnames)
-                        st.header('Project Recommendation Table - Sorted by No. of Active Developers in Selected Time Zone (scrollable)')
+                        st.header(f'Project Recommendation Table - Sorted by {pop_metric} (scrollable)')
                         with st.expander("INFORMATION & DISCLAIMER"):
                             st.info("""The results shown here are based on World of Code (WoC) dataset version U, collected on Nov. 2021.
-                        WoC uses a community-resolution based approach to calculate various statistics, so the values may differ from what you see 
-                        on GitHub. Since we did not use any fork-resolution, the projects might be a fork of another project, in which case, 
-                        the user is recommeded to look into the source project. Any obvious inconsistencies should be reported to WoC maintainers.""")
+                            WoC uses a community-resolution based approach to calculate various statistics, so the values may differ from what you see 
+                            on GitHub. Since we did not use any fork-resolution, the projects might be a fork of another project, in which case, 
+                            the user is recommeded to look into the source project. Any obvious inconsistencies should be reported to WoC maintainers.""")
                             st.info('The Tables are Interactive and can be SORTED by any of the columns - just click on the column header!')
                             st.warning(
-                            """We fully support people who do not identify with either of the two binary genders, 
-                            the reason for showing only two genders here is because WoC only identifies people as male or female 
-                            (or 'Unknown' for developers who do not provide a common name)."""
-                        )
+                                """We fully support people who do not identify with either of the two binary genders, 
+                                the reason for showing only two genders here is because WoC only identifies people as male or female 
+                                (or 'Unknown' for developers who do not provide a common name)."""
+                            )
                         st.bokeh_chart(p)
+
+            ###################################################
+            # Output for project similarity 
+            ###################################################
+            elif nav_id == 'sim':
+                with st.spinner('Loading the Skill Space Model, this might take a few minutes ...'), tracing.span('model_load'):
+                    # a handful of vectors: look them up on disk if the index was built, instead of loading the model
+                    lookup = load_vector_lookup()
+                    mod = lookup if lookup is not None else get_skill_space_model()
+                    proj_info = lookup.projects if lookup is not None and lookup.projects is not None else load_project_store()
+                if 'github.com' in purl:
+                    prj = '_'.join(purl.split('/')[-2:])
                 else:
-                    # sort by metric
-                    metric_dict = {'No. of Stars':"NumStars", 'No. of Contributors':"NumAuthors", 'No. of Forks':"NumForks"}
-                    metric = metric_dict[pop_metric]
-                    sorted_proj = [k for k,_ in sorted(filtered_proj.items(), key=lambda item:int(item[1][metric]), reverse=True )]
-                    colnames = ['Project URL', 'No. Stars', 'No. Forks', 'Total No. Contributors','Female Developer Percentage' ]
-                    rec_table = []
-                    for prj in sorted_proj:
-                        if prj in exclude:
-                            continue
-                        with st.spinner('Checking if Project URL exists ...'):
-                            project = check_project_url(prj)
-                            if not project:
-                                continue
-                        female_pct = filtered_proj[prj]['female_pct']
-                        if is_diversity:
-                            if female_pct >= gender_pct:
-                                rec_table.append([project, filtered_proj[prj]['NumStars'], filtered_proj[prj]['NumForks'],
-                                filtered_proj[prj]['NumAuthors'],f'{female_pct:.2f}%' ])
-                        else:
-                            rec_table.append([project, filtered_proj[prj]['NumStars'], filtered_proj[prj]['NumForks'],
-                                filtered_proj[prj]['NumAuthors'],f'{female_pct:.2f}%' ])
-                        if len(rec_table) >= no_project:
-                            break
-                    p = show_table(rec_table, colnames)
-                    st.header(f'Project Recommendation Table - Sorted by {pop_metric} (scrollable)')
-                    with st.expander("INFORMATION & DISCLAIMER"):
-                        st.info("""The results shown here are based on World of Code (WoC) dataset version U, collected on Nov. 2021.
-                        WoC uses a community-resolution based approach to calculate various statistics, so the values may differ from what you see 
-                        on GitHub. Since we did not use any fork-resolution, the projects might be a fork of another project, in which case, 
-                        the user is recommeded to look into the source project. Any obvious inconsistencies should be reported to WoC maintainers.""")
-                        st.info('The Tables are Interactive and can be SORTED by any of the columns - just click on the column header!')
-                        st.warning(
-                            """We fully support people who do not identify with either of the two binary genders, 
-                            the reason for showing only two genders here is because WoC only identifies people as male or female 
-                            (or 'Unknown' for developers who do not provide a common name)."""
-                        )
-                    st.bokeh_chart(p)
-
-        ###################################################
-        # Output for project similarity 
-        ###################################################
-        elif nav_id == 'sim':
-            with st.spinner('Loading the Skill Space Model, this might take a few minutes ...'):
-                mod = load_skill_space_model('./data/doc2vec.U.PtAlAPI_U.ep1.trained.pickle.gz')
-            if 'github.com' in purl:
-                prj = '_'.join(purl.split('/')[-2:])
-            else:
-                prj = '_'.join(purl.split('/')[-3:])
-            if prj not in proj_info.keys() or prj in exclude:
-                st.error('Sorry! This project is not in our database! Apologies for the inconvenience!')
-            else:
-                prjvect = mod.dv[prj]
-                poslist = numpy.zeros((200,))
-                for x in langselect:
-                    poslist += mod.dv[langdict[x]]
-                for api in apiselect.split(';'):
-                    api = api.strip()
-                    try:
-                        poslist += mod.wv.get_vector(api)
-                    except:
-                        st.error('API '+api+' Not Found in our data')
-                        poslist = None
-            if any(poslist):
-                sim = cos_sim(prjvect,poslist)
-                st.write(f"Your Similarity Score with project: {purl} is {sim:.2f}")
+                    prj = '_'.join(purl.split('/')[-3:])
+                if prj not in proj_info or prj in exclude or prj not in mod.dv:
+                    st.error('Sorry! This project is not in our database! Apologies for the inconvenience!')
+                else:
+                    apis = validated_apis(apiselect, mod)
+                    if apis is not None:
+                        prjvect = mod.dv[prj]
+                        poslist = recommender.expertise_vector(mod, apis, langselect, langdict)
+                        if any(poslist):
+                            sim = recommender.cos_sim(prjvect,poslist)
+                            st.write(f"Your Similarity Score with project: {purl} is {sim:.2f}")
             
 
 ########################
@@ -574,4 +854,5 @@ def show_page():
 if __name__ == '__main__':
     st.set_page_config(page_title='OSS Project Recommendation for Newcomers', layout="wide", initial_sidebar_state='collapsed')
     st.title('OSS Project Recommendation for Newcomers')
-    show_page()
\ No newline at end of file
+    with pinned_snapshot():
+        show_page()
\ No newline at end of file
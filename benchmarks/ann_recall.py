@@ -0,0 +1,71 @@
+###################################################
+# Recall / latency benchmark for the IVF project retrieval (ann_index.py)
+#
+#   $ python -m benchmarks.ann_recall ./data/doc2vec.U.PtAlAPI_U.ep1 --nprobe 4 8 16 32 64 -k 10 50
+#
+# Queries are composed like `recommend_project` does (language tag + a few
+# APIs). The ground truth is the exact cosine ranking of the project partition,
+# i.e. `mod.dv.most_similar(positive=[query], topn=...)` restricted to projects.
+###################################################
+import argparse, json, time
+import numpy
+import skill_space, project_index
+from ann_index import IVFIndex
+
+
+def make_queries(mod, n, seed=0):
+    rng = numpy.random.default_rng(seed)
+    langs = [x for x in project_index.LANGUAGE_TAGS if x in mod.dv]
+    queries = []
+    for _ in range(n):
+        poslist = numpy.zeros((mod.dv.vector_size,))
+        poslist += mod.dv[langs[rng.integers(len(langs))]]
+        for i in rng.integers(len(mod.wv), size=rng.integers(1, 4)):
+            poslist += mod.wv.get_vector(mod.wv.index_to_key[i])
+        queries.append(poslist)
+    return queries
+
+
+def percentiles(times):
+    ms = numpy.array(times) * 1000
+    return {'p50_ms': float(numpy.percentile(ms, 50)), 'p99_ms': float(numpy.percentile(ms, 99))}
+
+
+def run(model_dir, nprobes, ks, nqueries=200, seed=0):
+    mod = skill_space.load_model(model_dir)
+    part = project_index.DocIndex(mod.dv)[project_index.PROJECTS]
+    ivf = IVFIndex.load(model_dir)
+    queries = make_queries(mod, nqueries, seed)
+    kmax = max(ks)
+
+    exact, times = [], []
+    for q in queries:
+        t = time.perf_counter()
+        exact.append([r for r, _ in part.most_similar(q).top(kmax)])
+        times.append(time.perf_counter() - t)
+    report = {'projects': len(part), 'nlist': ivf.nlist, 'queries': nqueries,
+              'exact': percentiles(times), 'ann': []}
+
+    for nprobe in nprobes:
+        found, times = [], []
+        for q in queries:
+            t = time.perf_counter()
+            rows, _ = ivf.search(part.vectors, part.norms, q, kmax, nprobe)
+            times.append(time.perf_counter() - t)
+            found.append([part.keys[r] for r in rows])
+        row = {'nprobe': nprobe, **percentiles(times)}
+        for k in ks:
+            row[f'recall@{k}'] = float(numpy.mean([len(set(f[:k]) & set(e[:k])) / k for f, e in zip(found, exact)]))
+        report['ann'].append(row)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recall/latency benchmark for the IVF project index')
+    parser.add_argument('model_dir', help='converted model directory with an ivf.* index')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32, 64])
+    parser.add_argument('-k', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.model_dir, args.nprobe, args.k, args.queries, args.seed), indent=2))
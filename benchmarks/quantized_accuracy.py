@@ -0,0 +1,72 @@
+###################################################
+# Accuracy / latency / memory of the quantized first pass (quantized.py)
+#
+#   $ python -m benchmarks.quantized_accuracy ./data/doc2vec.U.PtAlAPI_U.ep1 --kind float16 int8 -k 10 50
+#
+# For every quantization kind the model's matrices are quantized in memory and
+# compared against the current float32 rankings (the reference is exactly
+# `mod.dv.most_similar` restricted to projects, and `mod.wv.most_similar` for
+# the API suggestions of the skill-transfer page):
+#   recall@k    overlap of the top-k with the float32 top-k
+#   exact@k     share of queries whose top-k list (order included) is identical
+#   max_abs_err largest similarity difference over the returned results
+# plus p50/p99 latency and the bytes a scan reads (float32 vs. quantized).
+###################################################
+import argparse, json, time
+import numpy
+import skill_space, project_index, quantized
+from benchmarks.ann_recall import make_queries, percentiles
+
+
+def compare(exact, approx, ks):
+    row = {}
+    for k in ks:
+        row[f'recall@{k}'] = float(numpy.mean([len({x for x, _ in a[:k]} & {x for x, _ in e[:k]}) / k for a, e in zip(approx, exact)]))
+        row[f'exact@{k}'] = float(numpy.mean([[x for x, _ in a[:k]] == [x for x, _ in e[:k]] for a, e in zip(approx, exact)]))
+    row['max_abs_err'] = float(max(abs(sa - se) for a, e in zip(approx, exact) for (_, sa), (_, se) in zip(a, e)))
+    return row
+
+
+def timed_rankings(rank, queries):
+    results, times = [], []
+    for q in queries:
+        t = time.perf_counter()
+        results.append(rank(q))
+        times.append(time.perf_counter() - t)
+    return results, percentiles(times)
+
+
+def run(model_dir, kinds, ks, nqueries=200, seed=0):
+    mod = skill_space.load_model(model_dir)
+    queries = make_queries(mod, nqueries, seed)
+    kmax = max(ks)
+    part = project_index.DocIndex(mod.dv)[project_index.PROJECTS]
+    report = {'projects': len(part), 'apis': len(mod.wv), 'queries': nqueries, 'oversample': quantized.OVERSAMPLE,
+              'min_candidates': quantized.MIN_CANDIDATES}
+
+    exact_projects, t_projects = timed_rankings(lambda q: part.most_similar(q).top(kmax), queries)
+    exact_apis, t_apis = timed_rankings(lambda q: mod.wv.most_similar(positive=[q], topn=kmax), queries)
+    report['float32'] = {'projects': {'bytes': part.vectors.nbytes, **t_projects},
+                         'apis': {'bytes': mod.wv.vectors.nbytes, **t_apis}}
+
+    for kind in kinds:
+        qpart = project_index.Partition(part.name, part.keys, part.rows, part.vectors, part.norms,
+                                        quantized.QuantizedMatrix.from_vectors(part.vectors, part.norms, kind))
+        qwv = skill_space.KeyedMatrix(mod.wv.vectors, mod.wv.index_to_key, mod.wv.norms,
+                                      quantized.QuantizedMatrix.from_vectors(mod.wv.vectors, mod.wv.norms, kind))
+        projects, t_projects = timed_rankings(lambda q: qpart.most_similar(q).top(kmax), queries)
+        apis, t_apis = timed_rankings(lambda q: qwv.most_similar(positive=[q], topn=kmax), queries)
+        report[kind] = {'projects': {'bytes': qpart.quantized.nbytes, **t_projects, **compare(exact_projects, projects, ks)},
+                        'apis': {'bytes': qwv.quantized.nbytes, **t_apis, **compare(exact_apis, apis, ks)}}
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Accuracy of quantized scans + exact re-ranking against float32 rankings')
+    parser.add_argument('model_dir', help='converted model directory (skill_space.py)')
+    parser.add_argument('--kind', nargs='+', choices=quantized.KINDS, default=list(quantized.KINDS))
+    parser.add_argument('-k', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.model_dir, args.kind, args.k, args.queries, args.seed), indent=2))
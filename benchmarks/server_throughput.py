@@ -0,0 +1,80 @@
+###################################################
+# Throughput of the shared recommendation server (recommend_server.py)
+#
+#   $ python -m benchmarks.server_throughput ./data/synthetic --concurrency 1 4 16 64
+#
+# For every concurrency level, that many client threads send expertise /
+# transfer profiles (benchmarks/suite.py) for a fixed time, once to a server
+# started in this process (micro-batched scoring, over localhost HTTP) and once
+# calling the single-query path directly (one similarity scan per query, as
+# every Streamlit session does without the server). Reports queries/s, latency
+# percentiles and the mean batch size as JSON.
+###################################################
+import argparse, json, threading, time
+import numpy
+import recommender, recommend_server, recommend_client
+from benchmarks import synthetic
+from benchmarks.suite import make_profiles, percentiles
+
+
+def local_query(rec, profile, k):
+    vector, lang = rec.profile_query(profile)
+    return rec.project_rows(rec.ranked(vector, lang, profile.get('gender_pct')), k)
+
+
+def drive(query, profiles, concurrency, seconds):
+    # concurrency threads calling query(profile) in a loop; (queries/s, latency percentiles)
+    times = [[] for _ in range(concurrency)]
+    stop = time.perf_counter() + seconds
+
+    def worker(i):
+        n = i
+        while time.perf_counter() < stop:
+            t = time.perf_counter()
+            query(profiles[n % len(profiles)])
+            times[i].append(time.perf_counter() - t)
+            n += concurrency
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    done = sum(times, [])
+    return {'qps': len(done) / elapsed, **percentiles(done)}
+
+
+def run(data_dir, levels, seconds=5.0, k=10, window_ms=2, seed=0):
+    rec = recommender.Recommender.load(f'{data_dir}/model', f'{data_dir}/Proj_info')
+    profiles = make_profiles(synthetic.load_settings(data_dir), 256, numpy.random.default_rng(seed))
+    for i, p in enumerate(profiles): # half expertise, half transfer profiles
+        p.pop('source_lang' if i % 2 else 'languages')
+        if i % 2:
+            p.pop('dest_lang')
+    batcher = recommend_server.MicroBatcher(rec, window_ms / 1000)
+    server = recommend_server.make_server(recommend_server.RecommendationService(rec, batcher), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = recommend_client.RecommendationClient(f'http://127.0.0.1:{server.server_address[1]}')
+
+    report = {'projects': len(rec.projects), 'k': k, 'window_ms': window_ms, 'seconds': seconds, 'levels': {}}
+    for level in levels:
+        before = dict(batcher.stats)
+        remote = drive(lambda p: client.recommend(dict(p, k=k)), profiles, level, seconds)
+        batches = batcher.stats['batches'] - before['batches']
+        remote['mean_batch'] = (batcher.stats['queries'] - before['queries']) / max(batches, 1)
+        report['levels'][level] = {'local': drive(lambda p: local_query(rec, p, k), profiles, level, seconds), 'server': remote}
+    server.shutdown()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Queries/s of the micro-batching server against per-query scans')
+    parser.add_argument('data_dir', help='output of benchmarks/synthetic.py')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--seconds', type=float, default=5.0, help='per level and mode')
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--window-ms', type=float, default=2)
+    args = parser.parse_args()
+    print(json.dumps(run(args.data_dir, args.concurrency, args.seconds, args.k, args.window_ms), indent=2))
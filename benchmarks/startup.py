@@ -0,0 +1,92 @@
+###################################################
+# Cold-start report: import times (`python -X importtime`) and data loading
+#
+#   $ python -m benchmarks.startup --top 20
+#   $ python -m benchmarks.startup --data # also time the per-page data loaders
+#
+# The import of `app` runs in a fresh interpreter, so nothing is cached. The
+# report lists the packages that take longest to import; store the JSON output
+# to track start-up regressions.
+###################################################
+import argparse, json, os, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr):
+    # [(module, self_us, cumulative_us, depth)] from `-X importtime` output
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def import_report(module='app', top=20):
+    t = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - t
+    entries = parse_importtime(proc.stderr)
+    # cost per top-level package (sum of self times), e.g. all of pandas.* under 'pandas'
+    packages = {}
+    for name, own, _, _ in entries:
+        packages[name.split('.')[0]] = packages.get(name.split('.')[0], 0) + own
+    target = [cum for name, _, cum, _ in entries if name == module]
+    report = {'module': module, 'wall_ms': wall * 1000, 'import_ms': target[0] / 1000 if target else None,
+              'packages': [{'package': name, 'ms': us / 1000} for name, us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:top]]}
+    if proc.returncode:
+        report['error'] = proc.stderr.strip().splitlines()[-1]
+    return report
+
+
+def timed(report, name, load):
+    t = time.perf_counter()
+    try:
+        value = load()
+    except Exception as e:
+        report[name] = {'error': f'{type(e).__name__}: {e}'}
+        return None
+    report[name] = {'ms': (time.perf_counter() - t) * 1000}
+    return value
+
+
+def data_report(model_dir, proj_info, tz_json, tz_dir):
+    # the loaders behind app.py's singletons, called directly, on whatever data is present
+    import project_store, skill_space, project_index, leaderboards, tz_index, vector_store
+    report = {}
+    if project_store.is_converted(proj_info):
+        store = timed(report, 'project_store', lambda: project_store.load_store(proj_info))
+    else:
+        store = timed(report, 'project_store (pickle)', lambda: project_store.load_pickle(proj_info))
+    if store is not None:
+        timed(report, 'leaderboards', lambda: leaderboards.Leaderboards(store))
+        if tz_index.TimezoneIndex.exists(tz_dir):
+            timed(report, 'tz_index', lambda: tz_index.TimezoneIndex.load(tz_dir, store))
+        else:
+            timed(report, 'tz_index (json)', lambda: tz_index.TimezoneIndex.from_json(tz_json, store))
+    if skill_space.is_converted(model_dir):
+        if vector_store.exists(model_dir):
+            timed(report, 'vector_lookup', lambda: vector_store.load(model_dir))
+        mod = timed(report, 'skill_space_model', lambda: skill_space.load_model(model_dir))
+        if mod is not None:
+            timed(report, 'doc_index', lambda: project_index.DocIndex(mod.dv))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cold-start report: import times and data loading')
+    parser.add_argument('--module', default='app', help='module whose import is timed')
+    parser.add_argument('--top', type=int, default=20, help='number of packages listed')
+    parser.add_argument('--data', action='store_true', help='also time the data loaders')
+    parser.add_argument('--model-dir', default='./data/doc2vec.U.PtAlAPI_U.ep1', help='converted Skill Space model (skill_space.py)')
+    parser.add_argument('--proj-info', default='./data/Proj_info', help='project store dir or Proj_info.pickle.gz')
+    parser.add_argument('--tz-json', default='./data/tz_project_gender.json.gz')
+    parser.add_argument('--tz-dir', default='./data/tz_index', help='compiled timezone index (tz_index.py)')
+    args = parser.parse_args()
+    report = {'imports': import_report(args.module, args.top)}
+    if args.data:
+        report['data'] = data_report(args.model_dir, args.proj_info, args.tz_json, args.tz_dir)
+    print(json.dumps(report, indent=2))
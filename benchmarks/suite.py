@@ -0,0 +1,184 @@
+###################################################
+# Benchmark suite for every recommendation path, on synthetic data
+#
+#   $ python -m benchmarks.suite ./data/synthetic --generate -o report.json
+#   $ python -m benchmarks.suite ./data/synthetic --thresholds benchmarks/thresholds.json
+#
+# Runs the code behind each page of app.py through the headless API
+# (recommender.py, no Streamlit), on data written by benchmarks/synthetic.py
+# (--generate creates it first). Each path stands in for an app.py function:
+#   recommend_project  recommend_project (query vector + lazy ranking)
+#   transfer_project   transfer_project with API suggestions (Recommender.transfer)
+#   project_table      show_project_recommendation_table's rows (Recommender.project_rows
+#                      on the pre-filtered ranking, like project_recommendation_cursor)
+#   mentors            show_mentors (DocIndex.rank_developers, via Recommender.mentors)
+#   popularity         the popularity page's leaderboard rows (Leaderboards.ranked)
+#   location           the location page's rows (TimezoneIndex.entries)
+#   sim                the 'sim' page (recommender.cos_sim, which app.py calls)
+#   batch              no page: recommender.py's batch mode
+# Streamlit rendering and the app's query caches are not included. URL checks
+# are stubbed: no verifier is set, so result rows only get their URL built.
+# Reports load times, latency percentiles per path and peak RSS as JSON. With
+# --thresholds, the exit status is 1 if any value is above its limit, so the
+# suite can gate changes.
+###################################################
+import argparse, json, os, sys, time
+import numpy
+import skill_space, project_index, project_store, project_filters, tz_index, recommender
+from benchmarks import synthetic
+
+PATHS = ('recommend_project', 'transfer_project', 'project_table', 'mentors', 'popularity', 'location', 'sim', 'batch')
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError: # not available on Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024 # bytes on macOS, KiB elsewhere
+
+
+def percentiles(times):
+    ms = numpy.array(times) * 1000
+    return {'n': len(ms), 'mean_ms': float(ms.mean()), 'p50_ms': float(numpy.percentile(ms, 50)),
+            'p90_ms': float(numpy.percentile(ms, 90)), 'p99_ms': float(numpy.percentile(ms, 99))}
+
+
+def timed(func, *args):
+    t = time.perf_counter()
+    value = func(*args)
+    return value, (time.perf_counter() - t) * 1000
+
+
+def make_profiles(settings, n, rng):
+    # expertise / transfer inputs like the app's widgets produce: display-name languages and ';'-separated APIs
+    langs = list(settings['apis_by_language'])
+    profiles = []
+    for _ in range(n):
+        lang, dest = rng.choice(len(langs), size=2, replace=False)
+        apis = settings['apis_by_language'][langs[lang]]
+        profiles.append({'languages': [langs[lang]], 'source_lang': langs[lang], 'dest_lang': langs[dest],
+                         'apis': ';'.join(rng.choice(apis, size=rng.integers(1, 5), replace=False)),
+                         'gender_pct': [None, 5, 20][rng.integers(3)]})
+    return profiles
+
+
+def load(data_dir):
+    # the loaders behind app.py's singletons; returns (recommender, timezone index, load times)
+    load_ms = {}
+    mod, load_ms['model'] = timed(skill_space.load_model, os.path.join(data_dir, 'model'))
+    store, load_ms['project_store'] = timed(project_store.load_store, os.path.join(data_dir, 'Proj_info'))
+    index, load_ms['doc_index'] = timed(project_index.DocIndex, mod.dv)
+    _, load_ms['project_filters'] = timed(project_filters.ProjectFilters, index[project_index.PROJECTS].keys, store, recommender.EXCLUDE)
+    rec = recommender.Recommender(mod, store, index)
+    _, load_ms['leaderboards'] = timed(lambda: rec.leaderboards)
+    tz, load_ms['tz_index'] = timed(tz_index.TimezoneIndex.from_json, os.path.join(data_dir, 'tz_project_gender.json.gz'), store)
+    return rec, tz, load_ms
+
+
+def run(data_dir, queries=200, k=10, seed=0):
+    settings = synthetic.load_settings(data_dir)
+    rec, tz, load_ms = load(data_dir)
+    rng = numpy.random.default_rng(seed)
+    profiles = make_profiles(settings, queries, rng)
+    times = {name: [] for name in PATHS}
+    mod = rec.mod
+
+    for p in profiles:
+        # recommend_project: query vector + lazy ranking, first k unfiltered projects
+        t = time.perf_counter()
+        vector = recommender.expertise_vector(mod, p['apis'], p['languages'])
+        rec.index.most_similar(vector).top(k)
+        times['recommend_project'].append(time.perf_counter() - t)
+
+        # transfer_project: transfer vector, filtered projects and API suggestions
+        t = time.perf_counter()
+        rec.transfer(p['source_lang'], p['dest_lang'], p['apis'], k, p['gender_pct'], no_api=k)
+        times['transfer_project'].append(time.perf_counter() - t)
+
+        # show_project_recommendation_table: language / diversity filtering and result rows
+        t = time.perf_counter()
+        rows = rec.project_rows(rec.ranked(vector, p['languages'], p['gender_pct']), k)
+        times['project_table'].append(time.perf_counter() - t)
+
+        # show_mentors: core developers of the recommended projects, ranked by similarity
+        t = time.perf_counter()
+        rec.mentors(vector, rows)
+        times['mentors'].append(time.perf_counter() - t)
+
+        # popularity branch: leaderboard by metric (with / without diversity threshold)
+        lang = rng.choice(['ALL'] + list(rec.store.langs))
+        t = time.perf_counter()
+        rec.popularity(lang, rng.choice(list(recommender.METRICS.values())), k, p['gender_pct'])
+        times['popularity'].append(time.perf_counter() - t)
+
+        # location branch: timezone entries of a language, with result rows
+        t = time.perf_counter()
+        entries = tz.entries(rng.choice(tz.tz_keys), lang, p['gender_pct'])
+        [(tz.urls[e], int(tz.counts['all'][e]), rec.store.info(int(tz.rows[e]))) for e in entries[:k]]
+        times['location'].append(time.perf_counter() - t)
+
+        # 'sim' page: cosine of the developer vector with one project vector
+        prj = rec.projects.keys[rng.integers(len(rec.projects))]
+        t = time.perf_counter()
+        prjvect = mod.dv[prj]
+        vector = recommender.expertise_vector(mod, p['apis'], p['languages'])
+        float(recommender.cos_sim(prjvect, vector))
+        times['sim'].append(time.perf_counter() - t)
+
+    # batch mode, per profile (64 profiles scored together)
+    for start in range(0, len(profiles), 64):
+        chunk = profiles[start:start+64]
+        t = time.perf_counter()
+        rec.run_batch(chunk, k)
+        times['batch'].append((time.perf_counter() - t) / len(chunk))
+
+    return {'data': {name: settings[name] for name in ('projects', 'developers', 'apis', 'dim', 'seed')},
+            'queries': queries, 'k': k, 'load_ms': load_ms,
+            'paths': {name: percentiles(t) for name, t in times.items()}, 'peak_rss_mb': peak_rss_mb()}
+
+
+def check(report, thresholds):
+    # [(metric, value, limit)] for every value above its threshold
+    failures = []
+    for name, limit in thresholds.get('load_ms', {}).items():
+        if report['load_ms'].get(name, 0) > limit:
+            failures.append((f'load_ms.{name}', report['load_ms'][name], limit))
+    for path, limits in thresholds.get('paths', {}).items():
+        for stat, limit in limits.items():
+            value = report['paths'][path][stat]
+            if value > limit:
+                failures.append((f'paths.{path}.{stat}', value, limit))
+    limit = thresholds.get('peak_rss_mb')
+    if limit is not None and report['peak_rss_mb'] is not None and report['peak_rss_mb'] > limit:
+        failures.append(('peak_rss_mb', report['peak_rss_mb'], limit))
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every recommendation path on synthetic data')
+    parser.add_argument('data_dir', help='output of benchmarks/synthetic.py')
+    parser.add_argument('--generate', action='store_true', help='generate the synthetic data first (default sizes)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--thresholds', help='JSON file with limits, e.g. benchmarks/thresholds.json')
+    parser.add_argument('-o', '--output', help='write the report here instead of stdout')
+    args = parser.parse_args()
+    if args.generate:
+        synthetic.generate(args.data_dir)
+    report = run(args.data_dir, args.queries, args.k, args.seed)
+    failures = []
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            failures = check(report, json.load(f))
+        report['regressions'] = [{'metric': m, 'value': v, 'limit': lim} for m, v, lim in failures]
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    for metric, value, limit in failures:
+        print(f'REGRESSION {metric}: {value:.2f} > {limit}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
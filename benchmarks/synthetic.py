@@ -0,0 +1,103 @@
+###################################################
+# Synthetic Skill Space model, project metadata and timezone data
+#
+# Produces everything the recommendation paths read, in the formats of the real
+# data, so they can be benchmarked without the multi-GB model download:
+#   <out>/model/           converted model (skill_space.py format)
+#   <out>/Proj_info.pickle.gz and <out>/Proj_info/ (project_store.py format)
+#   <out>/tz_project_gender.json.gz
+#   <out>/synthetic.json   generator settings and the API names per language
+#
+#   $ python -m benchmarks.synthetic ./data/synthetic --projects 100000 --developers 50000 --apis 50000
+#
+# Vectors are not random noise: every project, developer and API belongs to a
+# language and a topic, and its vector is the sum of the language and topic
+# centroids plus noise, so rankings have the skewed similarity distribution of
+# a trained model.
+###################################################
+import argparse, gzip, json, os, pickle
+import numpy
+import skill_space, project_store
+from recommender import LANGDICT
+
+TZ_OFFSETS = ('-8.0', '-5.0', '-3.0', '0', '1.0', '2.0', '3.0', '5.5', '8.0', '9.0')
+
+
+def embed(rng, lang_centroids, topic_centroids, langs, topics, noise=0.6):
+    vectors = lang_centroids[langs] + topic_centroids[topics]
+    vectors += noise * rng.standard_normal(vectors.shape)
+    return vectors.astype(numpy.float32)
+
+
+def generate(out_dir, projects=50000, developers=20000, apis=20000, topics=64, dim=200, tz_projects=100, seed=0):
+    rng = numpy.random.default_rng(seed)
+    names = list(LANGDICT) # display names, as in FileInfo
+    tags = [LANGDICT[x] for x in names]
+    nlang = len(names)
+    lang_centroids = rng.standard_normal((nlang, dim))
+    topic_centroids = 0.8 * rng.standard_normal((topics, dim))
+
+    project_keys = [f'owner{i}_repo{i}' for i in range(projects)]
+    project_lang = rng.integers(nlang, size=projects)
+    developer_keys = [f'Dev {i} <dev{i}@example.org>' if i % 10 else f'dev{i} <dev{i}@users.noreply.github.com>' for i in range(developers)]
+    api_keys = [f'{tags[i % nlang].lower()}.pkg{i}' for i in range(apis)]
+
+    dv = numpy.vstack([
+        embed(rng, lang_centroids, topic_centroids, project_lang, rng.integers(topics, size=projects)),
+        (lang_centroids + 0.1 * rng.standard_normal((nlang, dim))).astype(numpy.float32),
+        embed(rng, lang_centroids, topic_centroids, rng.integers(nlang, size=developers), rng.integers(topics, size=developers))])
+    wv = embed(rng, lang_centroids, topic_centroids, numpy.arange(apis) % nlang, rng.integers(topics, size=apis))
+    model = skill_space.SkillSpaceModel(skill_space.KeyedMatrix(dv, project_keys + tags + developer_keys),
+                                        skill_space.KeyedMatrix(wv, api_keys))
+    os.makedirs(out_dir, exist_ok=True)
+    skill_space.save_model(model, os.path.join(out_dir, 'model'))
+
+    # project metadata: heavy-tailed popularity, 1-3 languages, a few core developers
+    stars = (rng.pareto(1.2, size=projects) * 10).astype(numpy.int64)
+    proj_info = {}
+    for i, key in enumerate(project_keys):
+        langs = {names[project_lang[i]]} | {names[j] for j in rng.integers(nlang, size=rng.integers(0, 3))}
+        proj_info[key] = {'NumStars': int(stars[i]), 'NumForks': int(stars[i] // (1 + rng.integers(1, 10))),
+                          'NumAuthors': int(1 + rng.pareto(1.5) * 5), 'female_pct': float(rng.beta(1, 6) * 100),
+                          'FileInfo': dict.fromkeys(langs, 1),
+                          'Core': dict.fromkeys((developer_keys[j] for j in rng.integers(developers, size=rng.integers(1, 6))), 1)}
+    proj_info['langs'] = set(names)
+    with gzip.open(os.path.join(out_dir, 'Proj_info.pickle.gz'), 'wb') as f:
+        pickle.dump(proj_info, f)
+    project_store.save_store(project_store.from_proj_info(proj_info), os.path.join(out_dir, 'Proj_info'))
+
+    # timezone file: [project URL, active developer counts] lists, most active first
+    tz = {}
+    for offset in TZ_OFFSETS:
+        items = []
+        for i in rng.choice(projects, size=min(tz_projects, projects), replace=False):
+            owner, repo = project_keys[i].split('_', 1)
+            female, male, unknown = (int(x) for x in rng.integers(0, 300, size=3))
+            items.append([f'https://github.com/{owner}/{repo}', {'all': female + male + unknown, 'male': male, 'female': female, 'UNKNOWN': unknown}])
+        tz[offset] = sorted(items, key=lambda item: item[1]['all'], reverse=True)
+    with gzip.open(os.path.join(out_dir, 'tz_project_gender.json.gz'), 'wt') as f:
+        json.dump(tz, f)
+
+    settings = {'projects': projects, 'developers': developers, 'apis': apis, 'topics': topics, 'dim': dim, 'seed': seed,
+                'apis_by_language': {names[j]: api_keys[j::nlang][:200] for j in range(nlang)}}
+    with open(os.path.join(out_dir, 'synthetic.json'), 'w') as f:
+        json.dump(settings, f)
+    return settings
+
+
+def load_settings(out_dir):
+    with open(os.path.join(out_dir, 'synthetic.json')) as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic model, project metadata and timezone file')
+    parser.add_argument('out_dir')
+    parser.add_argument('--projects', type=int, default=50000)
+    parser.add_argument('--developers', type=int, default=20000)
+    parser.add_argument('--apis', type=int, default=20000)
+    parser.add_argument('--topics', type=int, default=64)
+    parser.add_argument('--dim', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.out_dir, args.projects, args.developers, args.apis, args.topics, args.dim, seed=args.seed)
@@ -0,0 +1,97 @@
+###################################################
+# Precomputed per-language popularity leaderboards
+#
+# For every language (plus 'ALL') and popularity metric, the project store rows
+# sorted by that metric (descending, ties in store order, same as the old
+# `sorted(..., reverse=True)`). A popularity query is then a slice of a
+# leaderboard. A secondary index orders every language's projects by female_pct,
+# so a diversity threshold selects the qualifying projects with a binary search
+# and only that subset is put into leaderboard order, instead of re-sorting.
+###################################################
+import numpy
+
+METRIC_COLUMNS = ('NumStars', 'NumAuthors', 'NumForks')
+ALL = 'ALL'
+
+
+class Leaderboards:
+    def __init__(self, store, metrics=METRIC_COLUMNS, female_index=True, previous=None, unchanged=()):
+        # `unchanged`: languages (or ALL) whose projects and their metric / female_pct values are the same
+        # as in the Leaderboards `previous` (e.g. of the previous data snapshot, see snapshots.py);
+        # their segments are copied instead of sorted again
+        self.store = store
+        self.langs = [ALL] + list(store.langs)
+        self.lang_to_seg = {lx: i for i, lx in enumerate(self.langs)}
+        reused = {lx for lx in unchanged if lx in self.lang_to_seg and lx in previous.lang_to_seg} if previous is not None else set()
+        if female_index and previous is not None and previous.female_rows is None:
+            reused = set()
+        segments = [None if lx in reused else numpy.arange(len(store)) if lx == ALL else numpy.flatnonzero(store.lang_mask(lx))
+                    for lx in self.langs]
+        # CSR layout: leaderboard of langs[i] is rows[metric][offsets[i]:offsets[i+1]]
+        self.offsets = numpy.zeros(len(segments) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(seg) if seg is not None else previous.size(lx) for lx, seg in zip(self.langs, segments)],
+                     out=self.offsets[1:])
+
+        self.rows = {}
+        for metric in metrics:
+            column = numpy.asarray(store.columns[metric])
+            self.rows[metric] = numpy.concatenate([seg[numpy.argsort(-column[seg], kind='stable')] if seg is not None else
+                                                   previous.board(lx, metric) for lx, seg in zip(self.langs, segments)]).astype(numpy.int32)
+
+        self.female_rows = self.female_sorted = None
+        if female_index:
+            # per language (same offsets): rows by female_pct, descending, and the negated sorted values
+            female_pct = numpy.asarray(store.columns['female_pct'])
+            order = [seg[numpy.argsort(-female_pct[seg], kind='stable')] if seg is not None else
+                     previous.female_rows[previous.segment(lx)] for lx, seg in zip(self.langs, segments)]
+            self.female_rows = numpy.concatenate(order).astype(numpy.int32)
+            self.female_sorted = -female_pct[self.female_rows]
+
+    def segment(self, lang):
+        seg = self.lang_to_seg[lang]
+        return slice(self.offsets[seg], self.offsets[seg+1])
+
+    def size(self, lang):
+        seg = self.lang_to_seg[lang]
+        return int(self.offsets[seg+1] - self.offsets[seg])
+
+    def board(self, lang, metric):
+        seg = self.lang_to_seg.get(lang)
+        if seg is None:
+            return numpy.empty(0, dtype=numpy.int32)
+        return self.rows[metric][self.offsets[seg]:self.offsets[seg+1]]
+
+    def qualifying_count(self, lang, min_female_pct):
+        seg = self.lang_to_seg[lang]
+        start, end = self.offsets[seg], self.offsets[seg+1]
+        return int(numpy.searchsorted(self.female_sorted[start:end], -min_female_pct, side='right'))
+
+    def qualifying_rows(self, lang, metric, min_female_pct):
+        # rows of `lang` with female_pct >= min_female_pct, in leaderboard order
+        start = self.offsets[self.lang_to_seg[lang]]
+        rows = self.female_rows[start:start+self.qualifying_count(lang, min_female_pct)]
+        return rows[numpy.lexsort((rows, -numpy.asarray(self.store.columns[metric])[rows]))]
+
+    def ranked(self, lang, metric, min_female_pct=None, chunk=1024, selective=0.125):
+        # store rows of `lang` by `metric`, most popular first, optionally with female_pct >= min_female_pct
+        board = self.board(lang, metric)
+        if min_female_pct is None:
+            for start in range(0, len(board), chunk):
+                yield from board[start:start+chunk].tolist()
+        elif self.female_rows is not None and lang in self.lang_to_seg and \
+                self.qualifying_count(lang, min_female_pct) <= selective * len(board):
+            # few projects qualify: take them from the female_pct index and order just those
+            rows = self.qualifying_rows(lang, metric, min_female_pct)
+            for start in range(0, len(rows), chunk):
+                yield from rows[start:start+chunk].tolist()
+        else:
+            # most projects qualify: filter the leaderboard chunk by chunk
+            female_pct = self.store.columns['female_pct']
+            for start in range(0, len(board), chunk):
+                rows = board[start:start+chunk]
+                yield from rows[female_pct[rows] >= min_female_pct].tolist()
+
+    def top(self, lang, metric, k, min_female_pct=None):
+        if min_female_pct is None:
+            return self.board(lang, metric)[:k].tolist()
+        return [row for _, row in zip(range(k), self.ranked(lang, metric, min_female_pct))]
@@ -0,0 +1,69 @@
+###################################################
+# Precomputed project liveness (written by liveness_crawler.py)
+#
+# Alive/dead bitmaps plus last-check times, aligned with the project store
+# rows. Fresh entries answer "does this project still exist?" in memory; stale
+# or unknown ones fall back to a live URL check.
+###################################################
+import json, os, time
+import numpy
+
+UNKNOWN, ALIVE, DEAD = 0, 1, 2
+MAX_AGE = 30 * 24 * 3600 # crawl results older than this are treated as unknown
+META = 'liveness.json'
+
+
+class Liveness:
+    def __init__(self, status, checked, store=None, max_age=MAX_AGE):
+        self.status = status # int8 per store row: UNKNOWN / ALIVE / DEAD
+        self.checked = checked # uint32 unix time of the last check per store row
+        self.store = store
+        self.max_age = max_age
+
+    @classmethod
+    def empty(cls, size, store=None, max_age=MAX_AGE):
+        return cls(numpy.zeros(size, dtype=numpy.int8), numpy.zeros(size, dtype=numpy.uint32), store, max_age)
+
+    @staticmethod
+    def exists(dirname):
+        return os.path.isfile(os.path.join(dirname, META))
+
+    @classmethod
+    def load(cls, dirname, store=None, max_age=MAX_AGE):
+        with open(os.path.join(dirname, META)) as f:
+            size = json.load(f)['projects']
+        if store is not None and size != len(store):
+            raise ValueError(f'Liveness data in {dirname} does not match the project store, re-run liveness_crawler.py')
+        status = numpy.zeros(size, dtype=numpy.int8)
+        status[numpy.unpackbits(numpy.load(os.path.join(dirname, 'alive.bits.npy')), count=size).view(bool)] = ALIVE
+        status[numpy.unpackbits(numpy.load(os.path.join(dirname, 'dead.bits.npy')), count=size).view(bool)] = DEAD
+        return cls(status, numpy.load(os.path.join(dirname, 'checked.npy')), store, max_age)
+
+    def save(self, dirname):
+        # every file is written to a temp name and renamed, so readers never see a partial checkpoint
+        os.makedirs(dirname, exist_ok=True)
+        def write(name, save):
+            tmp = os.path.join(dirname, f'.{name}.{os.getpid()}.tmp')
+            with open(tmp, 'wb') as f:
+                save(f)
+            os.replace(tmp, os.path.join(dirname, name))
+        write('alive.bits.npy', lambda f: numpy.save(f, numpy.packbits(self.status == ALIVE)))
+        write('dead.bits.npy', lambda f: numpy.save(f, numpy.packbits(self.status == DEAD)))
+        write('checked.npy', lambda f: numpy.save(f, self.checked))
+        write(META, lambda f: f.write(json.dumps({'projects': len(self.status), 'alive': int((self.status == ALIVE).sum()),
+                                                   'dead': int((self.status == DEAD).sum()), 'updated': time.time()}).encode()))
+
+    def fresh(self, now=None):
+        return (self.status != UNKNOWN) & ((now or time.time()) - self.checked.astype(numpy.float64) <= self.max_age)
+
+    def dead_mask(self, now=None):
+        return self.fresh(now) & (self.status == DEAD)
+
+    def get(self, project, now=None):
+        # True / False for a fresh crawl result, None if unknown or stale (needs a live check)
+        row = self.store.row(project) if self.store is not None else None
+        if row is None or self.status[row] == UNKNOWN:
+            return None
+        if (now or time.time()) - float(self.checked[row]) > self.max_age:
+            return None
+        return bool(self.status[row] == ALIVE)
@@ -0,0 +1,85 @@
+###################################################
+# Offline project-liveness crawler
+#
+# Checks every project of the project store (same URL rules as
+# check_project_url) with rate-limited, concurrent HEAD requests and writes
+# compact alive/dead bitmaps aligned with the store rows. The app then drops
+# dead projects in memory and only checks URLs live for stale/unknown entries.
+# Progress is checkpointed, so an interrupted crawl resumes where it stopped:
+#
+#   $ python liveness_crawler.py ./data/Proj_info ./data/liveness --workers 64 --rate 50
+###################################################
+import argparse, threading, time
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+import project_store, url_check
+from liveness import Liveness, UNKNOWN, ALIVE, DEAD, MAX_AGE
+
+
+class RateLimiter:
+    # at most `rate` calls per second over all threads
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def crawl(store, out_dir, workers=64, rate=50.0, checkpoint_every=5000, max_age=MAX_AGE, log=print):
+    if Liveness.exists(out_dir):
+        live = Liveness.load(out_dir, store, max_age)
+    else:
+        live = Liveness.empty(len(store), store, max_age)
+    todo = numpy.flatnonzero(~live.fresh())
+    verifier = url_check.UrlVerifier(workers=workers)
+    limiter = RateLimiter(rate)
+
+    def check(row):
+        limiter.wait()
+        try:
+            status = verifier.fetch_status(url_check.project_url(store.project_ids[row]))
+        except Exception:
+            return row, UNKNOWN
+        if status == 200:
+            return row, ALIVE
+        if status in url_check.DEAD_STATUS:
+            return row, DEAD
+        return row, UNKNOWN # transient, retried by the next run
+
+    log(f'{len(todo)} of {len(store)} projects to check')
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(todo), checkpoint_every):
+            now = int(time.time())
+            for row, status in pool.map(check, todo[start:start+checkpoint_every]):
+                if status != UNKNOWN:
+                    live.status[row] = status
+                    live.checked[row] = now
+            live.save(out_dir)
+            log(f'checkpoint: {min(start + checkpoint_every, len(todo))}/{len(todo)}')
+    verifier.pool.shutdown()
+    if not len(todo):
+        live.save(out_dir)
+    return live
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl project URLs and write alive/dead bitmaps aligned with the project store')
+    parser.add_argument('proj_info', help='project store directory (project_store.py) or Proj_info.pickle.gz')
+    parser.add_argument('out_dir')
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--rate', type=float, default=50.0, help='max. requests per second')
+    parser.add_argument('--checkpoint-every', type=int, default=5000)
+    parser.add_argument('--max-age-days', type=float, default=MAX_AGE / 86400, help='re-check results older than this')
+    args = parser.parse_args()
+    if project_store.is_converted(args.proj_info):
+        store = project_store.load_store(args.proj_info)
+    else:
+        store = project_store.load_pickle(args.proj_info)
+    crawl(store, args.out_dir, args.workers, args.rate, args.checkpoint_every, args.max_age_days * 86400)
@@ -0,0 +1,230 @@
+###################################################
+# Parallel, resumable, atomic download of the (large) model file
+#
+# The file is fetched in parallel HTTP Range segments into a partial file next
+# to the destination; per-segment progress is recorded in a small state file,
+# so an interrupted download resumes where it stopped. The result is size-
+# (and, when given, sha256-) checked before it is atomically renamed into
+# place. A cross-process lock on `<dest>.lock` lets one worker download while
+# the others wait and then reuse the file.
+#
+#   $ python model_download.py <url> <dest> [--sha256 HEX] [--segments 8]
+###################################################
+import argparse, hashlib, json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+import url_check
+
+SEGMENTS = 8
+CHUNK_SIZE = 1 << 20 # bytes per read / write
+STATE_EVERY = 16 << 20 # persist segment progress every this many bytes
+
+
+class FileLock:
+    # exclusive advisory lock held on a lock file, across processes
+    def __init__(self, path, timeout=None, poll=0.5):
+        self.path = path
+        self.timeout = timeout # seconds to wait for the lock, None waits forever
+        self.poll = poll
+        self.f = None
+
+    def acquire(self):
+        self.f = open(self.path, 'a+b')
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            try:
+                _lock(self.f)
+                return self
+            except OSError:
+                if deadline is not None and time.monotonic() > deadline:
+                    self.f.close()
+                    self.f = None
+                    raise TimeoutError(f'Timed out waiting for {self.path}')
+                time.sleep(self.poll)
+
+    def release(self):
+        _unlock(self.f)
+        self.f.close()
+        self.f = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+try:
+    import fcntl
+    def _lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError: # Windows
+    import msvcrt
+    def _lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def sha256sum(path, chunk_size=CHUNK_SIZE):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def probe(session, url, timeout):
+    # (final url, size or None, ranges supported)
+    response = session.head(url, allow_redirects=True, timeout=timeout)
+    if response.status_code in (405, 501):
+        response = session.get(url, stream=True, timeout=timeout)
+        response.close()
+    response.raise_for_status()
+    size = response.headers.get('content-length')
+    ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+    return response.url, int(size) if size is not None else None, ranges
+
+
+def split(size, segments):
+    step = -(-size // segments)
+    return [[start, min(start + step, size)] for start in range(0, size, step)] or [[0, 0]]
+
+
+class _Download:
+    def __init__(self, session, url, part, size, ranges, segments, timeout, chunk_size):
+        self.session = session
+        self.url = url
+        self.part = part
+        self.state_path = part + '.json'
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        # segments: [next offset, end] per segment; only resumable if the server honours Range
+        self.segments = None
+        if ranges and size is not None:
+            self.segments = self.load_state(size) or split(size, segments)
+        self.size = size
+        self.done = size - sum(end - start for start, end in self.segments) if self.segments else 0
+
+    def load_state(self, size):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('size') != size or os.path.getsize(self.part) != size:
+            return None
+        return state['segments']
+
+    def save_state(self):
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'size': self.size, 'segments': self.segments}, f)
+        os.replace(tmp, self.state_path)
+
+    def fetch_segment(self, seg):
+        # seg[0] (what the state file records) only advances once the bytes before it are flushed
+        pos, end = seg
+        if pos >= end:
+            return
+        headers = {'Range': f'bytes={pos}-{end - 1}'}
+        with self.session.get(self.url, headers=headers, stream=True, timeout=self.timeout) as r, open(self.part, 'r+b') as f:
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise IOError(f'{self.url} ignored the Range request')
+            f.seek(pos)
+            for block in r.raw.stream(self.chunk_size, decode_content=False):
+                block = block[:end - pos]
+                f.write(block)
+                pos += len(block)
+                with self.lock:
+                    self.done += len(block)
+                if pos - seg[0] >= STATE_EVERY or pos >= end:
+                    f.flush()
+                    with self.lock:
+                        seg[0] = pos
+                        self.save_state()
+                if pos >= end:
+                    break
+        if pos < end:
+            raise IOError(f'Connection closed early while downloading {self.url}')
+
+    def fetch_stream(self):
+        # no Range support: a single sequential stream, restarted from zero
+        with self.session.get(self.url, stream=True, timeout=self.timeout) as r, open(self.part, 'wb') as f:
+            r.raise_for_status()
+            for block in r.raw.stream(self.chunk_size, decode_content=False):
+                f.write(block)
+                with self.lock:
+                    self.done += len(block)
+
+    def run(self, progress=None, poll=0.5):
+        if self.segments is None:
+            tasks = [self.fetch_stream]
+        else:
+            if not os.path.exists(self.part) or os.path.getsize(self.part) != self.size:
+                with open(self.part, 'wb') as f:
+                    f.truncate(self.size)
+            self.save_state()
+            tasks = [lambda seg=seg: self.fetch_segment(seg) for seg in self.segments]
+        reported = self.done
+        if progress and reported:
+            progress(reported)
+        # progress is reported from the calling thread (Streamlit widgets cannot be updated from the pool)
+        with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='download') as pool:
+            pending = {pool.submit(task) for task in tasks}
+            while pending:
+                finished, pending = wait(pending, timeout=poll, return_when=FIRST_EXCEPTION)
+                for future in finished:
+                    future.result()
+                if progress:
+                    with self.lock:
+                        done = self.done
+                    progress(done - reported)
+                    reported = done
+
+
+def fetch(url, dest, sha256=None, segments=SEGMENTS, session=None, progress=None, on_start=None, timeout=60, chunk_size=CHUNK_SIZE,
+          lock_timeout=None):
+    # Downloads `url` to `dest` unless it is already there; returns `dest`.
+    # `on_start(size)` is called once the size is known (None if the server does not send it),
+    # `progress(nbytes)` with the number of newly written bytes.
+    dest = os.path.abspath(dest)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with FileLock(dest + '.lock', lock_timeout):
+        if os.path.exists(dest):
+            return dest # another worker finished the download while we waited
+        session = session or url_check.make_session(segments)
+        final_url, size, ranges = probe(session, url, timeout)
+        if on_start:
+            on_start(size)
+        # partial file named after the source url (not the redirect target, which may be a temporary link),
+        # so a resumed download never mixes two files
+        part = f'{dest}.{hashlib.sha1(url.encode()).hexdigest()[:12]}.part'
+        _Download(session, final_url, part, size, ranges, segments, timeout, chunk_size).run(progress)
+
+        if size is not None and os.path.getsize(part) != size:
+            raise IOError(f'Incomplete download of {url}: {os.path.getsize(part)} of {size} bytes')
+        if sha256 and sha256sum(part) != sha256.lower():
+            os.remove(part)
+            if os.path.exists(part + '.json'):
+                os.remove(part + '.json')
+            raise IOError(f'Checksum mismatch for {url}')
+        os.replace(part, dest)
+        if os.path.exists(part + '.json'):
+            os.remove(part + '.json')
+    return dest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Download a file with parallel, resumable Range requests')
+    parser.add_argument('url')
+    parser.add_argument('dest')
+    parser.add_argument('--sha256', help='expected checksum of the file')
+    parser.add_argument('--segments', type=int, default=SEGMENTS)
+    args = parser.parse_args()
+    fetch(args.url, args.dest, args.sha256, args.segments)
@@ -0,0 +1,90 @@
+###################################################
+# Vectorized project filters, aligned with the project partition of the DocIndex
+#
+# The recommendation table used to check every ranked candidate in Python
+# (proj_info lookup, FileInfo language, female_pct, exclude list). Here those
+# checks are compiled once into arrays over the project rows, so a query turns
+# into a boolean mask that is applied *before* top-k selection.
+###################################################
+import numpy
+from project_store import ProjectStore
+
+# languages that are not filtered on (C# projects are not tagged consistently in FileInfo)
+UNFILTERED_LANGS = ('C#',)
+
+
+class ProjectFilters:
+    def __init__(self, keys, proj_info, exclude=(), dead=None, previous=None, unchanged=()):
+        # `proj_info` is a project_store.ProjectStore or the original dict,
+        # `dead` an optional mask over the store rows (see liveness.py).
+        # `previous`: filters compiled for the same keys and store keys (e.g. of the previous data
+        # snapshot, see snapshots.py); its key -> row mapping and the bitsets of the `unchanged`
+        # languages are reused
+        n = len(keys)
+        self.size = n
+        if isinstance(proj_info, ProjectStore):
+            self._compile_store(keys, proj_info, dead, previous, unchanged)
+        else:
+            self._compile_dict(keys, proj_info)
+        self.excluded = numpy.zeros(n, dtype=bool)
+        key_to_index = {k: i for i, k in enumerate(keys)}
+        self.excluded[[key_to_index[k] for k in exclude if k in key_to_index]] = True
+
+    def _compile_store(self, keys, store, dead=None, previous=None, unchanged=()):
+        rows = previous.rows if previous is not None else store.rows_for(keys)
+        self.rows = rows # store row of every key, -1 if unknown
+        listed = rows >= 0
+        self.known = listed.copy() # has an entry in proj_info
+        if dead is not None:
+            # projects the crawler found gone are never ranked
+            self.known[self.known] &= ~dead[rows[self.known]]
+        self.female_pct = numpy.full(self.size, numpy.nan)
+        self.female_pct[self.known] = store.columns['female_pct'][rows[self.known]]
+        # one packed bitset per language (over every listed project, so they do not depend on `dead`)
+        self.lang_bits = {lx: previous.lang_bits[lx] for lx in unchanged if lx in previous.lang_bits} if previous is not None else {}
+        todo = [(j, lx) for j, lx in enumerate(store.langs) if lx not in self.lang_bits]
+        if todo:
+            bitmap = numpy.asarray(store.lang_bitmap[rows[listed]])
+        for j, lx in todo:
+            bits = numpy.zeros(self.size, dtype=bool)
+            bits[listed] = (bitmap[:, j // 8] >> (7 - j % 8)) & 1 == 1
+            self.lang_bits[lx] = numpy.packbits(bits)
+
+    def _compile_dict(self, keys, proj_info):
+        self.known = numpy.zeros(self.size, dtype=bool)
+        self.female_pct = numpy.full(self.size, numpy.nan)
+        lang_rows = {}
+        for i, key in enumerate(keys):
+            info = proj_info.get(key)
+            if info is None:
+                continue
+            self.known[i] = True
+            self.female_pct[i] = info['female_pct']
+            for lx in info['FileInfo'].keys():
+                lang_rows.setdefault(lx, []).append(i)
+        self.lang_bits = {}
+        for lx, rows in lang_rows.items():
+            bits = numpy.zeros(self.size, dtype=bool)
+            bits[rows] = True
+            self.lang_bits[lx] = numpy.packbits(bits)
+
+    def lang_mask(self, lang):
+        if type(lang) == str:
+            lang = [lang]
+        if any(lx in UNFILTERED_LANGS for lx in lang):
+            return numpy.ones(self.size, dtype=bool)
+        mask = numpy.zeros(self.size, dtype=bool)
+        for lx in lang:
+            if lx in self.lang_bits:
+                mask |= numpy.unpackbits(self.lang_bits[lx], count=self.size).view(bool)
+        return mask
+
+    def mask(self, lang=None, gender_pct=None):
+        # rows that pass the same checks as `keep_project` in app.py
+        mask = self.known & ~self.excluded
+        if lang is not None:
+            mask &= self.lang_mask(lang)
+        if gender_pct is not None:
+            with numpy.errstate(invalid='ignore'):
+                mask &= self.female_pct >= gender_pct
+        return mask
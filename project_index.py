@@ -0,0 +1,217 @@
+###################################################
+# Entity-partitioned index over the document vectors (`mod.dv`)
+#
+# `mod.dv` mixes project tags (owner_repo), language tags (PY, JS, ...) and
+# developer identities (Name <email>). Project recommendations only ever need
+# the project rows, so we split the matrix once at load time and answer
+# queries with a lazily extended top-k instead of sorting all 1.27M tags.
+###################################################
+import numpy
+from skill_space import argsort_desc, unitvec
+from ann_index import ANNRankedResult
+import quantized as quant
+
+# WoC language tags, i.e. the values of `langdict` in app.py
+LANGUAGE_TAGS = ('C', 'Cs', 'Go', 'pl', 'rb', 'JS', 'PY', 'R', 'Rust', 'Scala', 'TypeScript', 'java')
+PROJECTS, LANGUAGES, DEVELOPERS, OTHER = 'projects', 'languages', 'developers', 'other'
+PARTITIONS = (PROJECTS, LANGUAGES, DEVELOPERS, OTHER)
+
+
+def classify_key(key):
+    if key in LANGUAGE_TAGS:
+        return LANGUAGES
+    if '<' in key:
+        return DEVELOPERS
+    if '_' in key:
+        return PROJECTS
+    return OTHER
+
+
+def valid_developer(key):
+    # developer identities that can be recommended as mentors
+    return 'noreply' not in key and '.' in key
+
+
+def partition_order(keys):
+    # row order that makes every partition a contiguous block (used by the model converter)
+    rank = {name: i for i, name in enumerate(PARTITIONS)}
+    return sorted(range(len(keys)), key=lambda i: rank[classify_key(keys[i])])
+
+
+class Partition:
+    def __init__(self, name, keys, rows, vectors, norms, quantized=None):
+        self.name = name
+        self.keys = keys
+        self.rows = rows # row of each entry in the full `mod.dv` matrix
+        self.vectors = vectors
+        self.norms = norms
+        self.quantized = quantized # quantized.QuantizedMatrix of this partition, if the model has one
+        self.key_to_index = {k: i for i, k in enumerate(keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def scores(self, vector):
+        # cosine similarity of every entry to `vector` (same as gensim's most_similar)
+        mean = unitvec(numpy.asarray(vector, dtype=numpy.float64)).astype(numpy.float32)
+        return numpy.dot(self.vectors, mean) / self.norms
+
+    def most_similar(self, vector, batch=64):
+        # the scan itself only runs once the result is used
+        if self.quantized is not None:
+            mean = unitvec(numpy.asarray(vector, dtype=numpy.float64)).astype(numpy.float32)
+            return RankedResult(self.keys, lambda: self.quantized.scores(mean), batch,
+                                exact=lambda rows: quant.exact_scores(self.vectors, self.norms, rows, mean))
+        return RankedResult(self.keys, lambda: self.scores(vector), batch)
+
+
+class RankedResult:
+    # Iterates (key, similarity) from most to least similar. Only the next `batch`
+    # entries are selected (argpartition) and sorted at a time; every extension
+    # grows the batch, so reading the first few results never sorts the whole partition.
+    # `rows` restricts the result to a subset of the partition (scores[i] belongs to keys[rows[i]]).
+    # `scores` can be a function, called on first use.
+    # With `exact` (partition rows -> similarities), `scores` are approximate (quantized.py):
+    # a larger candidate set is re-scored exactly before every selection.
+
+    def __init__(self, keys, scores, batch=64, rows=None, exact=None, refined=None):
+        self.keys = keys
+        self._scores = scores
+        self.batch = batch
+        self.rows = rows
+        self.exact = exact
+        self.refined = refined
+
+    @property
+    def scores(self):
+        if callable(self._scores):
+            self._scores = self._scores()
+        return self._scores
+
+    def __len__(self):
+        return len(self.scores)
+
+    @property
+    def nbytes(self):
+        # memory held while iterating: scores and their working copy, rows, refined flags
+        return 2 * self.scores.nbytes + (self.rows.nbytes if self.rows is not None else 0) + len(self)
+
+    def _key(self, i):
+        return self.keys[i] if self.rows is None else self.keys[self.rows[i]]
+
+    def _refine(self, idx):
+        # replace the approximate scores of `idx` by exact ones (each entry once)
+        if self.refined is None:
+            self.refined = numpy.zeros(len(self.scores), dtype=bool)
+        idx = idx[~self.refined[idx]]
+        if len(idx):
+            self.scores[idx] = self.exact(idx if self.rows is None else self.rows[idx])
+            self.refined[idx] = True
+
+    def _select(self, scores, k):
+        # the k best entries of `scores` (exactly re-ranked candidates when scores are approximate)
+        if self.exact is None:
+            return argsort_desc(scores, k)
+        cand = argsort_desc(scores, min(quant.candidates(k), len(scores)))
+        self._refine(cand)
+        cand_live = cand[scores[cand] != -numpy.inf] # not already emitted by __iter__
+        scores[cand_live] = self.scores[cand_live]
+        return cand[argsort_desc(scores[cand], k)]
+
+    def __iter__(self):
+        remaining = self.scores.copy()
+        done, batch = 0, self.batch
+        while done < len(remaining):
+            best = self._select(remaining, min(batch, len(remaining) - done))
+            for i in best:
+                yield self._key(i), float(self.scores[i])
+            remaining[best] = -numpy.inf
+            done += len(best)
+            batch *= 4
+
+    def top(self, k):
+        best = self._select(self.scores.copy() if self.exact is not None else self.scores, min(k, len(self.scores)))
+        return [(self._key(i), float(self.scores[i])) for i in best]
+
+    def restrict(self, mask):
+        # keep only the partition rows where `mask` is True (see project_filters.py)
+        keep = numpy.flatnonzero(mask if self.rows is None else mask[self.rows])
+        rows = keep if self.rows is None else self.rows[keep]
+        return RankedResult(self.keys, self.scores[keep], self.batch, rows, self.exact,
+                            self.refined[keep] if self.refined is not None else None)
+
+
+class DocIndex:
+    def __init__(self, dv, previous=None, unchanged=()):
+        # `unchanged`: partitions whose keys and vectors are the same as in the DocIndex `previous`
+        # (e.g. of the previous data snapshot, see snapshots.py); those are reused as they are
+        keys = list(dv.index_to_key)
+        labels = numpy.array([PARTITIONS.index(classify_key(k)) for k in keys], dtype=numpy.int8)
+        vectors = dv.vectors
+        qv = getattr(dv, 'quantized', None)
+        norms = getattr(dv, 'norms', None)
+        if norms is None:
+            dv.fill_norms()
+            norms = dv.norms
+
+        self.partitions = {}
+        for i, name in enumerate(PARTITIONS):
+            if previous is not None and name in unchanged:
+                self.partitions[name] = previous.partitions[name]
+                continue
+            rows = numpy.flatnonzero(labels == i)
+            if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+                # contiguous block (converted model): a zero-copy view of the mmap
+                sl = slice(rows[0], rows[-1] + 1)
+                part_vectors, part_norms = vectors[sl], norms[sl]
+                part_quantized = qv[sl] if qv is not None else None
+            else:
+                part_vectors, part_norms = vectors[rows], norms[rows]
+                part_quantized = qv[rows] if qv is not None else None
+            self.partitions[name] = Partition(name, [keys[r] for r in rows], rows, part_vectors, part_norms, part_quantized)
+        self.ann = {}
+        devs = self.partitions[DEVELOPERS]
+        if previous is not None and DEVELOPERS in unchanged:
+            self.valid_developers = previous.valid_developers
+        else:
+            self.valid_developers = numpy.fromiter((valid_developer(k) for k in devs.keys), dtype=bool, count=len(devs))
+
+    def __getitem__(self, name):
+        return self.partitions[name]
+
+    def attach_ann(self, ivf, partition=PROJECTS):
+        # use an ann_index.IVFIndex (built over this partition) for retrieval
+        if int(ivf.offsets[-1]) != len(self.partitions[partition]):
+            raise ValueError(f'ANN index does not match the {partition} partition, rebuild it with ann_index.py')
+        self.ann[partition] = ivf
+
+    def most_similar(self, vector, partition=PROJECTS, batch=64, exact=False):
+        if not exact and partition in self.ann:
+            return ANNRankedResult(self.partitions[partition], self.ann[partition], vector)
+        return self.partitions[partition].most_similar(vector, batch)
+
+    def rank_developers(self, vector, developers, topn=10):
+        # [(developer, cosine similarity)] of the `topn` developers most similar to `vector`: the keys are
+        # mapped to developer rows once, filtered with `valid_developers`, and scored with one gather + one product
+        devs = self.partitions[DEVELOPERS]
+        developers = list(developers)
+        rows = numpy.fromiter((devs.key_to_index.get(dev, -1) for dev in developers), dtype=numpy.int64, count=len(developers))
+        keep = rows >= 0
+        keep[keep] = self.valid_developers[rows[keep]]
+        order = numpy.flatnonzero(keep)
+        vectors, norms = devs.vectors[rows[keep]], devs.norms[rows[keep]]
+        # developer ids that were tagged like another entity type (no '<', so not in the developer partition)
+        extra = [(i, part, part.key_to_index[dev]) for i, dev in enumerate(developers) if rows[i] < 0 and valid_developer(dev)
+                 for part in self.partitions.values() if dev in part.key_to_index]
+        if extra:
+            order = numpy.concatenate([order, [i for i, _, _ in extra]])
+            vectors = numpy.concatenate([vectors, [part.vectors[row] for _, part, row in extra]])
+            norms = numpy.concatenate([norms, [part.norms[row] for _, part, row in extra]])
+            inorder = numpy.argsort(order, kind='stable')
+            order, vectors, norms = order[inorder], vectors[inorder], norms[inorder]
+        if not len(order):
+            return []
+        vector = numpy.asarray(vector, dtype=numpy.float64)
+        sims = numpy.dot(vectors, vector) / (norms * numpy.sqrt(numpy.dot(vector, vector)))
+        best = numpy.argsort(-sims, kind='stable')[:topn]
+        return [(developers[order[i]], float(sims[i])) for i in best]
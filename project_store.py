@@ -0,0 +1,154 @@
+###################################################
+# Columnar project-metadata store (replaces unpickling Proj_info.pickle.gz on every rerun)
+#
+# Proj_info.pickle.gz is a dict {project: {'NumStars', 'NumForks', 'NumAuthors',
+# 'female_pct', 'FileInfo': {lang: ...}, 'Core': {developer: ...}}} plus a
+# 'langs' set. Here every field is a typed column (.npy, memory-mappable):
+# FileInfo becomes a packed language bitmap and Core a CSR adjacency list.
+# ProjectStore is a read-only Mapping, so `proj_info[prj]['NumStars']` style
+# call sites keep working, while vectorized code uses the columns directly.
+#
+# One-time conversion:
+#   $ python project_store.py ./data/Proj_info.pickle.gz ./data/Proj_info
+###################################################
+import gzip, json, os, pickle, sys
+from collections.abc import Mapping
+import numpy
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+INT_COLUMNS = ('NumStars', 'NumForks', 'NumAuthors')
+
+
+class ProjectStore(Mapping):
+    def __init__(self, project_ids, langs, columns, lang_bitmap, core_offsets, core_ids, core_names, path=None):
+        self.project_ids = project_ids # in the order of the original dict
+        self.langs = langs # every language that appears in FileInfo
+        self.columns = columns # NumStars / NumForks / NumAuthors (int64) and female_pct (float64)
+        self.lang_bitmap = lang_bitmap # (n, ceil(len(langs)/8)) uint8, bit j = project has langs[j]
+        self.core_offsets = core_offsets # core developers of row i: core_names[core_ids[core_offsets[i]:core_offsets[i+1]]]
+        self.core_ids = core_ids
+        self.core_names = core_names
+        self.path = path
+        self.key_to_row = {k: i for i, k in enumerate(project_ids)}
+        self.lang_to_col = {lx: j for j, lx in enumerate(langs)}
+
+    ###################################################
+    # Mapping interface (drop-in for the proj_info dict)
+    ###################################################
+    def __len__(self):
+        return len(self.project_ids)
+
+    def __iter__(self):
+        return iter(self.project_ids)
+
+    def __contains__(self, key):
+        return key in self.key_to_row
+
+    def __getitem__(self, key):
+        return self.info(self.key_to_row[key])
+
+    def row(self, key):
+        return self.key_to_row.get(key)
+
+    def info(self, row):
+        # per-project dict in the shape of the original pickle
+        info = {name: col[row].item() for name, col in self.columns.items()}
+        info['FileInfo'] = dict.fromkeys(self.row_langs(row), 1)
+        info['Core'] = dict.fromkeys(self.row_cores(row), 1)
+        return info
+
+    def row_langs(self, row):
+        bits = numpy.unpackbits(self.lang_bitmap[row], count=len(self.langs))
+        return [self.langs[j] for j in numpy.flatnonzero(bits)]
+
+    def row_cores(self, row):
+        return [self.core_names[c] for c in self.core_ids[self.core_offsets[row]:self.core_offsets[row+1]]]
+
+    ###################################################
+    # Columnar access
+    ###################################################
+    def lang_mask(self, lang, rows=None):
+        # boolean mask of the projects (or of `rows`) that contain `lang`
+        bitmap = self.lang_bitmap if rows is None else self.lang_bitmap[rows]
+        j = self.lang_to_col.get(lang)
+        if j is None:
+            return numpy.zeros(len(bitmap), dtype=bool)
+        return (bitmap[:, j // 8] >> (7 - j % 8)) & 1 == 1
+
+    def rows_for(self, keys):
+        # store row of every key, -1 where the project is unknown
+        return numpy.fromiter((self.key_to_row.get(k, -1) for k in keys), dtype=numpy.int64, count=len(keys))
+
+
+###################################################
+# Building, saving & loading
+###################################################
+def from_proj_info(proj_info):
+    proj_info = dict(proj_info)
+    langs = sorted(proj_info.pop('langs', set()) | {lx for v in proj_info.values() for lx in v['FileInfo'].keys()})
+    keys = list(proj_info.keys())
+    n = len(keys)
+    lang_to_col = {lx: j for j, lx in enumerate(langs)}
+
+    columns = {name: numpy.fromiter((int(v[name]) for v in proj_info.values()), dtype=numpy.int64, count=n)
+               for name in INT_COLUMNS}
+    columns['female_pct'] = numpy.fromiter((v['female_pct'] for v in proj_info.values()), dtype=numpy.float64, count=n)
+
+    bits = numpy.zeros((n, len(langs)), dtype=bool)
+    core_offsets = numpy.zeros(n + 1, dtype=numpy.int64)
+    core_ids, core_names, core_to_id = [], [], {}
+    for i, v in enumerate(proj_info.values()):
+        bits[i, [lang_to_col[lx] for lx in v['FileInfo'].keys()]] = True
+        for core in v['Core'].keys():
+            if core not in core_to_id:
+                core_to_id[core] = len(core_names)
+                core_names.append(core)
+            core_ids.append(core_to_id[core])
+        core_offsets[i+1] = len(core_ids)
+    return ProjectStore(keys, langs, columns, numpy.packbits(bits, axis=1), core_offsets,
+                        numpy.array(core_ids, dtype=numpy.int32), core_names)
+
+
+def load_pickle(filename):
+    with gzip.open(filename, 'rb') as f:
+        return from_proj_info(pickle.load(f))
+
+
+def save_store(store, dirname):
+    os.makedirs(dirname, exist_ok=True)
+    for name, col in store.columns.items():
+        numpy.save(os.path.join(dirname, f'{name}.npy'), col)
+    numpy.save(os.path.join(dirname, 'lang_bitmap.npy'), store.lang_bitmap)
+    numpy.save(os.path.join(dirname, 'core_offsets.npy'), store.core_offsets)
+    numpy.save(os.path.join(dirname, 'core_ids.npy'), store.core_ids)
+    for name, values in (('keys', store.project_ids), ('langs', store.langs), ('core_names', store.core_names)):
+        with open(os.path.join(dirname, f'{name}.json'), 'w', encoding='utf-8') as f:
+            json.dump(values, f, ensure_ascii=False)
+    # manifest is written last, so a half-written directory is never picked up
+    with open(os.path.join(dirname, MANIFEST), 'w') as f:
+        json.dump({'format': FORMAT_VERSION, 'projects': len(store), 'columns': list(store.columns)}, f)
+
+
+def is_converted(dirname):
+    return os.path.isfile(os.path.join(dirname, MANIFEST))
+
+
+def load_store(dirname, mmap_mode='r'):
+    with open(os.path.join(dirname, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported project store format in {dirname}: {manifest.get('format')}")
+    load = lambda name: numpy.load(os.path.join(dirname, f'{name}.npy'), mmap_mode=mmap_mode)
+    names = {}
+    for name in ('keys', 'langs', 'core_names'):
+        with open(os.path.join(dirname, f'{name}.json'), encoding='utf-8') as f:
+            names[name] = json.load(f)
+    return ProjectStore(names['keys'], names['langs'], {name: load(name) for name in manifest['columns']},
+                        load('lang_bitmap'), load('core_offsets'), load('core_ids'), names['core_names'], path=dirname)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(f'usage: python {sys.argv[0]} <Proj_info.pickle.gz> <output dir>')
+    save_store(load_pickle(sys.argv[1]), sys.argv[2])
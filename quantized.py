@@ -0,0 +1,126 @@
+###################################################
+# Quantized (float16 / int8) copies of the Skill Space matrices
+#
+# The unit-normalised rows of `mod.dv` / `mod.wv` are stored as float16, or as
+# int8 with one scale per row (row ~= codes * scale). Similarity scans run over
+# the quantized matrix (2x / 4x fewer bytes to read and keep resident) to pick
+# a candidate set, which is then re-ranked exactly with the float32 vectors;
+# only the candidate rows of the float32 mmap are ever touched.
+#
+# One-time conversion of a converted model (skill_space.py):
+#   $ python quantized.py ./data/doc2vec.U.PtAlAPI_U.ep1 --kind int8
+# Accuracy against the float32 rankings:
+#   $ python -m benchmarks.quantized_accuracy ./data/doc2vec.U.PtAlAPI_U.ep1
+###################################################
+import argparse, json, os
+import numpy
+
+KINDS = ('float16', 'int8')
+META = 'quantized.json'
+OVERSAMPLE = 4 # candidates re-ranked exactly per requested result
+MIN_CANDIDATES = 256
+
+
+def candidates(k):
+    # size of the candidate set re-ranked exactly for a top-k
+    return max(k * OVERSAMPLE, MIN_CANDIDATES)
+
+
+class QuantizedMatrix:
+    def __init__(self, codes, scales=None):
+        self.codes = codes # float16 unit rows, or int8 codes of the unit rows
+        self.scales = scales # float32 per-row scale for int8, None for float16
+        self.kind = 'int8' if scales is not None else 'float16'
+
+    @classmethod
+    def from_vectors(cls, vectors, norms, kind='int8', chunk=65536):
+        if kind not in KINDS:
+            raise ValueError(f'Unknown quantization {kind!r}, expected one of {KINDS}')
+        codes = numpy.empty(vectors.shape, dtype=numpy.int8 if kind == 'int8' else numpy.float16)
+        scales = numpy.empty(len(vectors), dtype=numpy.float32) if kind == 'int8' else None
+        for start in range(0, len(vectors), chunk):
+            block = numpy.asarray(vectors[start:start+chunk], dtype=numpy.float32)
+            n = numpy.asarray(norms[start:start+chunk], dtype=numpy.float32)
+            block = block / numpy.where(n > 0, n, 1.0)[:, None]
+            if kind == 'float16':
+                codes[start:start+chunk] = block
+                continue
+            scale = numpy.abs(block).max(axis=1) / 127
+            scale[scale == 0] = 1.0
+            codes[start:start+chunk] = numpy.rint(block / scale[:, None])
+            scales[start:start+chunk] = scale
+        return cls(codes, scales)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        # rows (slice or index array) as another QuantizedMatrix, e.g. one DocIndex partition
+        return QuantizedMatrix(self.codes[rows], self.scales[rows] if self.scales is not None else None)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, mean, block=1024):
+        # approximate cosine similarity of every row to the unit vector `mean`; small blocks keep
+        # the float32 copy of each block in cache
+        mean = numpy.asarray(mean, dtype=numpy.float32)
+        out = numpy.empty(len(self.codes), dtype=numpy.float32)
+        for start in range(0, len(self.codes), block):
+            out[start:start+block] = numpy.dot(self.codes[start:start+block].astype(numpy.float32), mean)
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+
+def exact_scores(vectors, norms, rows, mean):
+    # float32 cosine similarity of `rows` (read in ascending order, so the mmap is read sequentially)
+    order = numpy.argsort(rows, kind='stable')
+    out = numpy.empty(len(rows), dtype=numpy.float32)
+    sorted_rows = numpy.asarray(rows)[order]
+    out[order] = numpy.dot(vectors[sorted_rows], mean) / norms[sorted_rows]
+    return out
+
+
+###################################################
+# Saving & loading (next to the float32 files of a converted model)
+###################################################
+def exists(dirname):
+    return os.path.isfile(os.path.join(dirname, META))
+
+
+def save(dirname, matrices):
+    # matrices: {'dv': QuantizedMatrix, 'wv': QuantizedMatrix}
+    for prefix, q in matrices.items():
+        numpy.save(os.path.join(dirname, f'{prefix}.{q.kind}.npy'), q.codes)
+        if q.scales is not None:
+            numpy.save(os.path.join(dirname, f'{prefix}.scales.npy'), q.scales)
+    # metadata is written last, so a half-written set is never picked up
+    with open(os.path.join(dirname, META), 'w') as f:
+        json.dump({prefix: q.kind for prefix, q in matrices.items()}, f)
+
+
+def load(dirname, mmap_mode='r'):
+    with open(os.path.join(dirname, META)) as f:
+        kinds = json.load(f)
+    matrices = {}
+    for prefix, kind in kinds.items():
+        codes = numpy.load(os.path.join(dirname, f'{prefix}.{kind}.npy'), mmap_mode=mmap_mode)
+        scales = numpy.load(os.path.join(dirname, f'{prefix}.scales.npy'), mmap_mode=mmap_mode) if kind == 'int8' else None
+        matrices[prefix] = QuantizedMatrix(codes, scales)
+    return matrices
+
+
+def quantize_model(dirname, kind='int8'):
+    import skill_space
+    mod = skill_space.load_model(dirname)
+    save(dirname, {prefix: QuantizedMatrix.from_vectors(kv.vectors, kv.norms, kind) for prefix, kv in (('dv', mod.dv), ('wv', mod.wv))})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write float16 / int8 copies of a converted Skill Space model')
+    parser.add_argument('model_dir', help='converted model directory (skill_space.py)')
+    parser.add_argument('--kind', choices=KINDS, default='int8')
+    args = parser.parse_args()
+    quantize_model(args.model_dir, args.kind)
@@ -0,0 +1,226 @@
+###################################################
+# Two-level query-result cache, plus resumable result cursors
+#
+# Level 1: normalised inputs (mode, languages, APIs) -> composed query vector.
+# Level 2: query vector + filters (language, gender_pct, k, diversity flag) ->
+#          final ranked rows, after filtering and URL checks.
+# Both levels are bounded LRUs with a TTL and hit/miss counters.
+# Cursors: per session, query vector + filters (without k) -> the lazy ranked,
+#          filtered and URL-checked result stream, suspended after the rows
+#          produced so far; a larger k continues it instead of starting over.
+#          Cursors hold ranking arrays, so they are evicted (least recently
+#          used first) to stay within a memory budget, and after an idle TTL.
+# Everything is dropped when the model or project metadata version changes.
+###################################################
+import hashlib, os, threading, time
+from collections import OrderedDict, defaultdict
+import numpy
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict() # key -> (expires, value), least recently used first
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                del self.data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl if self.ttl else None, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        return {'size': len(self.data), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+def normalize_names(names):
+    # order-insensitive key for a ';'-separated string or list of names. Case and
+    # repetitions are kept: API keys are case-sensitive and every occurrence is
+    # added to the query vector, so they change the result.
+    if isinstance(names, str):
+        names = names.split(';')
+    return tuple(sorted(x.strip() for x in names))
+
+
+def query_key(mode, *args):
+    # level-1 key: ('exp', languages, apis) or ('trans', source_lang, dest_lang, apis)
+    if mode == 'exp':
+        languages, apis = args
+        return (mode, normalize_names(languages), normalize_names(apis))
+    source_lang, dest_lang, apis = args
+    return (mode, source_lang, dest_lang, normalize_names(apis))
+
+
+def result_key(vector, lang, gender_pct, k, is_diversity):
+    # level-2 key; gender_pct only matters when the diversity filter is on
+    digest = hashlib.sha1(numpy.ascontiguousarray(vector, dtype=numpy.float64).tobytes()).hexdigest()
+    lang = lang if type(lang) == str else normalize_names(lang)
+    return (digest, lang, gender_pct if is_diversity else None, k, bool(is_diversity))
+
+
+def cursor_key(session, vector, lang, gender_pct, is_diversity):
+    # cursor key: the level-2 key of one session, without k
+    return (session,) + result_key(vector, lang, gender_pct, None, is_diversity)
+
+
+def data_version(*sources):
+    # identifies the loaded model / project metadata: path + mtime of on-disk stores, identity otherwise
+    version = []
+    for src in sources:
+        path = getattr(src, 'path', None)
+        if path and os.path.isfile(os.path.join(path, 'manifest.json')):
+            version.append((path, os.path.getmtime(os.path.join(path, 'manifest.json'))))
+        else:
+            version.append(id(src))
+    return tuple(version)
+
+
+class ResultCursor:
+    # The first rows of a lazy result stream, extended on demand. `items` yields the
+    # qualifying results best first; `make_row(item)` -> (table row, core developers).
+    ROW_BYTES = 512 # rough size of one produced row, for the memory budget
+
+    def __init__(self, items, make_row, nbytes=0):
+        self.items = iter(items)
+        self.make_row = make_row
+        self.rows = []
+        self.row_cores = []
+        self.stream_bytes = nbytes # arrays held by the suspended stream (see RankedResult.nbytes)
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    @property
+    def exhausted(self):
+        return self.items is None
+
+    @property
+    def nbytes(self):
+        return self.stream_bytes + len(self.rows) * self.ROW_BYTES
+
+    def take(self, k):
+        # (first k rows, {core developer: [project URLs]} of them), extending the stream if needed
+        with self.lock:
+            self.last_used = time.monotonic()
+            while len(self.rows) < k and self.items is not None:
+                try:
+                    item = next(self.items)
+                except StopIteration:
+                    # nothing more to rank: release the stream's arrays
+                    self.items, self.stream_bytes = None, 0
+                    break
+                row, cores = self.make_row(item)
+                self.rows.append(row)
+                self.row_cores.append(cores)
+            cores = defaultdict(list)
+            for row, row_cores in zip(self.rows[:k], self.row_cores[:k]):
+                for core in row_cores:
+                    cores[core].append(row[0])
+            return self.rows[:k], cores
+
+
+class CursorStore:
+    def __init__(self, budget=256 << 20, ttl=900):
+        self.budget = budget # bytes held by all cursors
+        self.ttl = ttl # seconds a cursor may stay unused
+        self.cursors = OrderedDict() # key -> ResultCursor, least recently used first
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            cursor = self.cursors.get(key)
+            if cursor is not None and cursor.last_used + self.ttl < time.monotonic():
+                del self.cursors[key]
+                self.evictions += 1
+                cursor = None
+            if cursor is None:
+                self.misses += 1
+                return None
+            self.cursors.move_to_end(key)
+            self.hits += 1
+            return cursor
+
+    def put(self, key, cursor):
+        with self.lock:
+            self.cursors[key] = cursor
+            self.cursors.move_to_end(key)
+            self._evict()
+
+    def discard(self, key):
+        with self.lock:
+            self.cursors.pop(key, None)
+
+    def trim(self):
+        # re-check the budget after cursors grew
+        with self.lock:
+            self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, c in self.cursors.items() if c.last_used + self.ttl < now]:
+            del self.cursors[key]
+            self.evictions += 1
+        # the most recently used cursor is always kept
+        while len(self.cursors) > 1 and self.nbytes > self.budget:
+            self.cursors.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.cursors.values())
+
+    def clear(self):
+        with self.lock:
+            self.cursors.clear()
+
+    def __len__(self):
+        return len(self.cursors)
+
+    def stats(self):
+        return {'size': len(self.cursors), 'bytes': self.nbytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
+
+
+class QueryCache:
+    def __init__(self, vector_size=4096, result_size=1024, ttl=3600, cursor_budget=256 << 20, cursor_ttl=900):
+        self.vectors = LRUCache(vector_size, ttl)
+        self.results = LRUCache(result_size, ttl)
+        self.cursors = CursorStore(cursor_budget, cursor_ttl)
+        self.version = None
+        self.lock = threading.Lock()
+
+    def validate(self, version):
+        # drop everything when the underlying data changed
+        with self.lock:
+            if version != self.version:
+                self.vectors.clear()
+                self.results.clear()
+                self.cursors.clear()
+                self.version = version
+
+    def stats(self):
+        return {'vectors': self.vectors.stats(), 'results': self.results.stats(), 'cursors': self.cursors.stats()}
@@ -0,0 +1,93 @@
+###################################################
+# Thin client of the shared recommendation server (recommend_server.py)
+#
+#   client = RecommendationClient('http://127.0.0.1:8750')    # or 'unix:/tmp/skill_space.sock'
+#   client.recommend({'languages': ['Python'], 'apis': 'numpy;pandas', 'k': 10, 'mentors': True})
+#
+# Standard library only; every thread keeps its own keep-alive connection, so
+# one client can be shared by all sessions of a process. Invalid profiles raise
+# ValueError with the server's message, like the local recommendation
+# functions; 503 / 504 answers raise ServerBusy, and a profile pinned to another
+# data snapshot than the server's ("snapshot") raises SnapshotMismatch.
+###################################################
+import http.client, json, socket, threading
+from urllib.parse import urlsplit
+
+
+class ServerBusy(RuntimeError):
+    pass
+
+
+class SnapshotMismatch(RuntimeError):
+    pass
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class RecommendationClient:
+    def __init__(self, address, timeout=30):
+        # address: 'http://host:port' or 'unix:/path/to/socket'
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        if self.address.startswith('unix:'):
+            return _UnixConnection(self.address[len('unix:'):], self.timeout)
+        url = urlsplit(self.address)
+        return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=self.timeout)
+
+    def _send(self, method, path, body):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        try:
+            conn.request(method, path, body, {'Content-Type': 'application/json'} if body else {})
+            response = conn.getresponse()
+            return response.status, json.loads(response.read() or b'{}')
+        except Exception:
+            conn.close()
+            self._local.conn = None
+            raise
+
+    def request(self, method, path, obj=None):
+        body = json.dumps(obj).encode('utf-8') if obj is not None else None
+        try:
+            status, result = self._send(method, path, body)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # the server closed an idle keep-alive connection (or restarted): retry once on a new one
+            status, result = self._send(method, path, body)
+        if status == 400:
+            raise ValueError(result.get('error'))
+        if status in (503, 504):
+            raise ServerBusy(result.get('error'))
+        if status == 409:
+            raise SnapshotMismatch(result.get('error'))
+        if status != 200:
+            raise RuntimeError(f'recommendation server answered {status}: {result.get("error")}')
+        return result
+
+    def recommend(self, profile, deadline_ms=None):
+        # profile in the batch format of recommender.py, plus "k" (and "snapshot"); returns
+        # {'projects': [...], 'apis': [[api, similarity], ...], 'mentors': [...]}
+        if deadline_ms is not None:
+            profile = dict(profile, deadline_ms=deadline_ms)
+        return self.request('POST', '/recommend', profile)
+
+    def stats(self):
+        return self.request('GET', '/stats')
+
+    def health(self):
+        try:
+            return self.request('GET', '/health').get('ok', False)
+        except (OSError, RuntimeError):
+            return False
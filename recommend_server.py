@@ -0,0 +1,304 @@
+###################################################
+# Shared recommendation server with micro-batching
+#
+#   $ python recommend_server.py --port 8750 --verify --url-cache ./data/url_cache.sqlite
+#   $ python recommend_server.py --socket /tmp/skill_space.sock
+#   $ python recommend_server.py --snapshots ./data/snapshots --verify
+#   $ SKILL_SPACE_SERVER=http://127.0.0.1:8750 streamlit run app.py
+#
+# One process holds one copy of the Skill Space vectors and project metadata
+# (recommender.py) and answers the expertise / skill-transfer / popularity
+# requests of every Streamlit session through recommend_client.py. Similarity
+# queries that arrive within a short window (--window-ms) are scored together:
+# their query vectors are stacked into one matrix and the project matrix is read
+# once per batch (Recommender.batch_top_k) instead of once per query. URL checks,
+# API suggestions and mentors then run in the request's own thread.
+#
+# With --snapshots, the data comes from the active snapshot (snapshots.py), and
+# a newly activated one is loaded in the background and swapped in, like in the
+# app; a request is answered from the snapshot it started with.
+#
+# Endpoints (JSON):
+#   POST /recommend  one profile in the batch format of recommender.py, plus
+#                    optional "k", "deadline_ms" and "snapshot"; returns its result object
+#   GET  /stats      batch / queue counters, served snapshot
+#   GET  /health     served snapshot
+# Backpressure: at most --max-pending queries wait for a batch, further ones get
+# 503 straight away. A query still waiting when its deadline passes is dropped
+# from its batch and gets 504. Invalid profiles (unknown API / language) get 400.
+# A profile whose "snapshot" is not the served one gets 409, so that a client on
+# another data version can answer it itself.
+###################################################
+import argparse, json, os, queue, socketserver, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import recommender, snapshots, tracing, url_check
+
+MAX_K = 100
+
+
+class Overloaded(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class SnapshotMismatch(Exception):
+    pass
+
+
+class _Query:
+    def __init__(self, rec, vector, mask, fetch, deadline):
+        self.rec = rec # the Recommender the mask was built with, and that scores the query
+        self.vector = vector
+        self.mask = mask
+        self.fetch = fetch
+        self.deadline = deadline # time.monotonic() value
+        self.top = None
+        self.error = None
+        self.batch_size = 0
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    # collects the queries of concurrent requests and scores them in one matrix-matrix pass
+    def __init__(self, rec, window=0.002, max_batch=64, max_pending=256):
+        self.rec = rec
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = queue.Queue(max_pending)
+        self.stats = {'queries': 0, 'batches': 0, 'largest_batch': 0, 'rejected': 0, 'expired': 0}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def top_k(self, vector, mask, fetch, deadline, rec=None):
+        # [(partition row, similarity)] of one query; blocks until its batch has been scored
+        q = _Query(rec or self.rec, vector, mask, fetch, deadline)
+        try:
+            self.pending.put_nowait(q)
+        except queue.Full:
+            self._count('rejected')
+            raise Overloaded(f'more than {self.pending.maxsize} queries waiting')
+        if not q.done.wait(max(0.0, deadline - time.monotonic())):
+            raise DeadlineExceeded('deadline exceeded before the query was scored')
+        if q.error is not None:
+            raise q.error
+        return q.top, q.batch_size
+
+    def _collect(self):
+        # first waiting query, then whatever else is queued or arrives within the window (queries
+        # that arrived while the previous batch was scored are always taken, even with window=0)
+        batch = [self.pending.get()]
+        end = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.pending.get(timeout=max(0.0, end - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            now = time.monotonic()
+            live = [q for q in batch if q.deadline > now]
+            if len(live) < len(batch):
+                self._count('expired', len(batch) - len(live))
+            # around a snapshot swap, queries of the old and the new data are scored separately
+            groups = {}
+            for q in live:
+                groups.setdefault(id(q.rec), []).append(q)
+            for group in groups.values():
+                self._score(group)
+
+    def _score(self, batch):
+        try:
+            tops = batch[0].rec.batch_top_k([q.vector for q in batch], [q.mask for q in batch], max(q.fetch for q in batch))
+        except Exception as e: # reported to every request of the batch
+            tops = [None] * len(batch)
+            for q in batch:
+                q.error = e
+        with self._lock:
+            self.stats['queries'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+        for q, top in zip(batch, tops):
+            q.top = top[:q.fetch] if top is not None else None
+            q.batch_size = len(batch)
+            q.done.set()
+
+
+class RecommendationService:
+    def __init__(self, rec, batcher, deadline_ms=5000):
+        self.rec = rec
+        self.batcher = batcher
+        self.deadline_ms = deadline_ms
+        self.swaps = 0
+
+    @property
+    def version(self):
+        # served snapshot, None without --snapshots
+        return self.rec.snapshot.version if self.rec.snapshot is not None else None
+
+    def swap(self, data, verifier=None):
+        # serve the snapshots.SnapshotData `data` from now on (SnapshotManager.on_swap)
+        rec = recommender.Recommender.from_snapshot(data, verifier)
+        # one reference assignment: a request keeps the Recommender it started with
+        self.rec = self.batcher.rec = rec
+        self.swaps += 1
+
+    def recommend(self, profile):
+        rec = self.rec
+        k = int(profile.get('k', 10))
+        if not 0 < k <= MAX_K:
+            raise ValueError(f'k must be between 1 and {MAX_K}')
+        version = rec.snapshot.version if rec.snapshot is not None else None
+        if profile.get('snapshot') and profile['snapshot'] != version:
+            raise SnapshotMismatch(f"serving snapshot {version}, not {profile['snapshot']}")
+        deadline = time.monotonic() + float(profile.get('deadline_ms', self.deadline_ms)) / 1000
+        result = {'id': profile.get('id'), 'snapshot': version}
+        if profile.get('mode') == 'popularity':
+            # leaderboard walk, no similarity scan to share
+            lang = profile.get('languages') or 'ALL'
+            lang = lang[0] if type(lang) == list else lang
+            result['projects'] = rec.popularity(lang, profile.get('metric', 'NumStars'), k, profile.get('gender_pct'))
+            return result
+        with tracing.span('query_vector'):
+            vector, lang = rec.profile_query(profile, result)
+        with tracing.span('filter'):
+            mask = rec.filters.mask(lang, profile.get('gender_pct'))
+        with tracing.span('scan'): # waiting for the batch included
+            top, batch_size = self.batcher.top_k(vector, mask, rec.fetch_size(k), deadline, rec)
+        tracing.count('batch_size', batch_size)
+        with tracing.span('finish'): # rows and mentors; iter_verified traces its URL checks as 'url_check'
+            return rec.finish(result, profile, vector, top, k)
+
+
+###################################################
+# HTTP over TCP (localhost) or a Unix socket
+###################################################
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive: clients reuse one connection per thread
+    disable_nagle_algorithm = True # headers and body are separate writes (TCP only)
+    service = None # set by make_server
+    quiet = True
+
+    def address_string(self):
+        # client_address is an empty string for Unix sockets
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status, obj, headers=()):
+        body = json.dumps(obj, default=float).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, {'ok': True, 'snapshot': self.service.version})
+        elif self.path == '/stats':
+            batcher = self.service.batcher
+            self.send_json(200, dict(batcher.stats, pending=batcher.pending.qsize(), snapshot=self.service.version, swaps=self.service.swaps))
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/recommend':
+            self.send_json(404, {'error': 'not found'})
+            return
+        try:
+            profile = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError:
+            self.send_json(400, {'error': 'request body is not JSON'})
+            return
+        mode = 'popularity' if profile.get('mode') == 'popularity' else 'trans' if profile.get('dest_lang') else 'exp'
+        try:
+            with tracing.trace(f'server_{mode}', {k: v for k, v in profile.items() if k != 'id'}):
+                result = self.service.recommend(profile)
+        except (KeyError, ValueError) as e: # unknown language / API / metric, as in Recommender.run_batch
+            self.send_json(400, {'error': str(e)})
+        except Overloaded as e:
+            self.send_json(503, {'error': str(e)}, [('Retry-After', '1')])
+        except DeadlineExceeded as e:
+            self.send_json(504, {'error': str(e)})
+        except SnapshotMismatch as e:
+            self.send_json(409, {'error': str(e), 'snapshot': self.service.version})
+        except Exception as e:
+            self.send_json(500, {'error': f'{type(e).__name__}: {e}'})
+        else:
+            self.send_json(200, result)
+
+
+class TCPServer(ThreadingHTTPServer):
+    request_queue_size = 128 # listen backlog; the default of 5 resets connections under bursts
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def make_server(service, host='127.0.0.1', port=8750, socket_path=None):
+    handler = type('BoundHandler', (Handler,), {'service': service, 'disable_nagle_algorithm': not socket_path})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path) # stale socket of a previous run
+        return UnixHTTPServer(socket_path, handler)
+    return TCPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shared recommendation server that micro-batches concurrent queries')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8750)
+    parser.add_argument('--socket', default=None, help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--model-dir', default='./data/doc2vec.U.PtAlAPI_U.ep1', help='converted Skill Space model (skill_space.py)')
+    parser.add_argument('--proj-info', default='./data/Proj_info', help='project store dir or Proj_info.pickle.gz')
+    parser.add_argument('--liveness-dir', default='./data/liveness', help='crawler output used to drop dead projects')
+    parser.add_argument('--snapshots', default=None, help='serve the active snapshot of this root (snapshots.py) instead of the paths above')
+    parser.add_argument('--snapshot-poll', type=float, default=30, help='seconds between checks for a newly activated snapshot')
+    parser.add_argument('--verify', action='store_true', help='check that project URLs exist (network)')
+    parser.add_argument('--url-cache', default=None, help='sqlite URL cache used with --verify')
+    parser.add_argument('--window-ms', type=float, default=2, help='how long a batch waits for more queries')
+    parser.add_argument('--max-batch', type=int, default=64, help='queries scored together at most')
+    parser.add_argument('--max-pending', type=int, default=256, help='queries waiting for a batch before new ones get 503')
+    parser.add_argument('--deadline-ms', type=float, default=5000, help="default deadline of a request (a request's 'deadline_ms' overrides it)")
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    if args.snapshots:
+        verifier = url_check.UrlVerifier(args.url_cache) if args.verify else None
+        # the watcher builds the new Recommender (warming its data) before a newly activated snapshot is swapped in
+        manager = snapshots.SnapshotManager(args.snapshots, args.snapshot_poll, on_swap=lambda data: service.swap(data, verifier),
+                                            quantized=False, ann=False, exclude=recommender.EXCLUDE)
+        if manager.active is None:
+            sys.exit(f'No active snapshot in {args.snapshots} (python snapshots.py activate ...)')
+        rec = recommender.Recommender.from_snapshot(manager.active, verifier)
+    else:
+        rec = recommender.Recommender.load(args.model_dir, args.proj_info, args.liveness_dir, args.verify, args.url_cache)
+    service = RecommendationService(rec, MicroBatcher(rec, args.window_ms / 1000, args.max_batch, args.max_pending), args.deadline_ms)
+    Handler.quiet = not args.verbose
+    server = make_server(service, args.host, args.port, args.socket)
+    print(f"Serving recommendations on {args.socket or f'http://{args.host}:{args.port}'}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
@@ -0,0 +1,388 @@
+###################################################
+# Headless recommendation engine & batch CLI
+#
+# The expertise, skill-transfer, popularity and mentor paths of app.py as a
+# plain Python API (no Streamlit), plus a batch mode that stacks the query
+# vectors of many developer profiles into one matrix and computes top-k with
+# blocked matrix-matrix products, optionally over a process pool:
+#
+#   $ python recommender.py profiles.jsonl -o recommendations.jsonl --workers 4
+#
+# Profiles are JSONL objects (or CSV rows with the same columns):
+#   {"id": "dev1", "languages": ["Python"], "apis": "numpy;pandas", "gender_pct": 30, "mentors": true}
+#   {"id": "dev2", "source_lang": "Python", "dest_lang": "Rust", "apis": "numpy", "no_api": 5}
+#   {"id": "dev3", "mode": "popularity", "languages": "Rust", "metric": "NumStars"}
+# Languages are the display names used in the app (keys of LANGDICT);
+# list-valued CSV columns are separated by ';'.
+###################################################
+import argparse, csv, json, sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy
+import skill_space, project_index, project_store, project_filters, liveness, url_check, leaderboards, api_index, vector_store
+from skill_space import unitvec
+
+LANGDICT = {'C/C++':'C', 'C#':'Cs', 'Go':'Go', 'Perl':'pl', 'Ruby':'rb', 'JavaScript':'JS',\
+    'Python':'PY', 'R':'R', 'Rust':'Rust', 'Scala':'Scala', 'TypeScript':'TypeScript',  'Java':'java'}
+
+EXCLUDE = ['frioux_dotfiles', 'auto-program_vendor', 'Reese-D_my_emacs', 'bloomberg_chromium.bb', '996icu_996.ICU', \
+    'Jackeagle_kernel_msm-3.18', 'AdrianDC_aosp_development_sony8960_q', 'docker-library_commit-warehouse'] # Exclude potential bugs in WoC
+
+METRICS = {'No. of Stars':"NumStars", 'No. of Contributors':"NumAuthors", 'No. of Forks':"NumForks"}
+
+AUTOCORRECT = 0.85 # an unknown API is replaced by its closest spelling if that is at least this similar
+AUTOCORRECT_MARGIN = 0.05 # ... and clearly closer than the next one
+
+
+def split_apis(apis):
+    # typed APIs ('a;b' or a list) without surrounding spaces and empty entries (e.g. of a trailing ';')
+    if isinstance(apis, str):
+        apis = apis.split(';')
+    return [api.strip() for api in apis if api.strip()]
+
+
+def check_apis(apis, names, autocorrect=AUTOCORRECT, suggestions=5):
+    # check typed APIs against a vector_store.KeyIndex of the API names before any scan; returns
+    # (APIs with confident corrections applied, {typed: correction}, {unknown API: suggestions})
+    checked, corrected, unknown = [], {}, {}
+    for api in split_apis(apis):
+        if api in names:
+            checked.append(api)
+            continue
+        close = names.closest(api)
+        if close and close[0][1] >= autocorrect and (len(close) == 1 or close[1][1] <= close[0][1] - AUTOCORRECT_MARGIN):
+            corrected[api] = close[0][0]
+            checked.append(close[0][0])
+        else:
+            completions = names.with_prefix(api, suggestions)
+            unknown[api] = (completions + [key for key, _ in close if key not in completions])[:suggestions]
+            checked.append(api)
+    return checked, corrected, unknown
+
+
+def validate_apis(apis, names):
+    # the check every path runs before a scan (app, batch CLI, server): (checked APIs, or None if
+    # there is an error, {typed: correction}, [error messages])
+    checked, corrected, unknown = check_apis(apis, names)
+    errors = [f'API {api} Not Found in our data' + (f" - did you mean {', '.join(suggestions)}?" if suggestions else '')
+              for api, suggestions in unknown.items()]
+    if not checked and not unknown:
+        errors.append('Please enter at least one Library/Package/API')
+    return None if errors else checked, corrected, errors
+
+
+def add_apis(poslist, apis, mod):
+    for api in split_apis(apis):
+        try:
+            poslist += mod.wv.get_vector(api)
+        except KeyError:
+            raise ValueError('API '+api+' Not Found in our data')
+    return poslist
+
+
+def expertise_vector(mod, apis, languages, langdict=LANGDICT):
+    # developer vector of recommend_project: sum of language tag and API vectors
+    poslist = numpy.zeros((mod.dv.vector_size,))
+    if type(languages) == str:
+        languages = [languages]
+    for x in languages:
+        poslist += mod.dv[langdict[x]]
+    return add_apis(poslist, apis, mod)
+
+
+def transfer_vector(mod, source_lang, dest_lang, apis, langdict=LANGDICT):
+    # developer vector of transfer_project: move from the source to the destination language
+    poslist = mod.dv[langdict[dest_lang]] - mod.dv[langdict[source_lang]]
+    return add_apis(poslist, apis, mod)
+
+
+def cos_sim(av, bv):
+    # cosine similarity of the 'sim' page and the gensim mentor ranking (bv can also be a matrix with one vector per row)
+    av, bv = numpy.asarray(av), numpy.asarray(bv)
+    return numpy.dot(bv, av)/numpy.sqrt(numpy.dot(av, av)*numpy.einsum('...i,...i', bv, bv))
+
+
+class Recommender:
+    def __init__(self, mod, store, index=None, exclude=EXCLUDE, langdict=LANGDICT, dead=None, verifier=None, filters=None):
+        self.mod = mod
+        self.store = store
+        self.index = index if index is not None else project_index.DocIndex(mod.dv)
+        self.projects = self.index[project_index.PROJECTS]
+        self.filters = filters if filters is not None else project_filters.ProjectFilters(self.projects.keys, store, exclude, dead)
+        self.exclude = exclude
+        self.langdict = langdict
+        self.dead = dead
+        self.verifier = verifier
+        self.load_args = None
+        self.snapshot = None # snapshots.SnapshotData it was built from, if any
+        self._leaderboards = None
+        self._apis = None
+        self._api_names = None
+
+    @property
+    def leaderboards(self):
+        if self._leaderboards is None:
+            self._leaderboards = self.snapshot.leaderboards if self.snapshot is not None else leaderboards.Leaderboards(self.store)
+        return self._leaderboards
+
+    @property
+    def apis(self):
+        # per-language API partitions, for the suggestions of transfer profiles
+        if self._apis is None:
+            self._apis = self.snapshot.apis if self.snapshot is not None else api_index.ApiIndex.build(self.mod)
+        return self._apis
+
+    @property
+    def api_names(self):
+        # vector_store.KeyIndex of the API names, to check profiles before any scan
+        if self._api_names is None:
+            if self.snapshot is not None:
+                self._api_names = self.snapshot.api_names
+            else:
+                self._api_names = vector_store.KeyIndex.from_keys(self.mod.wv.index_to_key)
+        return self._api_names
+
+    def suggest_apis(self, vector, dest_lang=None, topn=10):
+        # APIs of the destination language (of the whole vocabulary without one) most similar to `vector`
+        if dest_lang:
+            return self.apis.most_similar(vector, self.langdict[dest_lang], topn)
+        return self.mod.wv.most_similar(positive=[vector], topn=topn)
+
+    @classmethod
+    def load(cls, model_dir, proj_info, liveness_dir=None, verify=False, url_cache=None, quantized=False):
+        # model_dir: converted model (skill_space.py); proj_info: project store dir or Proj_info.pickle.gz
+        mod = skill_space.load_model(model_dir, quantized=quantized)
+        store = project_store.load_store(proj_info) if project_store.is_converted(proj_info) else project_store.load_pickle(proj_info)
+        live = liveness.Liveness.load(liveness_dir, store) if liveness_dir and liveness.Liveness.exists(liveness_dir) else None
+        verifier = url_check.UrlVerifier(url_cache, liveness=live) if verify else None
+        rec = cls(mod, store, dead=live.dead_mask() if live is not None else None, verifier=verifier)
+        if vector_store.exists(model_dir):
+            rec._api_names = vector_store.load(model_dir).wv.keys
+        rec.load_args = (model_dir, proj_info, liveness_dir, verify, url_cache, quantized)
+        return rec
+
+    @classmethod
+    def from_snapshot(cls, data, verifier=None):
+        # over the parts of a snapshots.SnapshotData, sharing (and warming) its index, filters, leaderboards and API partitions
+        if verifier is not None:
+            verifier = verifier.with_liveness(data.liveness)
+        rec = cls(data.mod, data.store, data.index, data.exclude, dead=data.dead(), verifier=verifier, filters=data.filters)
+        rec.snapshot = data
+        return rec
+
+    ###################################################
+    # Single queries
+    ###################################################
+    def project_rows(self, ranked, k):
+        # first k (key, similarity) of a ranking as result rows, URL-checked if a verifier is set
+        if self.verifier is not None:
+            verified = self.verifier.iter_verified(ranked, key=lambda c: c[0], batch=k)
+        else:
+            verified = ((c, url_check.project_url(c[0])) for c in ranked)
+        rows = []
+        for (key, similarity), url in verified:
+            info = self.store[key]
+            rows.append({'project': key, 'url': url, 'similarity': similarity, 'stars': info['NumStars'],
+                         'forks': info['NumForks'], 'contributors': info['NumAuthors'], 'female_pct': info['female_pct']})
+            if len(rows) >= k:
+                break
+        return rows
+
+    def ranked(self, vector, lang, gender_pct=None):
+        return self.index.most_similar(vector).restrict(self.filters.mask(lang, gender_pct))
+
+    def expertise(self, apis, languages, k=10, gender_pct=None):
+        vector = expertise_vector(self.mod, apis, languages, self.langdict)
+        return vector, self.project_rows(self.ranked(vector, languages, gender_pct), k)
+
+    def transfer(self, source_lang, dest_lang, apis, k=10, gender_pct=None, no_api=0):
+        vector = transfer_vector(self.mod, source_lang, dest_lang, apis, self.langdict)
+        rows = self.project_rows(self.ranked(vector, dest_lang, gender_pct), k)
+        apis = self.suggest_apis(vector, dest_lang, no_api) if no_api > 0 else []
+        return vector, rows, apis
+
+    def popularity(self, lang='ALL', metric='NumStars', k=10, gender_pct=None):
+        store = self.store
+        ranked = ((store.project_ids[row], None) for row in self.leaderboards.ranked(lang, metric, gender_pct)
+                  if store.project_ids[row] not in self.exclude and (self.dead is None or not self.dead[row]))
+        return self.project_rows(ranked, k)
+
+    def mentors(self, vector, projects, k=10):
+        # projects: result rows (or project keys) whose core developers are candidate mentors
+        cores = {}
+        for p in projects:
+            key = p['project'] if isinstance(p, dict) else p
+            for core in self.store.row_cores(self.store.row(key)):
+                cores.setdefault(core, []).append(p['url'] if isinstance(p, dict) else key)
+        return [{'mentor': core, 'projects': cores[core], 'similarity': sim}
+                for core, sim in self.index.rank_developers(vector, cores.keys(), k)]
+
+    ###################################################
+    # Batches
+    ###################################################
+    def batch_top_k(self, vectors, masks, k, block=65536):
+        # exact top-k project partition rows for every query vector (one row of `vectors`),
+        # restricted to the rows where the query's mask is True; queries passing the same mask object
+        # share it, and each mask is applied block by block
+        part = self.projects
+        queries = numpy.vstack([unitvec(numpy.asarray(v, dtype=numpy.float64)) for v in vectors]).astype(numpy.float32)
+        nq = len(queries)
+        shared = {}
+        for i, m in enumerate(masks):
+            shared.setdefault(id(m), (m, []))[1].append(i)
+        best_rows = numpy.empty((nq, 0), dtype=numpy.int64)
+        best_scores = numpy.empty((nq, 0), dtype=numpy.float32)
+        for start in range(0, len(part), block):
+            end = min(start + block, len(part))
+            scores = (numpy.dot(part.vectors[start:end], queries.T) / part.norms[start:end, None]).T
+            for m, rows in shared.values():
+                blocked = numpy.flatnonzero(~m[start:end])
+                if len(blocked):
+                    scores[numpy.ix_(rows, blocked)] = -numpy.inf
+            cand_rows = numpy.concatenate([best_rows, numpy.broadcast_to(numpy.arange(start, end), (nq, end - start))], axis=1)
+            cand_scores = numpy.concatenate([best_scores, scores], axis=1)
+            keep = min(k, cand_scores.shape[1])
+            top = numpy.argpartition(-cand_scores, keep - 1, axis=1)[:, :keep]
+            best_rows = numpy.take_along_axis(cand_rows, top, axis=1)
+            best_scores = numpy.take_along_axis(cand_scores, top, axis=1)
+        order = numpy.argsort(-best_scores, axis=1, kind='stable')
+        best_rows = numpy.take_along_axis(best_rows, order, axis=1)
+        best_scores = numpy.take_along_axis(best_scores, order, axis=1)
+        return [[(int(r), float(s)) for r, s in zip(rows, scores) if s > -numpy.inf] for rows, scores in zip(best_rows, best_scores)]
+
+    def profile_query(self, profile, result=None):
+        # (query vector, filter language) of an expertise / transfer profile; its APIs are checked like in
+        # the app (ValueError if one is unknown), and confident corrections are listed in result['corrected']
+        apis, corrected, errors = validate_apis(profile.get('apis', ''), self.api_names)
+        if errors:
+            raise ValueError('; '.join(errors))
+        if corrected and result is not None:
+            result['corrected'] = corrected
+        if profile.get('dest_lang'):
+            return transfer_vector(self.mod, profile['source_lang'], profile['dest_lang'], apis, self.langdict), profile['dest_lang']
+        return expertise_vector(self.mod, apis, profile.get('languages', []), self.langdict), profile.get('languages', [])
+
+    def run_batch(self, profiles, k=10, overfetch=3):
+        # results for a list of profiles, in order; similarity queries share one blocked top-k pass
+        results, queries, masks = [], [], {} # one mask per (language, gender_pct) of the batch
+        for profile in profiles:
+            result = {'id': profile.get('id')}
+            results.append(result)
+            try:
+                if profile.get('mode') == 'popularity':
+                    lang = profile.get('languages') or 'ALL'
+                    lang = lang[0] if type(lang) == list else lang
+                    result['projects'] = self.popularity(lang, profile.get('metric', 'NumStars'), k, profile.get('gender_pct'))
+                    continue
+                vector, lang = self.profile_query(profile, result)
+            except (KeyError, ValueError) as e:
+                result['error'] = str(e)
+                continue
+            mask_key = (tuple(lang) if type(lang) == list else lang, profile.get('gender_pct'))
+            if mask_key not in masks:
+                masks[mask_key] = self.filters.mask(lang, profile.get('gender_pct'))
+            queries.append((profile, result, vector, masks[mask_key]))
+        if not queries:
+            return results
+
+        tops = self.batch_top_k([q[2] for q in queries], [q[3] for q in queries], self.fetch_size(k, overfetch))
+        for (profile, result, vector, _), top in zip(queries, tops):
+            self.finish(result, profile, vector, top, k)
+        return results
+
+    def fetch_size(self, k, overfetch=3):
+        # candidates scored per profile: extra ones replace projects whose URL check fails
+        return k * overfetch if self.verifier is not None else k
+
+    def finish(self, result, profile, vector, top, k):
+        # result rows, API suggestions and mentors of one profile from its batch_top_k candidates
+        result['projects'] = self.project_rows(((self.projects.keys[r], s) for r, s in top), k)
+        if profile.get('no_api'):
+            result['apis'] = self.suggest_apis(vector, profile.get('dest_lang'), int(profile['no_api']))
+        if profile.get('mentors'):
+            result['mentors'] = self.mentors(vector, result['projects'])
+        return result
+
+
+###################################################
+# Process pool & CLI
+###################################################
+_worker = None
+
+def _init_worker(load_args):
+    global _worker
+    _worker = Recommender.load(*load_args)
+
+def _run_chunk(args):
+    profiles, k = args
+    return _worker.run_batch(profiles, k)
+
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(recommender, profiles, k=10, chunk=256, workers=1):
+    # yields results in input order; workers > 1 spreads chunks over processes
+    # (each process memory-maps the same model files)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(recommender.load_args,)) as pool:
+            for results in pool.map(_run_chunk, ((c, k) for c in iter_chunks(profiles, chunk))):
+                yield from results
+    else:
+        for c in iter_chunks(profiles, chunk):
+            yield from recommender.run_batch(c, k)
+
+
+def read_profiles(filename):
+    if filename == '-':
+        yield from _read_profiles(sys.stdin, filename)
+    else:
+        with open(filename, encoding='utf-8', newline='') as f:
+            yield from _read_profiles(f, filename)
+
+
+def _read_profiles(f, filename):
+    if filename.endswith('.csv'):
+        for row in csv.DictReader(f):
+            profile = {k: v for k, v in row.items() if v not in (None, '')}
+            if 'languages' in profile:
+                profile['languages'] = [x.strip() for x in profile['languages'].split(';')]
+            for name in ('gender_pct', 'no_api'):
+                if name in profile:
+                    profile[name] = float(profile[name]) if name == 'gender_pct' else int(profile[name])
+            if 'mentors' in profile:
+                profile['mentors'] = profile['mentors'].lower() in ('1', 'true', 'yes')
+            yield profile
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batch project recommendations for developer profiles (JSONL or CSV)')
+    parser.add_argument('profiles', help="profiles file (.jsonl / .csv), '-' for JSONL on stdin")
+    parser.add_argument('-o', '--output', default='-', help='JSONL output file (default: stdout)')
+    parser.add_argument('--model-dir', default='./data/doc2vec.U.PtAlAPI_U.ep1', help='converted Skill Space model (skill_space.py)')
+    parser.add_argument('--proj-info', default='./data/Proj_info', help='project store dir or Proj_info.pickle.gz')
+    parser.add_argument('--liveness-dir', default='./data/liveness', help='crawler output used to drop dead projects')
+    parser.add_argument('-k', type=int, default=10, help='projects per profile')
+    parser.add_argument('--chunk', type=int, default=256, help='profiles scored together in one matrix product')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes')
+    parser.add_argument('--verify', action='store_true', help='check that project URLs exist (network)')
+    parser.add_argument('--url-cache', default=None, help='sqlite URL cache used with --verify')
+    parser.add_argument('--quantized', action='store_true', help='single queries scan the quantized matrices (quantized.py) if present')
+    args = parser.parse_args()
+
+    rec = Recommender.load(args.model_dir, args.proj_info, args.liveness_dir, args.verify, args.url_cache, args.quantized)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    for result in run(rec, read_profiles(args.profiles), args.k, args.chunk, args.workers):
+        out.write(json.dumps(result, default=float) + '\n')
+    out.flush()
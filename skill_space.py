@@ -0,0 +1,192 @@
+###################################################
+# Pickle-free, memory-mapped Skill Space model format
+#
+# The Doc2Vec model is only ever used through `mod.dv` and `mod.wv` lookups and
+# `most_similar`, so we store those two matrices as raw float32 .npy files
+# (plus a key -> row index) and open them with mmap_mode='r'. The OS page cache
+# then shares the vectors between every worker process on the host.
+#
+# One-time conversion:
+#   $ python skill_space.py ./data/doc2vec.U.PtAlAPI_U.ep1.trained.pickle.gz ./data/doc2vec.U.PtAlAPI_U.ep1
+###################################################
+import gzip, json, os, pickle, sys
+import numpy
+import quantized as quant
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+
+def unitvec(vec):
+    # same as gensim.matutils.unitvec for dense vectors
+    veclen = numpy.sqrt(numpy.sum(vec * vec))
+    if veclen > 0.0:
+        return vec / veclen
+    return vec
+
+
+class KeyedMatrix:
+    # Read-only stand-in for gensim's KeyedVectors, covering what the app uses:
+    # `kv[key]`, `kv.get_vector(key)`, `key in kv` and `kv.most_similar(positive=[vec])`.
+
+    def __init__(self, vectors, index_to_key, norms=None, quantized=None):
+        self.vectors = vectors
+        self.index_to_key = index_to_key
+        self.key_to_index = {k: i for i, k in enumerate(index_to_key)}
+        self.norms = norms
+        self.quantized = quantized # quantized.QuantizedMatrix for the first pass of most_similar, if loaded
+        self.vector_size = vectors.shape[1]
+
+    def __len__(self):
+        return len(self.index_to_key)
+
+    def __contains__(self, key):
+        return key in self.key_to_index
+
+    def has_index_for(self, key):
+        return key in self.key_to_index
+
+    def get_index(self, key):
+        try:
+            return self.key_to_index[key]
+        except KeyError:
+            raise KeyError(f"Key '{key}' not present")
+
+    def get_vector(self, key, norm=False):
+        index = self.get_index(key)
+        if norm:
+            self.fill_norms()
+            return self.vectors[index] / self.norms[index]
+        return self.vectors[index]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.get_vector(key)
+        return numpy.vstack([self.get_vector(k) for k in key])
+
+    def fill_norms(self):
+        if self.norms is None:
+            self.norms = numpy.linalg.norm(self.vectors, axis=1).astype(numpy.float32)
+
+    def most_similar(self, positive=None, negative=None, topn=10):
+        # mirrors gensim 4.2 KeyedVectors.most_similar (cosine similarity of the mean of the inputs)
+        if isinstance(topn, int) and topn < 1:
+            return []
+        positive = [(x, 1.0) for x in (positive or [])]
+        negative = [(x, -1.0) for x in (negative or [])]
+        self.fill_norms()
+
+        all_keys, mean = set(), []
+        for key, weight in positive + negative:
+            if isinstance(key, numpy.ndarray):
+                mean.append(weight * key)
+            else:
+                mean.append(weight * self.get_vector(key, norm=True))
+                all_keys.add(self.get_index(key))
+        if not mean:
+            raise ValueError('cannot compute similarity with no input')
+        mean = unitvec(numpy.array(mean).mean(axis=0)).astype(numpy.float32)
+
+        if self.quantized is not None and topn:
+            # quantized scan for candidates, exact float32 re-rank of those
+            cand = argsort_desc(self.quantized.scores(mean), quant.candidates(topn + len(all_keys)))
+            dists = quant.exact_scores(self.vectors, self.norms, cand, mean)
+            best = cand[argsort_desc(dists, topn + len(all_keys))]
+            dists = dict(zip(cand.tolist(), dists.tolist()))
+        else:
+            dists = numpy.dot(self.vectors, mean) / self.norms
+            if not topn:
+                return dists
+            best = argsort_desc(dists, topn + len(all_keys))
+        result = [(self.index_to_key[sim], float(dists[sim])) for sim in best if sim not in all_keys]
+        return result[:topn]
+
+
+def argsort_desc(x, topn):
+    # indices of the `topn` largest values of x, largest first
+    if topn >= x.size:
+        return numpy.argsort(-x)
+    best = numpy.argpartition(-x, topn)[:topn]
+    return best.take(numpy.argsort(-x.take(best)))
+
+
+class SkillSpaceModel:
+    # what is left of the Doc2Vec model once the training state is dropped
+    def __init__(self, dv, wv, path=None, api_languages=None):
+        self.dv = dv
+        self.wv = wv
+        self.path = path
+        self.api_languages = api_languages # {language tag: [start, end]} of the wv rows (api_index.py), if grouped
+
+
+###################################################
+# Conversion & loading
+###################################################
+def is_converted(dirname):
+    return os.path.isfile(os.path.join(dirname, MANIFEST))
+
+
+def _save_keyed(kv, dirname, prefix, order=None):
+    vectors = numpy.asarray(kv.vectors, dtype=numpy.float32)
+    keys = list(kv.index_to_key)
+    if order is not None:
+        vectors = vectors[order]
+        keys = [keys[i] for i in order]
+    norms = numpy.linalg.norm(vectors, axis=1).astype(numpy.float32)
+    numpy.save(os.path.join(dirname, f'{prefix}.npy'), numpy.ascontiguousarray(vectors))
+    numpy.save(os.path.join(dirname, f'{prefix}.norms.npy'), norms)
+    with open(os.path.join(dirname, f'{prefix}.keys.json'), 'w', encoding='utf-8') as f:
+        json.dump(keys, f, ensure_ascii=False)
+    return vectors.shape
+
+
+def _load_keyed(dirname, prefix, mmap_mode='r'):
+    vectors = numpy.load(os.path.join(dirname, f'{prefix}.npy'), mmap_mode=mmap_mode)
+    norms = numpy.load(os.path.join(dirname, f'{prefix}.norms.npy'), mmap_mode=mmap_mode)
+    with open(os.path.join(dirname, f'{prefix}.keys.json'), encoding='utf-8') as f:
+        keys = json.load(f)
+    return KeyedMatrix(vectors, keys, norms)
+
+
+def save_model(mod, dirname):
+    # write `mod.dv` / `mod.wv` of a (gensim or converted) model into `dirname`
+    from project_index import partition_order
+    from api_index import language_order
+    os.makedirs(dirname, exist_ok=True)
+    manifest = {'format': FORMAT_VERSION}
+    # projects / languages / developers are stored as contiguous blocks so the
+    # DocIndex partitions are zero-copy views of the mmap
+    manifest['dv'] = _save_keyed(mod.dv, dirname, 'dv', order=partition_order(list(mod.dv.index_to_key)))
+    # APIs are grouped by language, so the per-language partitions of api_index.py are views too
+    order, manifest['wv_languages'] = language_order(mod.wv, mod.dv)
+    manifest['wv'] = _save_keyed(mod.wv, dirname, 'wv', order=order)
+    # manifest is written last, so a half-converted directory is never picked up
+    with open(os.path.join(dirname, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+
+
+def convert_model(filename, dirname):
+    from gensim.models.doc2vec import Doc2Vec  # noqa: F401 (needed to unpickle the model)
+    with gzip.open(filename, 'rb') as f:
+        mod = pickle.load(f)
+    save_model(mod, dirname)
+
+
+def load_model(dirname, mmap_mode='r', quantized=False):
+    # quantized=True attaches the float16 / int8 copies written by quantized.py, if present
+    with open(os.path.join(dirname, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported Skill Space model format in {dirname}: {manifest.get('format')}")
+    mod = SkillSpaceModel(_load_keyed(dirname, 'dv', mmap_mode), _load_keyed(dirname, 'wv', mmap_mode), path=dirname,
+                          api_languages=manifest.get('wv_languages'))
+    if quantized and quant.exists(dirname):
+        matrices = quant.load(dirname, mmap_mode)
+        mod.dv.quantized, mod.wv.quantized = matrices.get('dv'), matrices.get('wv')
+    return mod
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(f'usage: python {sys.argv[0]} <model.pickle.gz> <output dir>')
+    convert_model(sys.argv[1], sys.argv[2])
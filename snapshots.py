@@ -0,0 +1,518 @@
+###################################################
+# Versioned data snapshots, swapped in without a restart
+#
+# A snapshot is one directory per data version under a root (./data/snapshots/U,
+# ./data/snapshots/V, ...) with everything the app loads for that version: the
+# converted model (skill_space.py, plus its optional ANN / quantized / lookup
+# files), the project store (project_store.py), the timezone data and
+# optionally the liveness crawl (liveness_crawler.py). `snapshot.json` records
+# the digest of every file, and of the segments the derived indexes are built
+# from: each DocIndex partition, the projects of every language (filter
+# bitsets, leaderboards) and the entries of every timezone. ROOT/CURRENT names
+# the active version and is replaced atomically. Files are copied into a new
+# snapshot, as the converters rewrite their outputs in place; files unchanged
+# since the active snapshot are hard-linked from it. Never write into a snapshot.
+#
+# SnapshotManager serves the active snapshot and polls CURRENT. A new version is
+# loaded in a background thread: its derived indexes are rebuilt reusing every
+# segment whose digest did not change (and a whole component, e.g. an unchanged
+# model, as it is), then it is swapped in with one reference assignment. A
+# request keeps the snapshot it started with; the next one gets the new one.
+#
+#   $ python snapshots.py create ./data/snapshots V --model-dir ./data/doc2vec.V --proj-info ./data/Proj_info.V \
+#         --tz-json ./data/tz_project_gender.V.json.gz --activate
+#   $ python snapshots.py activate ./data/snapshots U    # roll back
+#   $ python snapshots.py list ./data/snapshots
+###################################################
+import argparse, gzip, hashlib, json, os, shutil, sys, threading, time
+import numpy
+import skill_space, project_store, project_index, project_filters, leaderboards, tz_index, liveness, ann_index, vector_store, api_index
+
+FORMAT_VERSION = 1
+MANIFEST = 'snapshot.json'
+CURRENT = 'CURRENT'
+# part -> name inside a snapshot directory
+PARTS = {'model': 'model', 'proj_info': 'Proj_info', 'tz_json': 'tz_project_gender.json.gz', 'tz_index': 'tz_index',
+         'liveness': 'liveness'}
+CHUNK = 1 << 16 # array rows hashed at a time
+
+
+###################################################
+# Digests
+###################################################
+def digest(*parts):
+    # hex digest of str / bytes / numpy arrays (hashed a chunk of rows at a time, so mmaps are not copied whole)
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, numpy.ndarray):
+            h.update(f'{part.dtype.str}{part.shape}'.encode())
+            for start in range(0, len(part), CHUNK):
+                h.update(numpy.ascontiguousarray(part[start:start+CHUNK]).tobytes())
+        else:
+            part = part.encode('utf-8') if isinstance(part, str) else part
+            h.update(len(part).to_bytes(8, 'little'))
+            h.update(part)
+    return h.hexdigest()
+
+
+def file_digest(path, block=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def segment_digests(model_dir, store, tz_data=None):
+    # digests of the inputs of every reusable segment of the derived indexes
+    segments = {'partitions': {}, 'partition_keys': {}, 'langs': {}, 'boards': {}}
+    # DocIndex partitions: keys, position in dv and vectors (of a converted model)
+    keys = []
+    if model_dir is not None:
+        with open(os.path.join(model_dir, 'dv.keys.json'), encoding='utf-8') as f:
+            keys = json.load(f)
+        vectors = numpy.load(os.path.join(model_dir, 'dv.npy'), mmap_mode='r')
+    labels = numpy.array([project_index.PARTITIONS.index(project_index.classify_key(k)) for k in keys], dtype=numpy.int8)
+    for i, name in enumerate(project_index.PARTITIONS if keys else ()):
+        rows = numpy.flatnonzero(labels == i)
+        part_keys = json.dumps([keys[r] for r in rows], ensure_ascii=False)
+        contiguous = len(rows) and rows[-1] - rows[0] + 1 == len(rows)
+        segments['partition_keys'][name] = digest(part_keys)
+        segments['partitions'][name] = digest(part_keys, rows, vectors[rows[0]:rows[-1]+1] if contiguous else vectors[rows])
+    # project store: row order, and per language its rows (filter bitsets) and their leaderboard values
+    segments['projects'] = digest(json.dumps(store.project_ids, ensure_ascii=False))
+    values = [numpy.asarray(store.columns[name]) for name in leaderboards.METRIC_COLUMNS + ('female_pct',)]
+    for lx in [leaderboards.ALL] + list(store.langs):
+        rows = numpy.arange(len(store)) if lx == leaderboards.ALL else numpy.flatnonzero(store.lang_mask(lx))
+        segments['langs'][lx] = digest(rows)
+        segments['boards'][lx] = digest(rows, *(v[rows] for v in values))
+    if tz_data is not None:
+        segments['tz'] = {tz: digest(json.dumps(items, sort_keys=True)) for tz, items in tz_data.items()}
+    return segments
+
+
+###################################################
+# Snapshot directories
+###################################################
+class Snapshot:
+    def __init__(self, root, version):
+        self.root = root
+        self.version = version
+        self.path = os.path.join(root, version)
+        with open(os.path.join(self.path, MANIFEST), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format in {self.path}: {self.manifest.get('format')}")
+
+    @classmethod
+    def of_sources(cls, model_dir, store, tz_json=None):
+        # segment digests of data that is not in a snapshot (the app's paths without one), so that the
+        # first activated snapshot can reuse what was built from it; it has no files of its own
+        snapshot = cls.__new__(cls)
+        snapshot.root = snapshot.path = snapshot.version = None
+        tz_data = None
+        if tz_json is not None and os.path.isfile(tz_json):
+            with gzip.open(tz_json, 'rt') as f:
+                tz_data = json.load(f)
+        model_dir = model_dir if skill_space.is_converted(model_dir) else None
+        snapshot.manifest = {'format': FORMAT_VERSION, 'files': {}, 'components': {}, 'segments': segment_digests(model_dir, store, tz_data)}
+        return snapshot
+
+    def part(self, name):
+        # path of a part, None if the snapshot does not have it
+        path = os.path.join(self.path, PARTS[name])
+        return path if os.path.exists(path) else None
+
+    @property
+    def segments(self):
+        return self.manifest['segments']
+
+    def same(self, other, component):
+        # a part (all its files) is identical in the snapshot `other`
+        digest = self.manifest['components'].get(component)
+        return digest is not None and other.manifest['components'].get(component) == digest
+
+    def same_segment(self, other, name):
+        digest = self.segments.get(name)
+        return digest is not None and other.segments.get(name) == digest
+
+    def unchanged(self, other, group):
+        # segments of `group` with the same digest in the snapshot `other`
+        old = other.segments.get(group, {})
+        return {key for key, digest in self.segments.get(group, {}).items() if old.get(key) == digest}
+
+
+def _copy_file(src, dst, block=1 << 20):
+    # copy, returning the digest of the bytes written
+    h = hashlib.blake2b(digest_size=16)
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        for chunk in iter(lambda: fin.read(block), b''):
+            h.update(chunk)
+            fout.write(chunk)
+    shutil.copystat(src, dst)
+    return h.hexdigest()
+
+
+def _copy(src, dst, base, files, shared=None):
+    # Copies `src` (a file or a directory) to `dst` in the new snapshot directory `base` and records the
+    # digests of its files in `files`. Source files are never linked: the converters (skill_space.py,
+    # project_store.py ...) rewrite their output files in place. A file identical to the same file of
+    # `shared`, an already published snapshot (never written to), is hard-linked from there instead.
+    if os.path.isdir(src):
+        os.makedirs(dst)
+        for name in sorted(os.listdir(src)):
+            _copy(os.path.join(src, name), os.path.join(dst, name), base, files, shared)
+        return
+    rel = os.path.relpath(dst, base).replace(os.sep, '/')
+    if shared is not None and rel in shared.manifest['files']:
+        known = file_digest(src)
+        if shared.manifest['files'][rel] == known:
+            try:
+                os.link(os.path.join(shared.path, rel), dst)
+                files[rel] = known
+                return
+            except OSError: # another file system, or no hard links
+                pass
+    files[rel] = _copy_file(src, dst)
+
+
+def create(root, version, model_dir, proj_info, tz_json=None, tz_index_dir=None, liveness_dir=None, make_active=False):
+    # new snapshot ROOT/VERSION from a converted model, a project store (or Proj_info.pickle.gz) and the
+    # optional timezone / liveness data; it appears complete or not at all
+    path = os.path.join(root, version)
+    if os.path.exists(path):
+        raise ValueError(f'Snapshot {version} already exists in {root}')
+    if not skill_space.is_converted(model_dir):
+        raise ValueError(f'{model_dir} is not a converted model, run skill_space.py first')
+    os.makedirs(root, exist_ok=True)
+    tmp = os.path.join(root, f'.{version}.{os.getpid()}.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    shared = Snapshot(root, current(root)) if current(root) is not None else None
+    files = {}
+    try:
+        _copy(model_dir, os.path.join(tmp, PARTS['model']), tmp, files, shared)
+        if project_store.is_converted(proj_info):
+            _copy(proj_info, os.path.join(tmp, PARTS['proj_info']), tmp, files, shared)
+        else:
+            project_store.save_store(project_store.load_pickle(proj_info), os.path.join(tmp, PARTS['proj_info']))
+        store = project_store.load_store(os.path.join(tmp, PARTS['proj_info']))
+        tz_data = None
+        if tz_json is not None:
+            _copy(tz_json, os.path.join(tmp, PARTS['tz_json']), tmp, files, shared)
+            with gzip.open(os.path.join(tmp, PARTS['tz_json']), 'rt') as f:
+                tz_data = json.load(f)
+        for name, src, load in (('tz_index', tz_index_dir, tz_index.TimezoneIndex.load), ('liveness', liveness_dir, liveness.Liveness.load)):
+            if src is not None:
+                load(src, store) # raises if it was built for another project store
+                _copy(src, os.path.join(tmp, PARTS[name]), tmp, files, shared)
+
+        for dirpath, _, filenames in os.walk(tmp): # files written here (a store converted from the pickle)
+            for filename in filenames:
+                full = os.path.join(dirpath, filename)
+                rel = os.path.relpath(full, tmp).replace(os.sep, '/')
+                if rel not in files:
+                    files[rel] = file_digest(full)
+        components = {}
+        for name, sub in PARTS.items():
+            entries = sorted((f, d) for f, d in files.items() if f == sub or f.startswith(sub + '/'))
+            if entries:
+                components[name] = digest(json.dumps(entries))
+        manifest = {'format': FORMAT_VERSION, 'version': version, 'created': time.time(), 'projects': len(store),
+                    'files': files, 'components': components,
+                    'segments': segment_digests(os.path.join(tmp, PARTS['model']), store, tz_data)}
+        with open(os.path.join(tmp, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.rename(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    if make_active:
+        activate(root, version)
+    return Snapshot(root, version)
+
+
+def activate(root, version):
+    Snapshot(root, version) # must be complete
+    tmp = os.path.join(root, f'.{CURRENT}.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp, os.path.join(root, CURRENT))
+
+
+def current(root):
+    # active version, None if no snapshot was activated
+    try:
+        with open(os.path.join(root, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def versions(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(v for v in os.listdir(root) if os.path.isfile(os.path.join(root, v, MANIFEST)))
+
+
+###################################################
+# Loaded snapshots & hot swapping
+###################################################
+class SnapshotData:
+    # The loaded data of one snapshot. Every part is loaded / built on first use,
+    # or by warm() before the snapshot is swapped in.
+    PARTS = ('mod', 'store', 'liveness', 'index', 'filters', 'leaderboards', 'tz', 'lookup', 'apis', 'api_names')
+    # parts that hold no views of their files, so they can be reused from data outside a snapshot (seed())
+    COPIED = ('filters', 'leaderboards', 'tz')
+
+    def __init__(self, snapshot, quantized=True, ann=True, exclude=()):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        self.quantized = quantized
+        self.ann = ann
+        self.exclude = exclude
+        self.parts = {}
+        self.loaded = () # names of further parts to build when a snapshot is warmed from this one (seed())
+        self.previous = None # SnapshotData whose unchanged parts are reused, while warm() runs
+        self.lock = threading.RLock()
+
+    @classmethod
+    def seed(cls, snapshot, parts):
+        # Stands in for the previous snapshot on the first activation: `parts` (name -> object) are the
+        # loaded data of `snapshot` (Snapshot.of_sources). The new snapshot builds the same parts, reusing
+        # only the COPIED ones: the others map files that a converter may rewrite in place.
+        data = cls(snapshot)
+        data.parts = {name: part for name, part in parts.items() if name in cls.COPIED}
+        data.loaded = tuple(parts)
+        return data
+
+    def _part(self, name, build):
+        if name not in self.parts:
+            with self.lock:
+                if name not in self.parts:
+                    self.parts[name] = build()
+        return self.parts[name]
+
+    def _previous(self, name):
+        # the previous snapshot's `name`, if it was loaded
+        return self.previous.parts.get(name) if self.previous is not None else None
+
+    def _same(self, component):
+        return self.previous is not None and self.snapshot.same(self.previous.snapshot, component)
+
+    def _unchanged(self, group):
+        return self.snapshot.unchanged(self.previous.snapshot, group)
+
+    def warm(self, previous):
+        # build every part `previous` has loaded, reusing what did not change
+        self.previous = previous
+        try:
+            for name in self.PARTS:
+                if name in previous.parts or name in previous.loaded:
+                    getattr(self, name)
+        finally:
+            self.previous = None
+
+    @property
+    def mod(self):
+        return self._part('mod', self._load_model)
+
+    def _load_model(self):
+        if self._same('model') and self._previous('mod') is not None:
+            return self._previous('mod')
+        return skill_space.load_model(self.snapshot.part('model'), quantized=self.quantized)
+
+    @property
+    def store(self):
+        return self._part('store', self._load_store)
+
+    def _load_store(self):
+        if self._same('proj_info') and self._previous('store') is not None:
+            return self._previous('store')
+        return project_store.load_store(self.snapshot.part('proj_info'))
+
+    @property
+    def liveness(self):
+        return self._part('liveness', self._load_liveness)
+
+    def _load_liveness(self):
+        path = self.snapshot.part('liveness')
+        if path is None or not liveness.Liveness.exists(path):
+            return None
+        previous = self._previous('liveness')
+        if previous is not None and previous.store is self.store and self._same('liveness'):
+            return previous
+        return liveness.Liveness.load(path, self.store)
+
+    def dead(self):
+        return self.liveness.dead_mask() if self.liveness is not None else None
+
+    @property
+    def index(self):
+        return self._part('index', self._build_index)
+
+    def _build_index(self):
+        previous = self._previous('index')
+        if previous is not None and self.mod is self._previous('mod'):
+            return previous
+        unchanged = ()
+        if previous is not None and (getattr(self.mod.dv, 'quantized', None) is None) == \
+                (getattr(self._previous('mod').dv, 'quantized', None) is None):
+            unchanged = self._unchanged('partitions')
+        index = project_index.DocIndex(self.mod.dv, previous, unchanged)
+        model_dir = self.snapshot.part('model')
+        if self.ann and ann_index.IVFIndex.exists(model_dir):
+            index.attach_ann(ann_index.IVFIndex.load(model_dir))
+        return index
+
+    @property
+    def filters(self):
+        return self._part('filters', self._build_filters)
+
+    def _build_filters(self):
+        keys = self.index[project_index.PROJECTS].keys
+        previous = self._previous('filters')
+        if previous is not None and hasattr(previous, 'rows') and self.snapshot.same_segment(self.previous.snapshot, 'projects') \
+                and project_index.PROJECTS in self._unchanged('partition_keys'):
+            return project_filters.ProjectFilters(keys, self.store, self.exclude, self.dead(), previous, self._unchanged('langs'))
+        return project_filters.ProjectFilters(keys, self.store, self.exclude, self.dead())
+
+    @property
+    def leaderboards(self):
+        return self._part('leaderboards', self._build_leaderboards)
+
+    def _build_leaderboards(self):
+        previous = self._previous('leaderboards')
+        if previous is not None and previous.store is self.store:
+            return previous
+        if previous is not None:
+            return leaderboards.Leaderboards(self.store, previous=previous, unchanged=self._unchanged('boards'))
+        return leaderboards.Leaderboards(self.store)
+
+    @property
+    def tz(self):
+        return self._part('tz', self._build_tz)
+
+    def _build_tz(self):
+        index_dir = self.snapshot.part('tz_index')
+        if index_dir is not None and tz_index.TimezoneIndex.exists(index_dir):
+            return tz_index.TimezoneIndex.load(index_dir, self.store)
+        if self.snapshot.part('tz_json') is None:
+            return None # created without timezone data: location-based recommendations are unavailable
+        previous = self._previous('tz')
+        if previous is not None and previous.store is self.store and self._same('tz_json'):
+            return previous
+        if previous is not None and self.snapshot.same_segment(self.previous.snapshot, 'projects'):
+            return tz_index.TimezoneIndex.from_json(self.snapshot.part('tz_json'), self.store, previous, self._unchanged('tz'))
+        return tz_index.TimezoneIndex.from_json(self.snapshot.part('tz_json'), self.store)
+
+    @property
+    def lookup(self):
+        return self._part('lookup', self._load_lookup)
+
+    def _load_lookup(self):
+        if self._same('model') and 'lookup' in self.previous.parts:
+            return self._previous('lookup')
+        model_dir = self.snapshot.part('model')
+        return vector_store.load(model_dir) if vector_store.exists(model_dir) else None
+
+    @property
+    def apis(self):
+        return self._part('apis', self._build_apis)
+
+    def _build_apis(self):
+        if self._previous('apis') is not None and self.mod is self._previous('mod'):
+            return self._previous('apis')
+        return api_index.ApiIndex.build(self.mod)
+
+    @property
+    def api_names(self):
+        return self._part('api_names', self._build_api_names)
+
+    def _build_api_names(self):
+        if self.lookup is not None:
+            return self.lookup.wv.keys
+        if self._previous('api_names') is not None and self.mod is self._previous('mod'):
+            return self._previous('api_names')
+        return vector_store.KeyIndex.from_keys(self.mod.wv.index_to_key)
+
+
+class SnapshotManager:
+    def __init__(self, root, interval=30, on_swap=None, seed=None, **options):
+        # options: SnapshotData arguments; interval: seconds between checks of ROOT/CURRENT (0: only refresh())
+        # on_swap(data): called with a newly loaded snapshot before it becomes the active one; raising keeps the old one
+        # seed(): SnapshotData (SnapshotData.seed) the first activated snapshot is warmed from, or None
+        self.root = root
+        self.interval = interval
+        self.on_swap = on_swap
+        self.seed = seed
+        self.options = options
+        version = current(root)
+        # None until a snapshot is activated
+        self.active = SnapshotData(Snapshot(root, version), **options) if version is not None else None
+        self.failed = None # version that could not be loaded; not retried until CURRENT changes
+        self.swaps = 0
+        self.lock = threading.Lock()
+        if interval:
+            threading.Thread(target=self._watch, name='snapshot-watcher', daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e: # keep serving the active snapshot
+                print(f'Could not load snapshot {self.failed} from {self.root}: {type(e).__name__}: {e}', file=sys.stderr)
+
+    def refresh(self):
+        # load the version named by CURRENT if it is not the active one, then swap it in; True if swapped
+        with self.lock:
+            version = current(self.root)
+            if version is None or version == self.failed or (self.active is not None and version == self.active.version):
+                return False
+            try:
+                data = SnapshotData(Snapshot(self.root, version), **self.options)
+                previous = self.active if self.active is not None or self.seed is None else self.seed()
+                if previous is not None:
+                    data.warm(previous)
+                if self.on_swap is not None:
+                    self.on_swap(data)
+            except Exception:
+                self.failed = version
+                raise
+            # one reference assignment: a request sees either the old or the new snapshot
+            self.active = data
+            self.failed = None
+            self.swaps += 1
+            return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create, activate and list versioned data snapshots')
+    commands = parser.add_subparsers(dest='command', required=True)
+    cmd = commands.add_parser('create', help='create ROOT/VERSION from converted data')
+    cmd.add_argument('root')
+    cmd.add_argument('version')
+    cmd.add_argument('--model-dir', required=True, help='converted Skill Space model (skill_space.py)')
+    cmd.add_argument('--proj-info', required=True, help='project store dir (project_store.py) or Proj_info.pickle.gz')
+    cmd.add_argument('--tz-json', default=None, help='tz_project_gender.json.gz')
+    cmd.add_argument('--tz-index', default=None, help='compiled timezone index (tz_index.py) of this project store')
+    cmd.add_argument('--liveness-dir', default=None, help='crawler output (liveness_crawler.py) of this project store')
+    cmd.add_argument('--activate', action='store_true', help='make it the active snapshot')
+    cmd = commands.add_parser('activate', help='make ROOT/VERSION the active snapshot (running apps swap it in)')
+    cmd.add_argument('root')
+    cmd.add_argument('version')
+    cmd = commands.add_parser('list', help='list the snapshots of ROOT')
+    cmd.add_argument('root')
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        create(args.root, args.version, args.model_dir, args.proj_info, args.tz_json, args.tz_index, args.liveness_dir, args.activate)
+    elif args.command == 'activate':
+        activate(args.root, args.version)
+    else:
+        active = current(args.root)
+        for version in versions(args.root):
+            manifest = Snapshot(args.root, version).manifest
+            print(f"{'*' if version == active else ' '} {version}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(manifest['created']))}  "
+                  f"{manifest['projects']} projects")
@@ -0,0 +1,141 @@
+###################################################
+# model_download.fetch against a local Range-capable stub server
+###################################################
+import glob, hashlib, json, os, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import model_download
+
+PAYLOAD = os.urandom(256 * 1024)
+
+
+class RangeServer:
+    # serves PAYLOAD with Range support; `cut` truncates every body after that many bytes,
+    # `delay` sleeps between 4 KiB writes so concurrent clients overlap
+    def __init__(self, payload=PAYLOAD):
+        self.payload = payload
+        self.cut = None
+        self.delay = 0
+        self.lock = threading.Lock()
+        self.ranges = [] # (start, end) of every GET
+        self.served = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(server.payload)))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+
+            def do_GET(self):
+                start, end = 0, len(server.payload)
+                m = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+                if m:
+                    start, end = int(m.group(1)), int(m.group(2)) + 1
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end - 1}/{len(server.payload)}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Length', str(end - start))
+                self.end_headers()
+                with server.lock:
+                    server.ranges.append((start, end))
+                body = server.payload[start:end]
+                if server.cut is not None:
+                    body = body[:server.cut]
+                for i in range(0, len(body), 4096):
+                    self.wfile.write(body[i:i+4096])
+                    with server.lock:
+                        server.served += len(body[i:i+4096])
+                    if server.delay:
+                        time.sleep(server.delay)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/model.bin'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    s = RangeServer()
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def small_state(monkeypatch):
+    # persist segment progress every chunk, so an interrupted download leaves something to resume
+    monkeypatch.setattr(model_download, 'STATE_EVERY', 4096)
+
+
+def test_resumes_truncated_part_file(server, small_state, tmp_path):
+    dest = str(tmp_path / 'model.bin')
+    server.cut = 20000 # every segment stops early
+    with pytest.raises(Exception):
+        model_download.fetch(server.url, dest, segments=4, chunk_size=4096)
+    assert not os.path.exists(dest)
+    part, = glob.glob(dest + '.*.part')
+    with open(part + '.json') as f:
+        state = json.load(f)
+    assert all(start > seg_start for (start, _), (seg_start, _) in zip(state['segments'], model_download.split(len(PAYLOAD), 4)))
+
+    server.cut = None
+    server.ranges.clear()
+    server.served = 0
+    assert model_download.fetch(server.url, dest, segments=4, chunk_size=4096) == dest
+    with open(dest, 'rb') as f:
+        assert f.read() == PAYLOAD
+    # the second run only asked for what the first one did not write
+    assert [start for start, _ in server.ranges] and all(start % (len(PAYLOAD) // 4) for start, _ in server.ranges)
+    assert server.served < len(PAYLOAD)
+    assert not glob.glob(dest + '.*.part*')
+
+
+def test_rejects_checksum_mismatch(server, tmp_path):
+    dest = str(tmp_path / 'model.bin')
+    with pytest.raises(IOError, match='Checksum mismatch'):
+        model_download.fetch(server.url, dest, sha256='0' * 64, segments=4, chunk_size=4096)
+    assert not os.path.exists(dest)
+    assert not glob.glob(dest + '.*.part*') # a corrupt file is not resumed either
+
+    good = hashlib.sha256(PAYLOAD).hexdigest()
+    assert model_download.fetch(server.url, dest, sha256=good.upper(), segments=4, chunk_size=4096) == dest
+
+
+def test_concurrent_fetchers_download_once(server, tmp_path):
+    dest = str(tmp_path / 'model.bin')
+    server.delay = 0.002
+    results, errors = [], []
+    def worker():
+        try:
+            results.append(model_download.fetch(server.url, dest, segments=4, chunk_size=4096, lock_timeout=30))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert results == [dest, dest]
+    assert server.served == len(PAYLOAD) # the second fetcher waited on the lock and reused the file
+    with open(dest, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+def test_lock_timeout(tmp_path):
+    path = str(tmp_path / 'model.bin.lock')
+    with model_download.FileLock(path):
+        with pytest.raises(TimeoutError):
+            with model_download.FileLock(path, timeout=0.2, poll=0.05):
+                pass
+    with model_download.FileLock(path, timeout=0.2):
+        pass
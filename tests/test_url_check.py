@@ -0,0 +1,120 @@
+###################################################
+# url_check.UrlVerifier / UrlCache against a local http.server stub
+###################################################
+import threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import url_check
+
+
+class StubServer:
+    # /ok -> 200, /gone -> 404, /busy -> 503, /nohead -> 405 on HEAD but 200 on GET,
+    # /slow/<name> -> 200 (404 if <name> starts with 'dead') after `delay` seconds
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = [] # (method, path)
+        self.inflight = 0
+        self.max_inflight = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def respond(self):
+                with server.lock:
+                    server.requests.append((self.command, self.path))
+                    server.inflight += 1
+                    server.max_inflight = max(server.max_inflight, server.inflight)
+                try:
+                    if self.path.startswith('/slow/'):
+                        time.sleep(server.delay)
+                        status = 404 if self.path.startswith('/slow/dead') else 200
+                    elif self.path == '/nohead':
+                        status = 405 if self.command == 'HEAD' else 200
+                    else:
+                        status = {'/ok': 200, '/gone': 404, '/busy': 503}.get(self.path, 404)
+                    self.send_response(status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                finally:
+                    with server.lock:
+                        server.inflight -= 1
+
+            do_HEAD = do_GET = respond
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def hits(self, path):
+        with self.lock:
+            return [method for method, p in self.requests if p == path]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    s = StubServer()
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def verifier(tmp_path):
+    v = url_check.UrlVerifier(str(tmp_path / 'urls.sqlite'), workers=4, timeout=5)
+    yield v
+    v.pool.shutdown()
+
+
+def test_head_falls_back_to_get_on_405(server, verifier):
+    assert verifier.fetch_status(server.base + '/nohead') == 200
+    assert server.hits('/nohead') == ['HEAD', 'GET']
+    assert verifier.fetch_status(server.base + '/ok') == 200
+    assert server.hits('/ok') == ['HEAD'] # no body transfer when HEAD is answered
+
+
+def test_cache_ttl(tmp_path):
+    cache = url_check.UrlCache(str(tmp_path / 'urls.sqlite'), alive_ttl=100, dead_ttl=10)
+    assert cache.get('u', now=1000) is None
+    cache.put('u', True, now=1000)
+    assert cache.get('u', now=1050) is True
+    assert cache.get('u', now=1101) is None
+    cache.put('u', False, now=1000)
+    assert cache.get('u', now=1005) is False
+    assert cache.get('u', now=1011) is None # negative results expire sooner
+    # shared through the file
+    assert url_check.UrlCache(str(tmp_path / 'urls.sqlite')).get('u', now=1005) is False
+
+
+def test_check_url_caches_alive_and_dead_but_not_transient(server, verifier):
+    for path, expected in (('/ok', True), ('/gone', False), ('/busy', False)):
+        assert verifier.check_url(server.base + path) is expected
+        assert verifier.check_url(server.base + path) is expected
+    assert server.hits('/ok') == ['HEAD']
+    assert server.hits('/gone') == ['HEAD'] # negative result served from the cache
+    assert server.hits('/busy') == ['HEAD', 'HEAD'] # 503 is not cached
+    assert verifier.cache.get(server.base + '/busy') is None
+
+    # an expired negative result is checked again
+    verifier.cache.put(server.base + '/gone', False, now=time.time() - url_check.DEAD_TTL - 1)
+    assert verifier.check_url(server.base + '/gone') is False
+    assert server.hits('/gone') == ['HEAD', 'HEAD']
+
+
+def test_iter_verified_pooled_batches(server, verifier, monkeypatch):
+    monkeypatch.setattr(url_check, 'project_url', lambda project: f'{server.base}/slow/{project}')
+    candidates = [(f'p{i}', i) if i % 3 else (f'dead{i}', i) for i in range(12)]
+    start = time.monotonic()
+    verified = list(verifier.iter_verified(candidates, key=lambda c: c[0], batch=4))
+    elapsed = time.monotonic() - start
+    # input order kept, dead projects dropped
+    assert verified == [(c, f'{server.base}/slow/{c[0]}') for c in candidates if not c[0].startswith('dead')]
+    # checks run on the pool, several at a time: far below 12 sequential round trips
+    assert server.max_inflight > 1
+    assert elapsed < 12 * server.delay / 2
+    assert len(server.requests) == 12 # every candidate checked exactly once
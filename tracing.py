@@ -0,0 +1,184 @@
+###################################################
+# Lightweight per-stage tracing, metrics export and slow-query log
+#
+#   with tracing.trace('exp', inputs={...}):     # one recommendation request
+#       with tracing.span('scan'):               # one stage of it
+#           ...
+#       tracing.count('urls_checked', 10)
+#
+# Each finished trace updates per-stage histograms and counters, which can be
+# written as a Prometheus text file, is optionally appended to a JSON lines
+# file, and goes to the slow-query log (with its normalised inputs) if it took
+# longer than the threshold. Configured by environment variables:
+#   SKILL_SPACE_TRACE_JSONL   every trace as one JSON line
+#   SKILL_SPACE_METRICS_FILE  Prometheus text format, rewritten after every trace ('{pid}' in the
+#                             name is replaced by the process id, one file per worker process)
+#   SKILL_SPACE_SLOW_LOG      JSON lines of traces slower than SKILL_SPACE_SLOW_MS (default 2000)
+# With none of them set, `trace` / `span` / `count` do nothing but a flag check.
+###################################################
+import functools, json, os, threading, time
+
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_local = threading.local()
+_lock = threading.Lock()
+_config = {'jsonl': None, 'metrics': None, 'slow_log': None, 'slow_ms': 2000.0}
+enabled = False
+
+
+def configure(jsonl=None, metrics=None, slow_log=None, slow_ms=2000.0):
+    global enabled
+    _config.update(jsonl=jsonl, metrics=metrics, slow_log=slow_log, slow_ms=slow_ms)
+    enabled = bool(jsonl or metrics or slow_log)
+
+
+class _Noop:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _Noop()
+
+
+class Trace:
+    def __init__(self, name, inputs=None):
+        self.name = name
+        self.inputs = inputs or {}
+        self.spans = {} # stage -> total seconds (a stage can run more than once)
+        self.counters = {}
+        self.error = None
+
+    def __enter__(self):
+        self.parent = getattr(_local, 'trace', None)
+        _local.trace = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.total = time.perf_counter() - self.start
+        _local.trace = self.parent
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _record(self)
+        return False
+
+    def as_dict(self):
+        return {'time': time.time(), 'trace': self.name, 'total_ms': self.total * 1000,
+                'spans_ms': {k: v * 1000 for k, v in self.spans.items()}, 'counters': self.counters,
+                'inputs': self.inputs, 'error': self.error}
+
+
+class Span:
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.spans[self.name] = self.trace.spans.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+def trace(name, inputs=None):
+    # one request; spans and counters inside it (same thread) are attributed to it
+    return Trace(name, inputs) if enabled else _NOOP
+
+
+def span(name):
+    current = getattr(_local, 'trace', None) if enabled else None
+    return Span(current, name) if current is not None else _NOOP
+
+
+def traced(stage):
+    # decorator: every call of the function is a span
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def count(name, n=1):
+    current = getattr(_local, 'trace', None) if enabled else None
+    if current is not None:
+        current.counters[name] = current.counters.get(name, 0) + n
+
+
+###################################################
+# Aggregation & export
+###################################################
+class Metrics:
+    def __init__(self):
+        self.stages = {} # (trace, stage) -> [bucket counts..., +Inf count, sum seconds]
+        self.counters = {} # (trace, counter) -> total
+        self.slow = 0
+
+    def observe(self, trace, stage, seconds):
+        h = self.stages.setdefault((trace, stage), [0] * (len(BUCKETS_MS) + 1) + [0.0])
+        ms = seconds * 1000
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                h[i] += 1
+        h[len(BUCKETS_MS)] += 1
+        h[-1] += seconds
+
+    def add(self, t):
+        self.observe(t.name, 'total', t.total)
+        for stage, seconds in t.spans.items():
+            self.observe(t.name, stage, seconds)
+        for name, n in t.counters.items():
+            self.counters[(t.name, name)] = self.counters.get((t.name, name), 0) + n
+
+    def prometheus(self):
+        lines = ['# HELP skill_space_stage_seconds Duration of recommendation stages',
+                 '# TYPE skill_space_stage_seconds histogram']
+        for (trace, stage), h in sorted(self.stages.items()):
+            labels = f'trace="{trace}",stage="{stage}"'
+            for bound, n in zip(BUCKETS_MS, h):
+                lines.append(f'skill_space_stage_seconds_bucket{{{labels},le="{bound / 1000}"}} {n}')
+            lines.append(f'skill_space_stage_seconds_bucket{{{labels},le="+Inf"}} {h[len(BUCKETS_MS)]}')
+            lines.append(f'skill_space_stage_seconds_sum{{{labels}}} {h[-1]}')
+            lines.append(f'skill_space_stage_seconds_count{{{labels}}} {h[len(BUCKETS_MS)]}')
+        lines += ['# HELP skill_space_events_total Counters recorded by recommendation requests',
+                  '# TYPE skill_space_events_total counter']
+        for (trace, name), n in sorted(self.counters.items()):
+            lines.append(f'skill_space_events_total{{trace="{trace}",counter="{name}"}} {n}')
+        lines += ['# TYPE skill_space_slow_queries_total counter', f'skill_space_slow_queries_total {self.slow}']
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _append(path, record):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, default=str) + '\n')
+
+
+def _record(t):
+    record = None
+    with _lock:
+        metrics.add(t)
+        if _config['jsonl']:
+            record = t.as_dict()
+            _append(_config['jsonl'], record)
+        if _config['slow_log'] and t.total * 1000 >= _config['slow_ms']:
+            metrics.slow += 1
+            _append(_config['slow_log'], record or t.as_dict())
+        if _config['metrics']:
+            path = _config['metrics'].replace('{pid}', str(os.getpid()))
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                f.write(metrics.prometheus())
+            os.replace(tmp, path)
+
+
+configure(os.environ.get('SKILL_SPACE_TRACE_JSONL'), os.environ.get('SKILL_SPACE_METRICS_FILE'),
+          os.environ.get('SKILL_SPACE_SLOW_LOG'), float(os.environ.get('SKILL_SPACE_SLOW_MS', 2000)))
@@ -0,0 +1,131 @@
+###################################################
+# Compiled timezone index for location-based recommendations
+#
+# data/tz_project_gender.json.gz maps a UTC offset to [project URL, {'all',
+# 'male', 'female', 'UNKNOWN'} active developer counts] lists. Here every
+# entry is resolved once to its project store row, the counts become typed
+# arrays (CSR over offsets, entries in the original order), and per-language
+# and female_pct views are precomputed, so a location query is a slice plus a
+# couple of mask lookups instead of JSON decoding and URL parsing.
+#
+# Optional one-time compilation (otherwise the app compiles it at start-up):
+#   $ python tz_index.py ./data/tz_project_gender.json.gz ./data/Proj_info ./data/tz_index
+###################################################
+import gzip, json, os, sys
+import numpy
+import project_store
+
+FORMAT_VERSION = 1
+META = 'tz_index.json'
+COUNTS = ('all', 'male', 'female', 'UNKNOWN')
+
+
+def project_key(url):
+    # project URL -> project store key (github.com/owner/repo -> owner_repo, gitlab.com/owner/repo -> gitlab.com_owner_repo)
+    if 'github.com' in url:
+        return '_'.join(url.split('/')[-2:])
+    return '_'.join(url.split('/')[-3:])
+
+
+class TimezoneIndex:
+    def __init__(self, tz_keys, offsets, rows, urls, counts, store):
+        self.tz_keys = tz_keys # UTC offsets as in the JSON ('8.0', '-5.0', '0', ...)
+        self.tz_to_seg = {tz: i for i, tz in enumerate(tz_keys)}
+        self.offsets = offsets # entries of tz_keys[i]: offsets[i]:offsets[i+1]
+        self.rows = rows # int32 project store row per entry
+        self.urls = urls
+        self.counts = counts # 'all' / 'male' / 'female' / 'UNKNOWN' active developers (int32) per entry
+        self.store = store
+
+        # views: language membership per entry, and per offset the entries by female_pct (descending)
+        self.female_pct = numpy.asarray(store.columns['female_pct'])[rows]
+        self.in_lang = {lx: store.lang_mask(lx)[rows] for lx in store.langs}
+        self.female_order = numpy.concatenate([numpy.arange(offsets[i], offsets[i+1])[numpy.argsort(-self.female_pct[offsets[i]:offsets[i+1]], kind='stable')]
+                                               for i in range(len(tz_keys))] + [numpy.empty(0, dtype=numpy.int64)])
+        self.female_sorted = -self.female_pct[self.female_order]
+
+    @classmethod
+    def build(cls, data, store, previous=None, unchanged=()):
+        # data: the decoded tz_project_gender JSON; entries unknown to the project store are dropped.
+        # `unchanged`: offsets whose entries are the same as in the TimezoneIndex `previous`, built over
+        # the same project store keys (e.g. of the previous data snapshot, see snapshots.py); they are copied
+        tz_keys, offsets, rows, urls = [], [0], [], []
+        counts = {name: [] for name in COUNTS}
+        for tz, items in data.items():
+            if previous is not None and tz in unchanged and tz in previous:
+                seg = previous.tz_to_seg[tz]
+                start, end = previous.offsets[seg], previous.offsets[seg+1]
+                rows.extend(previous.rows[start:end].tolist())
+                urls.extend(previous.urls[start:end])
+                for name in COUNTS:
+                    counts[name].extend(previous.counts[name][start:end].tolist())
+                tz_keys.append(tz)
+                offsets.append(len(rows))
+                continue
+            for url, count in items:
+                row = store.row(project_key(url))
+                if row is None:
+                    continue
+                rows.append(row)
+                urls.append(url)
+                for name in COUNTS:
+                    counts[name].append(count.get(name, 0))
+            tz_keys.append(tz)
+            offsets.append(len(rows))
+        return cls(tz_keys, numpy.array(offsets, dtype=numpy.int64), numpy.array(rows, dtype=numpy.int32), urls,
+                   {name: numpy.array(c, dtype=numpy.int32) for name, c in counts.items()}, store)
+
+    @classmethod
+    def from_json(cls, filename, store, previous=None, unchanged=()):
+        with gzip.open(filename, 'rt') as f:
+            return cls.build(json.load(f), store, previous, unchanged)
+
+    @staticmethod
+    def exists(dirname):
+        return os.path.isfile(os.path.join(dirname, META))
+
+    @classmethod
+    def load(cls, dirname, store):
+        with open(os.path.join(dirname, META), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported timezone index format in {dirname}: {meta.get('format')}")
+        if meta['projects'] != len(store):
+            raise ValueError(f'Timezone index in {dirname} does not match the project store, re-run tz_index.py')
+        load = lambda name: numpy.load(os.path.join(dirname, f'{name}.npy'))
+        return cls(meta['tz_keys'], load('offsets'), load('rows'), meta['urls'], {name: load(f'count.{name}') for name in COUNTS}, store)
+
+    def save(self, dirname):
+        os.makedirs(dirname, exist_ok=True)
+        numpy.save(os.path.join(dirname, 'offsets.npy'), self.offsets)
+        numpy.save(os.path.join(dirname, 'rows.npy'), self.rows)
+        for name, col in self.counts.items():
+            numpy.save(os.path.join(dirname, f'count.{name}.npy'), col)
+        # metadata is written last, so a half-written directory is never picked up
+        with open(os.path.join(dirname, META), 'w', encoding='utf-8') as f:
+            json.dump({'format': FORMAT_VERSION, 'projects': len(self.store), 'tz_keys': self.tz_keys, 'urls': self.urls}, f, ensure_ascii=False)
+
+    def __contains__(self, tz):
+        return tz in self.tz_to_seg
+
+    def entries(self, tz, lang='ALL', min_female_pct=None):
+        # entry ids of offset `tz`, most active first, restricted to `lang` and female_pct >= min_female_pct
+        seg = self.tz_to_seg.get(tz)
+        if seg is None:
+            return numpy.empty(0, dtype=numpy.int64)
+        start, end = self.offsets[seg], self.offsets[seg+1]
+        if min_female_pct is None:
+            ids = numpy.arange(start, end)
+        else:
+            count = numpy.searchsorted(self.female_sorted[start:end], -min_female_pct, side='right')
+            ids = numpy.sort(self.female_order[start:start+count])
+        if lang != 'ALL':
+            in_lang = self.in_lang.get(lang)
+            ids = ids[in_lang[ids]] if in_lang is not None else ids[:0]
+        return ids
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        sys.exit(f'usage: python {sys.argv[0]} <tz_project_gender.json.gz> <project store dir> <output dir>')
+    TimezoneIndex.from_json(sys.argv[1], project_store.load_store(sys.argv[2])).save(sys.argv[3])
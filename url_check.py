@@ -0,0 +1,132 @@
+###################################################
+# Project URL verification: pooled session, HEAD-first checks, speculative
+# concurrent batches and a persistent (sqlite) cache with TTL.
+###################################################
+import copy, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor
+import tracing
+
+ALIVE_TTL = 7 * 24 * 3600 # re-check existing projects after a week
+DEAD_TTL = 24 * 3600 # negative results expire sooner
+DEAD_STATUS = (404, 410, 451)
+
+
+def project_url(project):
+    # WoC project id -> URL (owner_repo -> github.com/owner/repo, gitlab.com_owner_repo -> gitlab.com/owner/repo)
+    project = project.replace('__','_')
+    if 'gitlab.com' not in project and 'bitbucket.org' not in project and 'gitbox.com' not in project:
+        return 'https://github.com/' + project.replace('_', '/', 1)
+    return 'https://' + project.replace('_', '/', 2)
+
+
+def make_session(pool_size=16):
+    # requests is imported on first use; it is a noticeable part of the app's import time
+    import requests
+    from requests.adapters import HTTPAdapter, Retry
+    s = requests.Session()
+    retries = Retry(total=3, backoff_factor=1, status_forcelist=[ 429, 502, 504 ], allowed_methods=['HEAD', 'GET'])
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount('https://', adapter)
+    s.mount('http://', adapter)
+    return s
+
+
+class UrlCache:
+    # url -> (alive, checked_at), shared by every process through one sqlite file
+    def __init__(self, path, alive_ttl=ALIVE_TTL, dead_ttl=DEAD_TTL):
+        self.alive_ttl = alive_ttl
+        self.dead_ttl = dead_ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS url_status (url TEXT PRIMARY KEY, alive INTEGER NOT NULL, checked REAL NOT NULL)')
+
+    def get(self, url, now=None):
+        # True / False if a fresh result is cached, None otherwise
+        with self.lock:
+            row = self.db.execute('SELECT alive, checked FROM url_status WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        alive, checked = bool(row[0]), row[1]
+        ttl = self.alive_ttl if alive else self.dead_ttl
+        if (now or time.time()) - checked > ttl:
+            return None
+        return alive
+
+    def put(self, url, alive, now=None):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO url_status VALUES (?, ?, ?)', (url, int(alive), now or time.time()))
+
+
+class UrlVerifier:
+    def __init__(self, cache_path=None, workers=8, timeout=10, liveness=None):
+        self.session = make_session(workers)
+        self.liveness = liveness # precomputed crawl results (liveness.Liveness), checked before the network
+        self.cache = UrlCache(cache_path) if cache_path else None
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='url-check')
+
+    def with_liveness(self, liveness):
+        # a verifier sharing this one's session, thread pool and cache, with its own crawl results
+        # (e.g. of one data snapshot: each Liveness maps projects through its own store)
+        verifier = copy.copy(self)
+        verifier.liveness = liveness
+        return verifier
+
+    def fetch_status(self, url):
+        # HEAD first (no body transfer); fall back to GET for servers that do not answer HEAD
+        response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        if response.status_code in (405, 501):
+            response = self.session.get(url, timeout=self.timeout)
+        return response.status_code
+
+    def check_url(self, url):
+        alive = self.cache.get(url) if self.cache else None
+        if alive is None:
+            try:
+                status = self.fetch_status(url)
+            except Exception:
+                return False # network errors are not cached
+            if status == 200:
+                alive = True
+            elif status in DEAD_STATUS:
+                alive = False
+            else:
+                return False # transient (rate limited, server error ...), not cached
+            if self.cache:
+                self.cache.put(url, alive)
+        return alive
+
+    def check(self, project):
+        # same contract as app.check_project_url: the project URL if it exists, None otherwise
+        url = project_url(project)
+        known = self.liveness.get(project) if self.liveness is not None else None
+        if known is not None:
+            return url if known else None
+        return url if self.check_url(url) else None
+
+    def iter_verified(self, candidates, key=lambda c: c, batch=10):
+        # Yields (candidate, url) for the candidates whose project exists, in input order.
+        # Candidates are checked `batch` at a time on the thread pool, and the next
+        # batch is submitted while the current one is being consumed. Pulling candidates (a lazy
+        # ranking) is traced as 'rank', waiting for the checks as 'url_check'.
+        candidates = iter(candidates)
+        def submit():
+            chunk = []
+            with tracing.span('rank'):
+                for c in candidates:
+                    chunk.append((c, self.pool.submit(self.check, key(c))))
+                    if len(chunk) >= batch:
+                        break
+            tracing.count('urls_checked', len(chunk))
+            return chunk
+        pending = submit()
+        while pending:
+            upcoming = submit()
+            for c, future in pending:
+                with tracing.span('url_check'):
+                    url = future.result()
+                if url:
+                    yield c, url
+            pending = upcoming
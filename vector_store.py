@@ -0,0 +1,261 @@
+###################################################
+# Point-lookup index over a converted Skill Space model
+#
+# Loading a converted model (skill_space.py) parses the full key lists of
+# `mod.dv` and `mod.wv` into dicts, which dominates a cold start when all a page
+# needs is a handful of vectors (the Project Similarity Calculator: one project,
+# a few language tags and APIs). This index answers such lookups from disk:
+# the keys of each matrix are stored sorted, as one UTF-8 blob plus offsets,
+# with the row of each key in the existing dv.npy / wv.npy. A lookup is a binary
+# search over a small in-memory fence (every BLOCK-th key) and then within one
+# block of the memory-mapped files, so it reads a few pages; the vector is
+# then one row of the mmap'd matrix. Optionally the project-store keys
+# (project_store.py) are indexed too, for membership checks.
+#
+# The same sorted keys answer prefix queries (a contiguous range), and a
+# trigram index (byte trigrams of the lower-cased keys -> key positions)
+# answers nearest-spelling queries; both are used to validate and complete the
+# API names users type (recommender.check_apis). The trigram index is stored
+# for `mod.wv`, and built in memory on first use for other indexes.
+#
+# One-time build, next to the model files:
+#   $ python vector_store.py ./data/doc2vec.U.PtAlAPI_U.ep1 ./data/Proj_info
+###################################################
+import argparse, difflib, json, mmap, os
+import numpy
+
+META = 'lookup.json'
+FORMAT_VERSION = 1
+BLOCK = 128 # keys per fence entry
+
+
+class KeyIndex:
+    # sorted keys -> row; read-only, supports `key in index`, `index.row(key)`,
+    # `index.with_prefix(prefix)` and `index.closest(word)`
+    def __init__(self, blob, offsets, rows, fence, trigrams=None):
+        self.blob = blob # concatenated UTF-8 keys, in sorted (bytewise) order
+        self.offsets = offsets # key i is blob[offsets[i]:offsets[i+1]]
+        self.rows = rows # row of key i in the indexed matrix / store
+        self.fence = fence # every BLOCK-th key, as bytes
+        self.trigrams = trigrams # (codes, offsets, positions) postings, built by closest() if None
+
+    @classmethod
+    def from_keys(cls, keys):
+        # in-memory index, e.g. over `mod.wv.index_to_key` when no index was built on disk
+        blob, offsets, rows, fence = _sorted_keys(keys)
+        return cls(blob, offsets, rows, fence)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _key(self, i):
+        return self.blob[int(self.offsets[i]):int(self.offsets[i+1])]
+
+    def key(self, i):
+        return self._key(i).decode('utf-8')
+
+    def _lower_bound(self, k):
+        # position of the first key >= k: last fence entry < k, then binary search inside its block
+        lo, hi = 0, len(self.fence)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.fence[mid] < k:
+                lo = mid + 1
+            else:
+                hi = mid
+        lo, hi = max(lo - 1, 0) * BLOCK, min(lo * BLOCK, len(self.rows))
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < k:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def row(self, key):
+        k = key.encode('utf-8')
+        i = self._lower_bound(k)
+        if i < len(self.rows) and self._key(i) == k:
+            return int(self.rows[i])
+        return None
+
+    def __contains__(self, key):
+        return self.row(key) is not None
+
+    def with_prefix(self, prefix, limit=10):
+        # up to `limit` keys starting with `prefix`, in sorted order (case-sensitive, like the keys)
+        p = prefix.encode('utf-8')
+        i = self._lower_bound(p)
+        keys = []
+        while i < len(self.rows) and len(keys) < limit:
+            k = self._key(i)
+            if not k.startswith(p):
+                break
+            keys.append(k.decode('utf-8'))
+            i += 1
+        return keys
+
+    def closest(self, word, limit=5, cutoff=0.6, candidates=64):
+        # up to `limit` (key, score) with the most similar spelling, best first; the `candidates` keys that
+        # share most trigrams with `word` (case-insensitive) are scored with difflib's ratio
+        if self.trigrams is None:
+            self.trigrams = trigram_postings(self.blob, self.offsets)
+        codes, offsets, positions = self.trigrams
+        w = word.encode('utf-8').lower()
+        query = numpy.unique(_trigram_codes(w, [0, len(w)])[0])
+        found = numpy.searchsorted(codes, query)
+        found = found[(found < len(codes)) & (codes[numpy.minimum(found, len(codes) - 1)] == query)]
+        if not len(found):
+            return []
+        hits = numpy.concatenate([positions[offsets[j]:offsets[j+1]] for j in found])
+        pos, shared = numpy.unique(hits, return_counts=True)
+        if len(pos) > candidates:
+            pos = pos[numpy.argpartition(-shared, candidates - 1)[:candidates]]
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(word.lower())
+        scored = []
+        for i in pos:
+            key = self.key(i)
+            matcher.set_seq1(key.lower())
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                score = matcher.ratio()
+                if score >= cutoff:
+                    scored.append((key, score))
+        scored.sort(key=lambda x: (-x[1], x[0]))
+        return scored[:limit]
+
+
+def _trigram_codes(data, bounds):
+    # 24-bit codes of the byte trigrams of the keys data[bounds[i]:bounds[i+1]], each padded with
+    # a 0 byte at both ends; (codes, key of each code)
+    data = numpy.frombuffer(data, dtype=numpy.uint8)
+    lengths = numpy.diff(bounds)
+    keys = numpy.repeat(numpy.arange(len(lengths)), lengths + 2)
+    padded = numpy.zeros(len(data) + 2 * len(lengths), dtype=numpy.uint32)
+    padded[numpy.arange(len(data)) + 2 * numpy.repeat(numpy.arange(len(lengths)), lengths) + 1] = data
+    codes = (padded[:-2] << 16) | (padded[1:-1] << 8) | padded[2:]
+    # a trigram centred on a padding byte spans two keys (or is the empty key)
+    valid = padded[1:-1] != 0
+    return codes[valid], keys[1:-1][valid]
+
+
+def trigram_postings(blob, offsets):
+    # (sorted unique trigram codes, postings offsets, key positions) of the lower-cased keys
+    offsets = numpy.asarray(offsets)
+    codes, keys = _trigram_codes(bytes(blob).lower(), offsets - offsets[0])
+    pairs = numpy.sort((codes.astype(numpy.int64) << 32) | keys.astype(numpy.int64))
+    pairs = pairs[numpy.concatenate([[True], pairs[1:] != pairs[:-1]])] # a key repeating a trigram is listed once
+    codes, positions = (pairs >> 32).astype(numpy.uint32), (pairs & 0xffffffff).astype(numpy.uint32)
+    starts = numpy.flatnonzero(numpy.concatenate([[True], codes[1:] != codes[:-1]]))
+    return codes[starts], numpy.append(starts, len(codes)).astype(numpy.int64), positions
+
+
+class LookupMatrix:
+    # `kv[key]`, `kv.get_vector(key)` and `key in kv` of skill_space.KeyedMatrix, without the key dict
+    def __init__(self, vectors, keys):
+        self.vectors = vectors
+        self.keys = keys
+        self.vector_size = vectors.shape[1]
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def get_vector(self, key):
+        row = self.keys.row(key)
+        if row is None:
+            raise KeyError(f"Key '{key}' not present")
+        return self.vectors[row]
+
+    def __getitem__(self, key):
+        return self.get_vector(key)
+
+
+class VectorLookup:
+    def __init__(self, dv, wv, projects=None):
+        self.dv = dv
+        self.wv = wv
+        self.projects = projects # KeyIndex over the project store, if it was indexed
+
+
+###################################################
+# Building & loading
+###################################################
+def _sorted_keys(keys):
+    # (blob, offsets, rows, fence) of KeyIndex
+    encoded = [k.encode('utf-8') for k in keys]
+    order = sorted(range(len(encoded)), key=encoded.__getitem__)
+    offsets = numpy.zeros(len(order) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(encoded[i]) for i in order], out=offsets[1:])
+    return (b''.join(encoded[i] for i in order), offsets, numpy.asarray(order, dtype=numpy.int64),
+            [encoded[i] for i in order[::BLOCK]])
+
+
+def _save_index(dirname, prefix, keys, trigrams=False):
+    blob, offsets, rows, fence = _sorted_keys(keys)
+    with open(os.path.join(dirname, f'{prefix}.lookup.bin'), 'wb') as f:
+        f.write(blob)
+    numpy.save(os.path.join(dirname, f'{prefix}.lookup.offsets.npy'), offsets)
+    numpy.save(os.path.join(dirname, f'{prefix}.lookup.rows.npy'), rows)
+    with open(os.path.join(dirname, f'{prefix}.lookup.fence.json'), 'w', encoding='utf-8') as f:
+        json.dump([k.decode('utf-8') for k in fence], f, ensure_ascii=False)
+    if trigrams:
+        for name, array in zip(('codes', 'offsets', 'positions'), trigram_postings(blob, offsets)):
+            numpy.save(os.path.join(dirname, f'{prefix}.lookup.trigram_{name}.npy'), array)
+    return len(rows)
+
+
+def _load_index(dirname, prefix):
+    path = os.path.join(dirname, f'{prefix}.lookup.bin')
+    with open(path, 'rb') as f:
+        blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+    with open(os.path.join(dirname, f'{prefix}.lookup.fence.json'), encoding='utf-8') as f:
+        fence = [k.encode('utf-8') for k in json.load(f)]
+    load = lambda name: numpy.load(os.path.join(dirname, f'{prefix}.lookup.{name}.npy'), mmap_mode='r')
+    trigrams = None
+    if os.path.isfile(os.path.join(dirname, f'{prefix}.lookup.trigram_codes.npy')):
+        trigrams = tuple(load(f'trigram_{name}') for name in ('codes', 'offsets', 'positions'))
+    return KeyIndex(blob, load('offsets'), load('rows'), fence, trigrams)
+
+
+def exists(dirname):
+    return os.path.isfile(os.path.join(dirname, META))
+
+
+def build(model_dir, proj_info_dir=None):
+    # index the keys of model_dir/dv.keys.json, wv.keys.json (and of the project store)
+    meta = {'format': FORMAT_VERSION}
+    for prefix in ('dv', 'wv'):
+        with open(os.path.join(model_dir, f'{prefix}.keys.json'), encoding='utf-8') as f:
+            meta[prefix] = _save_index(model_dir, prefix, json.load(f), trigrams=prefix == 'wv')
+    if proj_info_dir is not None:
+        with open(os.path.join(proj_info_dir, 'keys.json'), encoding='utf-8') as f:
+            meta['projects'] = _save_index(model_dir, 'projects', json.load(f))
+    # metadata is written last, so a half-written index is never picked up
+    with open(os.path.join(model_dir, META), 'w') as f:
+        json.dump(meta, f)
+
+
+def load(model_dir):
+    with open(os.path.join(model_dir, META)) as f:
+        meta = json.load(f)
+    if meta.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported lookup index format in {model_dir}: {meta.get('format')}")
+    matrices = {}
+    for prefix in ('dv', 'wv'):
+        vectors = numpy.load(os.path.join(model_dir, f'{prefix}.npy'), mmap_mode='r')
+        if len(vectors) != meta[prefix]:
+            raise ValueError(f'{prefix}.npy has {len(vectors)} rows but the lookup index {meta[prefix]}, rebuild it')
+        matrices[prefix] = LookupMatrix(vectors, _load_index(model_dir, prefix))
+    projects = _load_index(model_dir, 'projects') if 'projects' in meta else None
+    return VectorLookup(matrices['dv'], matrices['wv'], projects)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the point-lookup index of a converted Skill Space model')
+    parser.add_argument('model_dir', help='converted model directory (skill_space.py)')
+    parser.add_argument('proj_info_dir', nargs='?', help='project store directory (project_store.py), to index its keys too')
+    args = parser.parse_args()
+    build(args.model_dir, args.proj_info_dir)